@@ -1,26 +1,230 @@
-from functools import lru_cache
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from .config import settings
+from .constants import (
+    GEMINI_MODEL, AI_CACHE_TTL_SECONDS, AI_CACHE_MEMORY_MAX_ENTRIES,
+    AI_CACHE_MEMORY_MAX_BYTES, AI_CACHE_DISK_MAX_ENTRIES
+)
+from .logger import setup_logger
+import asyncio
 import hashlib
-import json
-
-class SimpleCache:
-    def __init__(self, max_size=100):
-        self.cache = {}
-        self.max_size = max_size
-    
-    def get_key(self, *args, **kwargs):
-        key_data = json.dumps({"args": args, "kwargs": kwargs}, sort_keys=True)
-        return hashlib.md5(key_data.encode()).hexdigest()
-    
-    def get(self, key):
-        return self.cache.get(key)
-    
-    def set(self, key, value):
-        if len(self.cache) >= self.max_size:
-            oldest_key = next(iter(self.cache))
-            del self.cache[oldest_key]
-        self.cache[key] = value
-    
+import re
+import sqlite3
+import threading
+import time
+
+logger = setup_logger(__name__)
+
+def normalize_prompt(prompt: str) -> str:
+    # Only changes that cannot alter meaning: case and indentation matter in
+    # user text (code, acronyms), so just line endings and trailing spaces go
+    return re.sub(r"[ \t]+$", "", prompt.replace("\r\n", "\n"), flags=re.MULTILINE).strip()
+
+class MemoryTier:
+    """In-process LRU with per-entry TTL and a total byte budget."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                self.size_bytes -= size
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expires_at: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[2]
+            self.entries[key] = (value, expires_at, size)
+            self.size_bytes += size
+            while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+class DiskTier:
+    """SQLite-backed tier shared by every worker process on the host."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.writes_since_prune = 0
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_cache_accessed_at ON ai_cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        with conn:
+            if expires_at <= now:
+                conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE ai_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value, expires_at
+
+    def set(self, key: str, value: str, expires_at: float):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time())
+            )
+        self.writes_since_prune += 1
+        if self.writes_since_prune >= 100:
+            self.prune()
+
+    def prune(self):
+        self.writes_since_prune = 0
+        conn = self._connect()
+        with conn:
+            expired = conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            overflow = conn.execute(
+                "DELETE FROM ai_cache WHERE key IN ("
+                "SELECT key FROM ai_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        self.evictions += expired + overflow
+
     def clear(self):
-        self.cache.clear()
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM ai_cache")
+
+class ResponseCache:
+    """Two-tier cache for LLM responses keyed by model and normalized prompt.
+
+    Lookups hit the in-memory LRU first and fall back to the on-disk tier,
+    promoting disk hits into memory. The async helpers keep SQLite I/O off
+    the event loop.
+    """
+
+    def __init__(self, disk_path: str = "", ttl: int = AI_CACHE_TTL_SECONDS, model: str = GEMINI_MODEL):
+        self.ttl = ttl
+        self.model = model
+        self.memory = MemoryTier(AI_CACHE_MEMORY_MAX_ENTRIES, AI_CACHE_MEMORY_MAX_BYTES)
+        self.disk = None
+        if disk_path:
+            try:
+                self.disk = DiskTier(disk_path, AI_CACHE_DISK_MAX_ENTRIES)
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache disk tier disabled: {e}")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_key(self, prompt: str) -> str:
+        key_data = f"{self.model}\0{normalize_prompt(prompt)}"
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is not None:
+            try:
+                row = self.disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache disk read failed: {e}")
+                row = None
+            if row is not None:
+                value, expires_at = row
+                self.memory.set(key, value, expires_at)
+                self.disk_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"AI cache disk write failed: {e}")
+
+    async def aget(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        if self.disk is None:
+            self.misses += 1
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        if self.disk is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memoryHits": self.memory_hits,
+            "diskHits": self.disk_hits,
+            "misses": self.misses,
+            "hitRate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memoryEntries": len(self.memory.entries),
+            "memoryBytes": self.memory.size_bytes,
+            "memoryEvictions": self.memory.evictions,
+            "diskEvictions": self.disk.evictions if self.disk is not None else 0,
+            "diskEnabled": self.disk is not None,
+        }
 
-ai_cache = SimpleCache(max_size=50)
+# Stub output must never be served to callers of the real model
+ai_cache = ResponseCache(
+    disk_path=settings.AI_CACHE_PATH,
+    model=GEMINI_MODEL if settings.LLM_BACKEND == "gemini" else settings.LLM_BACKEND
+)
@@ -2,12 +2,30 @@ from pydantic_settings import BaseSettings
 import os
 
 class Settings(BaseSettings):
-    GEMINI_API_KEY: str
+    GEMINI_API_KEY: str = ""
     DATABASE_URL: str = "sqlite:///./app.db"
     SECRET_KEY: str
     SUPABASE_URL: str = ""
     SUPABASE_KEY: str = ""
     ALLOWED_ORIGINS: str = ""
+    LLM_BACKEND: str = "gemini"
+    LLM_STUB_LATENCY_MS: float = 0
+    LLM_STUB_LATENCY_JITTER_MS: float = 0
+    LLM_STUB_LATENCY_DISTRIBUTION: str = "fixed"
+    LLM_STUB_ERROR_RATE: float = 0.0
+    LLM_STUB_SEED: int = 0
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_EXECUTOR_WORKERS: int = 8
+    LLM_MAX_QUEUE_WAIT_SECONDS: float = 10
+    LLM_DAILY_TOKEN_QUOTA: int = 200000
+    LLM_MONTHLY_TOKEN_QUOTA: int = 2000000
+    LLM_DAILY_REQUEST_QUOTA: int = 1000
+    LLM_USAGE_FLUSH_SECONDS: float = 30
+    EXTRACTION_WORKERS: int = 2
+    TRANSCRIPT_BACKEND: str = "youtube"
+    AI_CACHE_PATH: str = "cache/ai_responses.db"
+    QUIZ_BANK_LOW_WATERMARK: int = 10
+    SEMANTIC_CACHE_THRESHOLD: float = 0.8
     
     class Config:
         env_file = ".env"
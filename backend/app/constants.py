@@ -4,18 +4,101 @@
 API_TIMEOUT = 30  # seconds
 API_RETRY_COUNT = 3
 API_RETRY_DELAY = 1  # seconds
+API_RETRY_MAX_DELAY = 8  # seconds
+
+# LLM scheduling: share of slots per priority class under contention
+LLM_PRIORITY_WEIGHTS = {"interactive": 8, "standard": 3, "background": 1}
+LLM_ENDPOINT_PRIORITIES = {
+    "question": "interactive",
+    "feedback": "interactive",
+    "enhance": "standard",
+    "simplify": "standard",
+    "quiz": "standard",
+    "batch": "background",
+    "quiz_refill": "background",
+    "mindmap": "background",
+}
+LLM_WAIT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# LLM Circuit Breaker
+BREAKER_WINDOW_SECONDS = 60
+BREAKER_MIN_CALLS = 10
+BREAKER_ERROR_RATE = 0.5
+BREAKER_COOLDOWN_SECONDS = 30
 
 # File Upload Configuration
 ALLOWED_EXTENSIONS = {'.pdf', '.doc', '.docx', '.png', '.jpg', '.jpeg', '.txt'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Background text extraction
+EXTRACTION_TIMEOUT_SECONDS = 120
+EXTRACTION_MAX_ATTEMPTS = 3
+EXTRACTION_RETRY_DELAY = 2  # seconds, doubled per attempt
+PDF_PAGES_PER_TASK = 25
+# OCR: images are downscaled so the long side is at most OCR_MAX_DIMENSION
+# pixels and tall images are recognized in bands of about OCR_BAND_HEIGHT
+OCR_MAX_DIMENSION = 2400
+OCR_TARGET_DPI = 300  # assumed when the image carries no DPI metadata
+OCR_BAND_HEIGHT = 700
+OCR_TIMEOUT_SECONDS = 60  # per image
+TEXT_COMPRESSION_LEVEL = 6  # zlib level for stored extracted text
+TEXT_PAGE_DEFAULT_CHARS = 20000
+TEXT_PAGE_MAX_CHARS = 200000
+
+# YouTube transcripts
+TRANSCRIPT_CACHE_DAYS = 30
+TRANSCRIPT_NEGATIVE_CACHE_HOURS = 24  # re-check videos without captions after this
+TRANSCRIPT_PREFETCH_CONCURRENCY = 4
+MAX_TRANSCRIPT_PREFETCH = 100
+
+# Full-text search over uploaded content
+SEARCH_SNIPPET_TOKENS = 12
+SEARCH_MAX_TERMS = 16
+SEARCH_MAX_QUERY_LENGTH = 500
+SEARCH_DEFAULT_RESULTS = 20
+SEARCH_MAX_RESULTS = 100
 
 # AI Service Configuration
 GEMINI_MODEL = "gemini-2.0-flash"
 MAX_CHAT_HISTORY = 10
+CHAT_HISTORY_TOKEN_BUDGET = 1500
+CHAT_SUMMARY_CACHE_SIZE = 1000
 MAX_QUIZ_QUESTIONS = 20
 DEFAULT_QUIZ_QUESTIONS = 5
 
+# Quiz Question Bank
+QUIZ_BANK_REFILL_BATCH = 10
+QUIZ_BANK_MAX_SIZE = 200
+QUIZ_BANK_AVOID_EXAMPLES = 15
+
+# AI Response Cache
+AI_CACHE_TTL_SECONDS = 7 * 24 * 3600
+AI_CACHE_MEMORY_MAX_ENTRIES = 512
+AI_CACHE_MEMORY_MAX_BYTES = 16 * 1024 * 1024  # 16MB
+AI_CACHE_DISK_MAX_ENTRIES = 50000
+
+# Chunked enhance/simplify
+TRANSFORM_CHUNK_CHARS = 3000
+TRANSFORM_CONCURRENCY = 4  # sections of one document in flight at a time
+
+# Batch AI endpoint
+MAX_BATCH_OPERATIONS = 50
+AI_BATCH_CONCURRENCY = 4  # per batch; the gateway still bounds the total
+
+# Semantic question cache
+SEMANTIC_CACHE_DIM = 2048
+SEMANTIC_CACHE_MAX_ENTRIES = 500  # per response type and content
+SEMANTIC_CACHE_HIT_WEIGHT_SECONDS = 3600
+
+# Retrieval Configuration
+RETRIEVAL_CHUNK_CHARS = 1200
+RETRIEVAL_TOP_K = 4
+QUIZ_CONTEXT_CHUNKS = 6
+BM25_K1 = 1.5
+BM25_B = 0.75
+
 # BKT Parameters
 BKT_INITIAL_KNOWLEDGE = 0.3
 BKT_LEARNING_RATE = 0.2
@@ -32,3 +115,4 @@ MAX_TEXT_LENGTH = 50000
 MIN_QUESTION_LENGTH = 3
 MIN_ENHANCE_TEXT_LENGTH = 10
 MAX_ENHANCE_TEXT_LENGTH = 10000
+MAX_DOCUMENT_TRANSFORM_LENGTH = 500000  # enhance/simplify of whole uploaded documents
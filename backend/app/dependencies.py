@@ -1,5 +1,6 @@
 from fastapi import Depends, HTTPException, Header
 from sqlalchemy.orm import Session
+from typing import Optional
 from .database import get_db
 from .models import User
 from .auth import verify_token
@@ -12,3 +13,23 @@ def get_current_user(authorization: str = Header(None), db: Session = Depends(ge
     payload = verify_token(token)
     
     return payload
+
+def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if not current_user or current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def get_optional_user(authorization: str = Header(None)) -> Optional[dict]:
+    """The token payload for a valid bearer token, otherwise None.
+
+    Clients keep sending a stored token after it expires, so a bad token
+    makes the call anonymous rather than failing endpoints that do not
+    require a login.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return verify_token(authorization.replace("Bearer ", ""))
+
+def quota_user_id(current_user: Optional[dict] = Depends(get_optional_user)) -> Optional[str]:
+    # Quotas follow the token, never a userId from the request body
+    return current_user.get("sub") if current_user else None
@@ -1,17 +1,41 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from .database import engine, Base
+from .database import engine, Base, SessionLocal
+from .migrations import run_migrations
 from .routers import content, ai, auth, educator, career, progress, analytics, projects, pomodoro, mindmap
 from .constants import UPLOAD_DIR
 from .logger import setup_logger
 from .config import settings
+from .services.llm_errors import LLMCapacityError
+from .services.usage import usage_tracker
+from .services.extraction_jobs import extraction_queue
+from .services.search import content_search
+from contextlib import asynccontextmanager
+import asyncio
 import os
 
 logger = setup_logger(__name__)
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+content_search.setup(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        usage_tracker.load(db)
+        extraction_queue.resume(db)
+    finally:
+        db.close()
+    usage_flusher = asyncio.create_task(usage_tracker.run_flusher(settings.LLM_USAGE_FLUSH_SECONDS))
+    yield
+    usage_flusher.cancel()
+    await asyncio.to_thread(usage_tracker.flush)
+    extraction_queue.shutdown()
 
 app = FastAPI(
     title="AI Learning Platform API",
@@ -19,7 +43,8 @@ app = FastAPI(
     description="Backend API for AI-powered learning platform",
     docs_url="/api/v1/docs",
     redoc_url="/api/v1/redoc",
-    openapi_url="/api/v1/openapi.json"
+    openapi_url="/api/v1/openapi.json",
+    lifespan=lifespan
 )
 
 logger.info("Starting AI Learning Platform API")
@@ -48,6 +73,15 @@ app.add_middleware(
 # Add compression middleware
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+@app.exception_handler(LLMCapacityError)
+async def llm_capacity_handler(request: Request, exc: LLMCapacityError):
+    logger.warning(f"LLM call rejected: {exc} ({request.url.path})")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # API v1 routes
 app.include_router(content.router, prefix="/api/v1/content", tags=["content"])
 app.include_router(ai.router, prefix="/api/v1/ai", tags=["ai"])
@@ -0,0 +1,67 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .database import Base
+from .models import ContentText
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Legacy rows moved into content_texts per transaction
+BACKFILL_BATCH = 200
+
+def add_missing_columns(engine: Engine):
+    """``create_all`` only creates missing tables; columns added to a model
+    later are added here so databases from older releases keep working."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                if isinstance(default, (int, float)):
+                    ddl += f" DEFAULT {default}"
+                elif isinstance(default, str):
+                    ddl += f" DEFAULT '{default}'"
+                conn.execute(text(ddl))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+def backfill_content_texts(engine: Engine) -> int:
+    """Move text from the old ``contents.extracted_text`` column into
+    compressed content_texts rows.
+
+    Each moved row has its legacy column cleared in the same transaction,
+    so the copy resumes where it stopped and is a no-op once done.
+    """
+    if "extracted_text" not in {column["name"] for column in inspect(engine).get_columns("contents")}:
+        return 0
+    moved = 0
+    db = Session(bind=engine)
+    try:
+        while True:
+            rows = db.execute(text(
+                "SELECT id, extracted_text FROM contents WHERE extracted_text IS NOT NULL LIMIT :limit"
+            ), {"limit": BACKFILL_BATCH}).all()
+            if not rows:
+                break
+            for content_id, legacy_text in rows:
+                # A row written by the current code wins over the legacy copy
+                if db.get(ContentText, content_id) is None:
+                    db.add(ContentText(content_id=content_id, text=legacy_text))
+                db.execute(text("UPDATE contents SET extracted_text = NULL WHERE id = :id"), {"id": content_id})
+            db.commit()
+            moved += len(rows)
+    finally:
+        db.close()
+    if moved:
+        logger.info(f"Moved extracted text of {moved} documents into content_texts")
+    return moved
+
+def run_migrations(engine: Engine):
+    add_missing_columns(engine)
+    backfill_content_texts(engine)
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Index, UniqueConstraint, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
+from typing import Optional
 from .database import Base
+from .utils.compression import compress_text, decompress_text, decompress_range
 
 class User(Base):
     __tablename__ = "users"
@@ -26,8 +28,152 @@ class Content(Base):
     filename = Column(String)
     content_type = Column(String, index=True)
     file_url = Column(String)
-    extracted_text = Column(Text)
+    blob_sha256 = Column(String, ForeignKey("content_blobs.sha256"), index=True, nullable=True)
+    extraction_status = Column(String, default="completed", index=True)  # pending | processing | completed | failed
+    extraction_error = Column(Text, nullable=True)
+    extraction_attempts = Column(Integer, default=0)
+    extracted_at = Column(DateTime, nullable=True)
+    page_offsets = deferred(Column(JSON, nullable=True))  # start offset of each PDF page in extracted_text
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Extracted text lives compressed in content_texts and is only loaded when accessed
+    text_row = relationship("ContentText", uselist=False, cascade="all, delete-orphan")
+
+    @property
+    def extracted_text(self) -> Optional[str]:
+        return self.text_row.text if self.text_row is not None else None
+
+    @extracted_text.setter
+    def extracted_text(self, text: Optional[str]):
+        if text is None:
+            self.text_row = None
+        elif self.text_row is None:
+            self.text_row = ContentText(text=text)
+        else:
+            self.text_row.text = text
+
+class ContentText(Base):
+    __tablename__ = "content_texts"
+    
+    content_id = Column(String, ForeignKey("contents.id"), primary_key=True)
+    codec = Column(String, default="zlib")
+    # Sizes are enough for listings and ETags; the bytes load on first access
+    data = deferred(Column(LargeBinary))
+    raw_size = Column(Integer)  # UTF-8 bytes before compression
+    compressed_size = Column(Integer)
+    char_count = Column(Integer)
+
+    @property
+    def text(self) -> str:
+        return decompress_text(self.data, self.codec)
+
+    @text.setter
+    def text(self, text: str):
+        raw = text.encode("utf-8")
+        self.codec = "zlib"
+        self.data = compress_text(raw)
+        self.raw_size = len(raw)
+        self.compressed_size = len(self.data)
+        self.char_count = len(text)
+
+    def read(self, start: int, end: int) -> str:
+        return decompress_range(self.data, start, end, self.codec)
+
+    def copy(self) -> "ContentText":
+        return ContentText(codec=self.codec, data=self.data, raw_size=self.raw_size,
+                           compressed_size=self.compressed_size, char_count=self.char_count)
+
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+    
+    sha256 = Column(String, primary_key=True)
+    file_url = Column(String)
+    size = Column(Integer)
+    ref_count = Column(Integer, default=0)
+    owner_id = Column(String, index=True)  # content whose extraction, chunks and question bank are shared
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TranscriptCache(Base):
+    __tablename__ = "transcript_cache"
+    
+    video_id = Column(String, primary_key=True)
+    available = Column(Integer, default=1)  # 0 caches "this video has no transcript"
+    segments = Column(JSON, nullable=True)  # [{start, duration, text}]
+    error = Column(Text, nullable=True)
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
+class ContentChunk(Base):
+    __tablename__ = "content_chunks"
+    __table_args__ = (
+        Index("ix_content_chunks_content_position", "content_id", "position"),
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_id = Column(String, ForeignKey("contents.id"), index=True)
+    position = Column(Integer)
+    text = Column(Text)
+    token_count = Column(Integer)
+
+class ContentChunkTerm(Base):
+    __tablename__ = "content_chunk_terms"
+    __table_args__ = (
+        Index("ix_content_chunk_terms_content_term", "content_id", "term"),
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True)
+    content_id = Column(String, ForeignKey("contents.id"))
+    term = Column(String)
+    position = Column(Integer)
+    tf = Column(Integer)
+
+class QuizQuestion(Base):
+    __tablename__ = "quiz_questions"
+    __table_args__ = (
+        UniqueConstraint("competency_id", "content_id", "question_hash", name="uq_quiz_questions_hash"),
+        Index("ix_quiz_questions_bank", "competency_id", "content_id", "served_count"),
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    competency_id = Column(String)
+    content_id = Column(String)
+    question_hash = Column(String)
+    question = Column(Text)
+    options = Column(JSON)
+    correct_answer = Column(Integer)
+    explanation = Column(Text)
+    served_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class QuizQuestionServed(Base):
+    __tablename__ = "quiz_questions_served"
+    __table_args__ = (
+        UniqueConstraint("user_id", "question_id", name="uq_quiz_questions_served"),
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True)
+    question_id = Column(Integer, ForeignKey("quiz_questions.id"), index=True)
+    served_at = Column(DateTime, default=datetime.utcnow)
+
+class LLMUsage(Base):
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        UniqueConstraint("user_id", "endpoint", "day", name="uq_llm_usage_user_endpoint_day"),
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True)
+    endpoint = Column(String)
+    day = Column(String, index=True)  # YYYY-MM-DD (UTC)
+    requests = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    response_tokens = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 class Progress(Base):
     __tablename__ = "progress"
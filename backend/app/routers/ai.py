@@ -1,21 +1,41 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from ..database import get_db
+from ..dependencies import get_admin_user, quota_user_id
+from ..models import Content
 from ..services.ai_service import AIService
+from ..services.question_bank import QuestionBank
+from ..services.batch import BatchRunner
+from ..services.blobs import shared_content_id
+from ..services.llm_errors import LLMCapacityError
+from ..services.scheduler import set_llm_context
+from ..services.usage import usage_tracker
+from ..services.quiz_parser import QuizFormatError, quiz_parse_stats
 from ..validators import validate_text_length, sanitize_input
 from ..constants import (
     MIN_QUESTION_LENGTH, MAX_TEXT_LENGTH, MIN_ENHANCE_TEXT_LENGTH,
-    MAX_ENHANCE_TEXT_LENGTH, MAX_QUIZ_QUESTIONS, DEFAULT_QUIZ_QUESTIONS
+    MAX_ENHANCE_TEXT_LENGTH, MAX_QUIZ_QUESTIONS, DEFAULT_QUIZ_QUESTIONS,
+    MAX_DOCUMENT_TRANSFORM_LENGTH, MAX_BATCH_OPERATIONS
 )
 from ..logger import setup_logger
+from ..utils.sse import sse_event, sse_response, SSE_HEADERS
+import asyncio
+import json
 
 logger = setup_logger(__name__)
 
 router = APIRouter()
 ai_service = AIService()
+question_bank = QuestionBank(ai_service)
+batch_runner = BatchRunner(ai_service)
 
 class EnhanceRequest(BaseModel):
-    text: str
+    text: Optional[str] = None
+    contentId: Optional[str] = None
+    userId: Optional[str] = None
     level: str = Field(default="beginner")
 
 class QuestionRequest(BaseModel):
@@ -23,22 +43,62 @@ class QuestionRequest(BaseModel):
     contentId: Optional[str] = None
     userId: Optional[str] = None
     chatHistory: Optional[list] = None
+    conversationId: Optional[str] = None
     responseType: Optional[str] = Field(default="medium", pattern="^(basic|medium|advanced)$")
 
+class BatchOperation(BaseModel):
+    id: Optional[str] = None
+    op: str = Field(pattern="^(enhance|simplify|feedback)$")
+    text: Optional[str] = None
+    level: str = Field(default="beginner")
+    answer: Optional[str] = None
+    question: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    userId: Optional[str] = None
+    operations: List[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+    stream: bool = False
+
 class QuizRequest(BaseModel):
     contentId: str
     competencyId: str
+    userId: Optional[str] = None
     numQuestions: int = Field(default=DEFAULT_QUIZ_QUESTIONS, ge=1, le=MAX_QUIZ_QUESTIONS)
 
+def resolve_transform_text(db: Session, text: Optional[str], content_id: Optional[str],
+                           max_len: int = MAX_ENHANCE_TEXT_LENGTH) -> str:
+    """Inline text, or the whole extracted text of an uploaded document."""
+    if text is None and content_id:
+        content = db.query(Content).filter(Content.id == content_id).first()
+        if not content or not content.extracted_text:
+            raise HTTPException(status_code=404, detail="Content not found or has no extracted text")
+        return validate_text_length(content.extracted_text, MIN_ENHANCE_TEXT_LENGTH, MAX_DOCUMENT_TRANSFORM_LENGTH, "Document")
+    return validate_text_length(sanitize_input(text or ""), MIN_ENHANCE_TEXT_LENGTH, max_len, "Text")
+
+def transform_events(sections):
+    async def events():
+        count = 0
+        try:
+            async for section in sections:
+                yield sse_event({"index": count, "text": section}, event="section")
+                count += 1
+        except LLMCapacityError as e:
+            yield sse_event({"error": str(e), "retryAfter": e.retry_after}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Streaming transform error: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Failed to process content. Please try again."}, event="error")
+            return
+        yield sse_event({"sections": count}, event="done")
+    
+    return sse_response(events())
+
 @router.post("/enhance")
-async def enhance_content(request: EnhanceRequest):
+async def enhance_content(request: EnhanceRequest, db: Session = Depends(get_db),
+                         quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("enhance", quota_user)
     try:
-        text = validate_text_length(
-            sanitize_input(request.text),
-            MIN_ENHANCE_TEXT_LENGTH,
-            MAX_ENHANCE_TEXT_LENGTH,
-            "Text"
-        )
+        text = resolve_transform_text(db, request.text, request.contentId)
         logger.info(f"Enhancing content for level: {request.level}")
         enhanced = await ai_service.enhance_content(text, request.level)
         logger.info("Content enhanced successfully")
@@ -48,6 +108,8 @@ async def enhance_content(request: EnhanceRequest):
                 "enhancedText": enhanced
             }
         }
+    except (LLMCapacityError, HTTPException):
+        raise
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
@@ -55,8 +117,20 @@ async def enhance_content(request: EnhanceRequest):
         logger.error(f"Enhancement error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to enhance content. Please try again.")
 
+@router.post("/enhance/stream")
+async def enhance_content_stream(request: EnhanceRequest, db: Session = Depends(get_db),
+                                quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("enhance", quota_user)
+    text = resolve_transform_text(db, request.text, request.contentId)
+    logger.info(f"Streaming enhancement for level: {request.level}")
+    return transform_events(ai_service.transform_sections("enhance", text, request.level))
+
 @router.post("/question")
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, db: Session = Depends(get_db),
+                      quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("question", quota_user)
+    # Duplicate uploads share one chunk index and answer cache
+    content_id = shared_content_id(db, request.contentId)
     try:
         question = validate_text_length(
             sanitize_input(request.question),
@@ -73,7 +147,7 @@ async def ask_question(request: QuestionRequest):
         logger.info(f"ResponseType: {request.responseType}")
         logger.info("="*60)
         
-        answer = await ai_service.answer_question(question, request.contentId, request.chatHistory, request.responseType)
+        answer = await ai_service.answer_question(question, content_id, request.chatHistory, request.responseType, request.conversationId)
         
         logger.info("✅ Gemini API call successful")
         logger.info(f"Response length: {len(answer)} chars")
@@ -86,6 +160,8 @@ async def ask_question(request: QuestionRequest):
                 "answer": answer
             }
         }
+    except LLMCapacityError:
+        raise
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid question: {str(e)}")
@@ -93,11 +169,47 @@ async def ask_question(request: QuestionRequest):
         logger.error(f"Question answering error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to answer question: {str(e)}")
 
+@router.post("/question/stream")
+async def ask_question_stream(request: QuestionRequest, db: Session = Depends(get_db),
+                             quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("question", quota_user)
+    content_id = shared_content_id(db, request.contentId)
+    question = validate_text_length(
+        sanitize_input(request.question),
+        MIN_QUESTION_LENGTH,
+        MAX_TEXT_LENGTH,
+        "Question"
+    )
+    logger.info(f"Streaming answer for user: {request.userId}, responseType: {request.responseType}")
+    
+    async def events():
+        answer_length = 0
+        try:
+            async for chunk in ai_service.answer_question_stream(question, content_id, request.chatHistory, request.responseType, request.conversationId):
+                answer_length += len(chunk)
+                yield sse_event({"delta": chunk})
+        except LLMCapacityError as e:
+            yield sse_event({"error": str(e), "retryAfter": e.retry_after}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Streaming answer error: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Failed to answer question. Please try again."}, event="error")
+            return
+        logger.info(f"Streamed answer length: {answer_length} chars")
+        yield sse_event({"answerLength": answer_length}, event="done")
+    
+    return sse_response(events())
+
 @router.post("/quiz")
-async def generate_quiz(request: QuizRequest):
+async def generate_quiz(request: QuizRequest, db: Session = Depends(get_db),
+                       quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("quiz", quota_user)
+    content_id = shared_content_id(db, request.contentId)
     try:
         logger.info(f"Generating {request.numQuestions} questions for competency: {request.competencyId}")
-        questions = await ai_service.generate_quiz(request.contentId, request.numQuestions)
+        questions = await question_bank.get_quiz(
+            db, request.competencyId, content_id, request.userId, request.numQuestions
+        )
         logger.info("Quiz generated successfully")
         return {
             "success": True,
@@ -105,6 +217,11 @@ async def generate_quiz(request: QuizRequest):
                 "questions": questions
             }
         }
+    except LLMCapacityError:
+        raise
+    except QuizFormatError as e:
+        logger.error(f"Quiz generation returned invalid data: {e}")
+        raise HTTPException(status_code=502, detail="Quiz generation returned invalid data. Please try again.")
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid quiz request: {str(e)}")
@@ -112,24 +229,117 @@ async def generate_quiz(request: QuizRequest):
         logger.error(f"Quiz generation error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate quiz. Please try again.")
 
+@router.post("/quiz/stream")
+async def generate_quiz_stream(request: QuizRequest, db: Session = Depends(get_db),
+                              quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("quiz", quota_user)
+    content_id = shared_content_id(db, request.contentId)
+    logger.info(f"Streaming {request.numQuestions} questions for competency: {request.competencyId}")
+    
+    async def events():
+        questions = []
+        try:
+            async for question in ai_service.generate_quiz_stream(content_id, request.numQuestions):
+                questions.append(question)
+                yield sse_event(question, event="question")
+        except LLMCapacityError as e:
+            yield sse_event({"error": str(e), "retryAfter": e.retry_after}, event="error")
+            return
+        except Exception as e:
+            logger.error(f"Streaming quiz error: {str(e)}", exc_info=True)
+            yield sse_event({"error": "Failed to generate quiz. Please try again."}, event="error")
+            return
+        yield sse_event({"count": len(questions), "requested": request.numQuestions}, event="done")
+        await asyncio.to_thread(question_bank.store, db, request.competencyId, content_id, questions)
+    
+    return sse_response(events())
+
 @router.post("/feedback")
-async def generate_feedback(answer: str, question: str):
+async def generate_feedback(answer: str, question: str, userId: Optional[str] = None,
+                            quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("feedback", quota_user)
     try:
         feedback = await ai_service.generate_feedback(answer, question)
         return {
             "success": True,
             "data": {"feedback": feedback}
         }
+    except LLMCapacityError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/simplify")
-async def simplify_content(text: str):
+async def simplify_content(text: Optional[str] = None, contentId: Optional[str] = None, userId: Optional[str] = None,
+                           db: Session = Depends(get_db), quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("simplify", quota_user)
     try:
+        text = resolve_transform_text(db, text, contentId, MAX_DOCUMENT_TRANSFORM_LENGTH)
         simplified = await ai_service.simplify_content(text)
         return {
             "success": True,
             "data": {"simplifiedText": simplified}
         }
+    except (LLMCapacityError, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/simplify/stream")
+async def simplify_content_stream(text: Optional[str] = None, contentId: Optional[str] = None, userId: Optional[str] = None,
+                                  db: Session = Depends(get_db), quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("simplify", quota_user)
+    text = resolve_transform_text(db, text, contentId, MAX_DOCUMENT_TRANSFORM_LENGTH)
+    return transform_events(ai_service.transform_sections("simplify", text))
+
+@router.post("/batch")
+async def run_batch(request: BatchRequest, quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("batch", quota_user)
+    operations = [op.model_dump() for op in request.operations]
+    logger.info(f"Running batch of {len(operations)} AI operations")
+    
+    if request.stream:
+        async def lines():
+            async for result in batch_runner.run(operations):
+                yield json.dumps(result) + "\n"
+        
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers=SSE_HEADERS)
+    
+    results = sorted([result async for result in batch_runner.run(operations)], key=lambda r: r["index"])
+    return {
+        "success": True,
+        "data": {
+            "results": results,
+            "failed": sum(1 for r in results if not r["success"])
+        }
+    }
+
+@router.get("/metrics")
+def ai_metrics():
+    return {
+        "success": True,
+        "data": {
+            "gateway": ai_service.gateway.stats(),
+            "cache": ai_service.cache.stats(),
+            "semanticCache": ai_service.semantic_cache.stats(),
+            "singleflight": ai_service.singleflight.stats(),
+            "chatHistory": ai_service.history.stats(),
+            "quizParser": quiz_parse_stats.stats(),
+            "questionBank": question_bank.stats(),
+            "batch": batch_runner.stats(),
+            "usage": usage_tracker.stats()
+        }
+    }
+
+@router.get("/usage")
+async def usage_report(days: int = Query(30, ge=1, le=366), userId: Optional[str] = None, db: Session = Depends(get_db),
+                       admin: dict = Depends(get_admin_user)):
+    # Include counters that have not been flushed yet
+    await asyncio.to_thread(usage_tracker.flush)
+    return {
+        "success": True,
+        "data": {
+            "days": days,
+            "users": usage_tracker.report(db, days, userId)
+        }
+    }
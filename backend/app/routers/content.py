@@ -1,21 +1,50 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
 from ..database import get_db
 from ..models import Content
-from ..services.content_processor import ContentProcessor
+from ..services.blobs import blob_store
+from ..services.retrieval import chunk_index
+from ..services.search import content_search
+from ..services.transcripts import transcript_store
+from ..utils.youtube_extractor import (
+    InvalidYouTubeURLError, TranscriptUnavailableError, join_segments, parse_video_id
+)
+from ..services.extraction_jobs import PENDING, extraction_queue, extraction_status
 from ..validators import validate_file_extension
-from ..constants import ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from ..constants import (
+    ALLOWED_EXTENSIONS, MAX_FILE_SIZE, UPLOAD_DIR, TEXT_PAGE_DEFAULT_CHARS, TEXT_PAGE_MAX_CHARS,
+    SEARCH_DEFAULT_RESULTS, SEARCH_MAX_RESULTS, SEARCH_MAX_QUERY_LENGTH, MAX_TRANSCRIPT_PREFETCH
+)
+from ..utils.uploads import UploadTooLargeError, save_upload
 from ..logger import setup_logger
 from datetime import datetime
+from typing import List, Optional
+import asyncio
+import hashlib
 import uuid
 import os
 
 logger = setup_logger(__name__)
 router = APIRouter()
-processor = ContentProcessor()
+
+# Room for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+class YouTubeRequest(BaseModel):
+    url: str
+    userId: str = "default_user"
+
+class TranscriptPrefetchRequest(BaseModel):
+    urls: List[str] = Field(min_length=1, max_length=MAX_TRANSCRIPT_PREFETCH)
+
+def file_too_large() -> HTTPException:
+    return HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE // (1024*1024)}MB")
 
 @router.post("/upload")
 async def upload_content(
+    request: Request,
     file: UploadFile = File(...),
     user_id: str = "default_user",
     db: Session = Depends(get_db)
@@ -25,41 +54,42 @@ async def upload_content(
         
         file_ext = validate_file_extension(file.filename)
         
-        file_content = await file.read()
-        
-        if len(file_content) > MAX_FILE_SIZE:
-            logger.warning(f"File too large: {len(file_content)} bytes")
-            raise HTTPException(status_code=400, detail=f"File too large. Max size: {MAX_FILE_SIZE // (1024*1024)}MB")
-        
-        if len(file_content) == 0:
-            logger.warning("Empty file uploaded")
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+            logger.warning(f"Upload rejected by Content-Length: {content_length} bytes")
+            raise file_too_large()
         
         content_id = f"content_{uuid.uuid4().hex[:12]}"
-        saved_filename = f"{content_id}{file_ext}"
-        file_path = os.path.join("uploads", saved_filename)
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Staged under the content id until the hash picks the blob it belongs to
+        file_path = os.path.join(UPLOAD_DIR, f".incoming-{content_id}{file_ext}")
         
-        logger.info(f"File saved: {file_path}")
+        try:
+            size, sha256 = await save_upload(file, file_path, MAX_FILE_SIZE)
+        except UploadTooLargeError:
+            logger.warning(f"File too large: more than {MAX_FILE_SIZE} bytes")
+            raise file_too_large()
         
-        extracted_text = await processor.process_file(file.filename, file_content)
-        logger.info(f"Text extracted: {len(extracted_text)} characters")
+        if size == 0:
+            logger.warning("Empty file uploaded")
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
         
         content = Content(
             id=content_id,
             user_id=user_id,
             filename=file.filename,
             content_type=file.content_type,
-            file_url=f"/uploads/{saved_filename}",
-            extracted_text=extracted_text,
+            extraction_status=PENDING,
             created_at=datetime.utcnow()
         )
         
-        db.add(content)
-        db.commit()
-        logger.info(f"Content saved to database: {content_id}")
+        deduplicated = await asyncio.to_thread(blob_store.attach, db, content, file_path, size, sha256, file_ext)
+        logger.info(f"Content saved to database: {content_id} ({size} bytes, sha256 {sha256[:12]}, "
+                    f"{'reused existing blob' if deduplicated else 'new blob'})")
+        
+        # Text extraction is CPU-bound; poll /content/{id}/status for the result
+        if content.extraction_status == PENDING:
+            extraction_queue.enqueue(content_id)
         
         return {
             "success": True,
@@ -67,8 +97,11 @@ async def upload_content(
                 "id": content_id,
                 "filename": file.filename,
                 "type": file.content_type,
-                "extractedText": extracted_text[:500] if extracted_text else "No text extracted",
-                "fileUrl": f"/uploads/{saved_filename}",
+                "extractionStatus": content.extraction_status,
+                "fileUrl": content.file_url,
+                "size": size,
+                "sha256": sha256,
+                "deduplicated": deduplicated,
                 "timestamp": content.created_at.isoformat()
             }
         }
@@ -78,6 +111,68 @@ async def upload_content(
         logger.error(f"Upload error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to upload file. Please try again.")
 
+async def youtube_segments(url: str) -> tuple:
+    try:
+        video_id = parse_video_id(url)
+        return video_id, await transcript_store.get_segments(video_id)
+    except InvalidYouTubeURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TranscriptUnavailableError:
+        raise HTTPException(status_code=404, detail="No transcript is available for this video")
+    except Exception as e:
+        logger.error(f"YouTube transcript error: {str(e)}")
+        raise HTTPException(status_code=502, detail="Failed to fetch the YouTube transcript. Please try again.")
+
+@router.post("/youtube")
+async def import_youtube(request: YouTubeRequest, db: Session = Depends(get_db)):
+    video_id, segments = await youtube_segments(request.url)
+    text = join_segments(segments)
+    content_id = f"content_{uuid.uuid4().hex[:12]}"
+    content = Content(
+        id=content_id,
+        user_id=request.userId,
+        filename=f"youtube:{video_id}",
+        content_type="video/youtube",
+        file_url=f"https://www.youtube.com/watch?v={video_id}",
+        extracted_text=text,
+        extraction_status="completed",
+        extracted_at=datetime.utcnow(),
+        created_at=datetime.utcnow()
+    )
+    db.add(content)
+    db.commit()
+    await asyncio.to_thread(chunk_index.build, db, content_id, text)
+    await asyncio.to_thread(content_search.index, db, content)
+    logger.info(f"Imported YouTube transcript {video_id} as {content_id}")
+    
+    return {
+        "success": True,
+        "data": {
+            "id": content_id,
+            "videoId": video_id,
+            "segments": len(segments),
+            "extractionStatus": "completed",
+            "fileUrl": content.file_url,
+            "timestamp": content.created_at.isoformat()
+        }
+    }
+
+@router.get("/youtube/transcript")
+async def get_youtube_transcript(url: str):
+    video_id, segments = await youtube_segments(url)
+    return {"success": True, "data": {"videoId": video_id, "segments": segments}}
+
+@router.post("/youtube/prefetch")
+async def prefetch_youtube(request: TranscriptPrefetchRequest):
+    video_ids, invalid = [], []
+    for url in request.urls:
+        try:
+            video_ids.append(parse_video_id(url))
+        except InvalidYouTubeURLError:
+            invalid.append(url)
+    scheduled = transcript_store.prefetch(video_ids)
+    return {"success": True, "data": {"scheduled": scheduled, "invalid": invalid}}
+
 @router.get("/list")
 def list_content(user_id: str = "default_user", db: Session = Depends(get_db)):
     contents = db.query(Content).filter(Content.user_id == user_id).all()
@@ -97,20 +192,132 @@ def list_content(user_id: str = "default_user", db: Session = Depends(get_db)):
         }
     }
 
+@router.get("/search")
+def search_content(
+    q: str = Query(..., min_length=1, max_length=SEARCH_MAX_QUERY_LENGTH),
+    user_id: str = "default_user",
+    limit: int = Query(SEARCH_DEFAULT_RESULTS, ge=1, le=SEARCH_MAX_RESULTS),
+    db: Session = Depends(get_db)
+):
+    try:
+        results = content_search.search(db, user_id, q, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"success": True, "data": {"query": q, "results": results}}
+
+@router.get("/stats")
+def content_stats():
+    return {
+        "success": True,
+        "data": {
+            "extraction": extraction_queue.stats(),
+            "blobs": blob_store.stats(),
+            "search": content_search.stats(),
+            "transcripts": transcript_store.stats(),
+        }
+    }
+
 @router.get("/{content_id}")
-def get_content(content_id: str, db: Session = Depends(get_db)):
+def get_content(content_id: str, includeText: bool = True, db: Session = Depends(get_db)):
     content = db.query(Content).filter(Content.id == content_id).first()
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    return {
-        "success": True,
-        "data": {
-            "id": content.id,
-            "filename": content.filename,
-            "type": content.content_type,
-            "fileUrl": content.file_url,
-            "extractedText": content.extracted_text,
-            "timestamp": content.created_at.isoformat()
-        }
+    text_row = content.text_row
+    data = {
+        "id": content.id,
+        "filename": content.filename,
+        "type": content.content_type,
+        "fileUrl": content.file_url,
+        "extractionStatus": content.extraction_status,
+        "textLength": text_row.char_count if text_row is not None else 0,
+        "pageCount": len(content.page_offsets) if content.page_offsets else None,
+        "timestamp": content.created_at.isoformat()
     }
+    # Readers should page through /{content_id}/text instead of loading everything
+    if includeText:
+        data["extractedText"] = content.extracted_text
+    return {"success": True, "data": data}
+
+def text_etag(content: Content, mode: str, start: int, end: int) -> str:
+    # Page and range responses differ (page, pageCount), so the mode is part of the tag
+    version = f"{content.id}:{content.extracted_at.isoformat() if content.extracted_at else ''}:{mode}:{start}:{end}"
+    return '"' + hashlib.sha1(version.encode()).hexdigest()[:20] + '"'
+
+@router.get("/{content_id}/text")
+def get_content_text(
+    content_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(TEXT_PAGE_DEFAULT_CHARS, ge=1, le=TEXT_PAGE_MAX_CHARS),
+    page: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    content = db.query(Content).filter(Content.id == content_id).first()
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    text_row = content.text_row
+    if text_row is None:
+        raise HTTPException(status_code=404, detail="Content has no extracted text")
+    total = text_row.char_count
+    
+    if page is not None:
+        offsets = content.page_offsets
+        if not offsets:
+            raise HTTPException(status_code=400, detail="Content has no page information")
+        if page > len(offsets):
+            raise HTTPException(status_code=404, detail=f"Page {page} not found; document has {len(offsets)} pages")
+        start = offsets[page - 1]
+        # Pages are joined with a newline that belongs to neither page
+        end = offsets[page] - 1 if page < len(offsets) else total
+        # Trailing blank pages were trimmed from the stored text
+        start = min(start, total)
+        end = max(min(end, total), start)
+    else:
+        start, end = min(offset, total), min(offset + limit, total)
+    
+    # Only sizes and offsets have been read so far; a 304 never touches the compressed bytes
+    etag = text_etag(content, f"page{page}" if page is not None else "range", start, end)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in (request.headers.get("if-none-match") or "").replace(" ", "").split(","):
+        return Response(status_code=304, headers=headers)
+    
+    return JSONResponse(
+        content={
+            "success": True,
+            "data": {
+                "id": content.id,
+                "offset": start,
+                "length": end - start,
+                "totalLength": total,
+                "nextOffset": end if end < total else None,
+                "page": page,
+                "pageCount": len(content.page_offsets) if content.page_offsets else None,
+                "text": text_row.read(start, end)
+            }
+        },
+        headers=headers
+    )
+
+@router.get("/{content_id}/status")
+def get_extraction_status(content_id: str, db: Session = Depends(get_db)):
+    content = db.query(Content).filter(Content.id == content_id).first()
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    data = {"id": content.id, **extraction_status(content)}
+    if data["status"] == "completed" and content.text_row is not None:
+        data["preview"] = content.text_row.read(0, 500)
+        data["textSize"] = content.text_row.raw_size
+        data["storedSize"] = content.text_row.compressed_size
+    return {"success": True, "data": data}
+
+@router.delete("/{content_id}")
+def delete_content(content_id: str, db: Session = Depends(get_db)):
+    content = db.query(Content).filter(Content.id == content_id).first()
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    blob_store.release(db, content)
+    logger.info(f"Content deleted: {content_id}")
+    return {"success": True, "data": {"id": content_id}}
@@ -1,14 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from ..database import get_db
+from ..dependencies import quota_user_id
 from ..models import MindMap
 from ..services.ai_service import AIService
+from ..services.llm_errors import LLMCapacityError
+from ..services.mindmap_schema import MindMapFormatError, find_node, node_path
+from ..services.scheduler import set_llm_context
+from ..logger import setup_logger
 from datetime import datetime
+import copy
 import uuid
-import json
-import re
+
+logger = setup_logger(__name__)
 
 router = APIRouter()
 ai_service = AIService()
@@ -19,73 +25,86 @@ class MindMapRequest(BaseModel):
     data: Dict[str, Any]
 
 class GenerateMindMapRequest(BaseModel):
-    topic: str
+    topic: str = Field(min_length=1, max_length=200)
     userId: str
 
+class ExpandNodeRequest(BaseModel):
+    nodeId: str
+
 @router.post("/generate")
-async def generate_mindmap(request: GenerateMindMapRequest, db: Session = Depends(get_db)):
+async def generate_mindmap(request: GenerateMindMapRequest, db: Session = Depends(get_db),
+                           quota_user: Optional[str] = Depends(quota_user_id)):
+    set_llm_context("mindmap", quota_user)
     try:
-        prompt = f"""Create a mind map structure for the topic: "{request.topic}"
-
-Return ONLY a JSON object with this exact structure (no markdown, no explanation):
-{{
-  "central": "{request.topic}",
-  "branches": [
-    {{
-      "id": "1",
-      "label": "Main Concept 1",
-      "children": [
-        {{"id": "1.1", "label": "Sub-concept 1.1"}},
-        {{"id": "1.2", "label": "Sub-concept 1.2"}}
-      ]
-    }},
-    {{
-      "id": "2",
-      "label": "Main Concept 2",
-      "children": [
-        {{"id": "2.1", "label": "Sub-concept 2.1"}}
-      ]
-    }}
-  ]
-}}
-
-Create 4-6 main branches with 2-4 children each. Keep labels concise (2-5 words)."""
+        mindmap_data = await ai_service.generate_mindmap(request.topic)
+    except LLMCapacityError:
+        raise
+    except MindMapFormatError as e:
+        logger.error(f"Mind map generation returned invalid data: {e}")
+        raise HTTPException(status_code=502, detail="Mind map generation returned invalid data. Please try again.")
+    except Exception as e:
+        logger.error(f"Mind map generation error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to generate mind map. Please try again.")
+    
+    # Each user gets their own copy so edits never touch the cached tree
+    mindmap_id = str(uuid.uuid4())
+    mindmap = MindMap(
+        id=mindmap_id,
+        user_id=request.userId,
+        title=request.topic,
+        data=mindmap_data
+    )
+    db.add(mindmap)
+    db.commit()
+    
+    return {
+        "success": True,
+        "data": {
+            "id": mindmap_id,
+            "title": request.topic,
+            "data": mindmap_data
+        }
+    }
 
-        import asyncio
-        from functools import partial
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, partial(ai_service.model.generate_content, prompt))
-        response_text = response.text
-        
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            mindmap_data = json.loads(json_match.group())
-        else:
-            mindmap_data = json.loads(response_text)
-        
-        mindmap_id = str(uuid.uuid4())
-        mindmap = MindMap(
-            id=mindmap_id,
-            user_id=request.userId,
-            title=request.topic,
-            data=mindmap_data
-        )
-        db.add(mindmap)
+@router.post("/{mindmap_id}/expand")
+async def expand_mindmap_node(mindmap_id: str, request: ExpandNodeRequest, db: Session = Depends(get_db),
+                             quota_user: Optional[str] = Depends(quota_user_id)):
+    mindmap = db.query(MindMap).filter(MindMap.id == mindmap_id).first()
+    if not mindmap:
+        raise HTTPException(status_code=404, detail="Mind map not found")
+    set_llm_context("mindmap", quota_user)
+    
+    data = copy.deepcopy(mindmap.data or {})
+    branches = data.get("branches") or []
+    node = find_node(branches, request.nodeId)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    
+    if not node.get("children"):
+        try:
+            node["children"] = await ai_service.expand_mindmap_node(
+                data.get("central") or mindmap.title, node_path(branches, request.nodeId), request.nodeId
+            )
+        except LLMCapacityError:
+            raise
+        except MindMapFormatError as e:
+            logger.error(f"Node expansion returned invalid data: {e}")
+            raise HTTPException(status_code=502, detail="Node expansion returned invalid data. Please try again.")
+        except Exception as e:
+            logger.error(f"Node expansion error: {e}")
+            raise HTTPException(status_code=500, detail="Failed to expand node. Please try again.")
+        # JSON columns only persist on reassignment
+        mindmap.data = data
+        mindmap.updated_at = datetime.utcnow()
         db.commit()
-        
-        return {
-            "success": True,
-            "data": {
-                "id": mindmap_id,
-                "title": request.topic,
-                "data": mindmap_data
-            }
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
+    
+    return {
+        "success": True,
+        "data": {
+            "id": mindmap_id,
+            "node": node
         }
+    }
 
 @router.get("/list/{user_id}")
 def list_mindmaps(user_id: str, db: Session = Depends(get_db)):
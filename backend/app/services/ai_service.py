@@ -1,48 +1,138 @@
-import google.generativeai as genai
-from ..config import settings
 from ..cache import ai_cache
-from ..constants import GEMINI_MODEL, MAX_CHAT_HISTORY
+from ..constants import MAX_CHAT_HISTORY, QUIZ_CONTEXT_CHUNKS, TRANSFORM_CHUNK_CHARS, TRANSFORM_CONCURRENCY
 from ..logger import setup_logger
+from .llm_gateway import llm_gateway
+from .singleflight import SingleFlight
+from .llm_errors import LLMCapacityError
+from .retrieval import retrieve_chunks, sample_chunks, chunk_text
+from .quiz_parser import IncrementalQuizParser, QuizFormatError, parse_quiz_text, quiz_parse_stats
+from .chat_history import ChatHistoryManager, estimate_tokens, format_history
+from .semantic_cache import semantic_cache
+from .mindmap_schema import MindMapFormatError, normalize_topic, parse_tree, parse_children
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Callable, List
 import asyncio
-from functools import partial
+import time
 
 logger = setup_logger(__name__)
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
+# Shared by every AIService instance so identical prompts coalesce across routers
+llm_singleflight = SingleFlight()
 
 class AIService:
     def __init__(self):
-        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.gateway = llm_gateway
+        self.cache = ai_cache
+        self.singleflight = llm_singleflight
+        self.semantic_cache = semantic_cache
+        self.history = ChatHistoryManager(summarize=self._generate)
     
-    async def enhance_content(self, text: str, level: str) -> str:
-        prompt = f"""Simplify this content for a {level} level student. Make it clear and engaging:
-
+    async def _generate(self, prompt: str, cache: bool = True, validate: Callable[[str], bool] = None) -> str:
+        key = self.cache.get_key(prompt)
+        if not cache:
+            return await self.singleflight.do(key, lambda: self.gateway.generate(prompt))
+        
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            logger.info("AI response served from cache")
+            return cached
+        
+        async def generate_and_store():
+            text = await self.gateway.generate(prompt)
+            if validate is None or validate(text):
+                await self.cache.aset(key, text)
+            return text
+        
+        return await self.singleflight.do(key, generate_and_store)
+    
+    def build_transform_prompt(self, mode: str, text: str, level: str = None, part: int = 0, parts: int = 1) -> str:
+        # Sections of a longer document must stitch back together cleanly
+        section_note = ""
+        if parts > 1:
+            section_note = (f"\nThis is section {part + 1} of {parts} of a longer document. "
+                            "Do not add an introduction, conclusion or heading of your own.\n")
+        if mode == "enhance":
+            return f"""Simplify this content for a {level} level student. Make it clear and engaging:
+{section_note}
 {text}
 
 Provide a simplified version that's easy to understand."""
-        
-        response = self.model.generate_content(prompt)
-        return response.text
+        return f"""Simplify this text for better understanding:
+{section_note}
+{text}
+
+Make it clear and concise."""
     
-    async def answer_question(self, question: str, content_id: str = None, chat_history: list = None, response_type: str = "medium") -> str:
+    def split_for_transform(self, text: str, max_chars: int = TRANSFORM_CHUNK_CHARS) -> List[str]:
+        if len(text) <= max_chars:
+            return [text]
+        return chunk_text(text, max_chars, joiner="\n\n")
+    
+    async def transform_sections(self, mode: str, text: str, level: str = None,
+                                 concurrency: int = TRANSFORM_CONCURRENCY) -> AsyncIterator[str]:
+        """Map each paragraph-aligned section through the model and yield
+        the results in document order.
+
+        At most ``concurrency`` sections are in flight; the next one starts
+        as the earliest finishes. Submitting a long document all at once
+        would leave later sections queueing in the scheduler until they hit
+        its wait limit or used up their call deadline there.
+        """
+        sections = self.split_for_transform(text)
+        prompts = [self.build_transform_prompt(mode, section, level, i, len(sections)) for i, section in enumerate(sections)]
+        if len(prompts) > 1:
+            logger.info(f"Transforming {len(text)} chars in {len(prompts)} sections ({mode})")
+        pending = iter(prompts)
+        window = deque(asyncio.ensure_future(self._generate(prompt)) for prompt in islice(pending, max(concurrency, 1)))
         try:
-            history_text = ""
-            if chat_history:
-                for msg in chat_history[-MAX_CHAT_HISTORY:]:
-                    role = "User" if msg.get("role") == "user" else "Assistant"
-                    history_text += f"{role}: {msg.get('content', '')}\n"
-            
-            # Response type instructions
-            type_instructions = {
-                "basic": "Provide a simple, concise answer (2-3 sentences). Use everyday language, avoid technical jargon. Perfect for quick understanding.",
-                "medium": "Provide a balanced explanation with key concepts and examples. Include some technical terms with brief explanations. Aim for 1-2 paragraphs.",
-                "advanced": "Provide a comprehensive, in-depth answer with technical details, examples, edge cases, and best practices. Include code snippets if relevant. Explain underlying concepts thoroughly."
-            }
-            
-            instruction = type_instructions.get(response_type, type_instructions["medium"])
-            
-            prompt = f"""You are a helpful AI learning assistant for computer science students.
+            while window:
+                result = await window.popleft()
+                next_prompt = next(pending, None)
+                if next_prompt is not None:
+                    window.append(asyncio.ensure_future(self._generate(next_prompt)))
+                yield result.strip()
+        finally:
+            for task in window:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark sibling failures as retrieved
+    
+    async def transform_content(self, mode: str, text: str, level: str = None) -> str:
+        return "\n\n".join([section async for section in self.transform_sections(mode, text, level)])
+    
+    async def enhance_content(self, text: str, level: str) -> str:
+        return await self.transform_content("enhance", text, level)
+    
+    def format_context(self, chunks: list) -> str:
+        if not chunks:
+            return ""
+        sections = "\n\n".join(f"[{i+1}] {chunk}" for i, chunk in enumerate(chunks))
+        return f"Relevant excerpts from the student's course material:\n{sections}\n"
+    
+    def build_question_prompt(self, question: str, chat_history: list = None, response_type: str = "medium",
+                              context_chunks: list = None, history_summary: str = None) -> str:
+        context_text = self.format_context(context_chunks)
+        if context_text:
+            context_text += "\nUse the excerpts above when they are relevant to the question.\n"
+        
+        history_text = format_history((chat_history or [])[-MAX_CHAT_HISTORY:])
+        if history_summary:
+            history_text = f"Summary of the earlier conversation: {history_summary}\n\n{history_text}"
+        
+        # Response type instructions
+        type_instructions = {
+            "basic": "Provide a simple, concise answer (2-3 sentences). Use everyday language, avoid technical jargon. Perfect for quick understanding.",
+            "medium": "Provide a balanced explanation with key concepts and examples. Include some technical terms with brief explanations. Aim for 1-2 paragraphs.",
+            "advanced": "Provide a comprehensive, in-depth answer with technical details, examples, edge cases, and best practices. Include code snippets if relevant. Explain underlying concepts thoroughly."
+        }
+        
+        instruction = type_instructions.get(response_type, type_instructions["medium"])
+        
+        return f"""You are a helpful AI learning assistant for computer science students.
 
+{context_text}
 {history_text}
 User: {question}
 
@@ -50,31 +140,95 @@ Response Level: {response_type.upper()}
 Instructions: {instruction}
 
 Provide your answer:"""
+    
+    async def prepare_question_prompt(self, question: str, content_id: str = None, chat_history: list = None,
+                                      response_type: str = "medium", conversation_id: str = None) -> str:
+        context_chunks = await retrieve_chunks(content_id, question)
+        summary, recent = await self.history.compact(chat_history, conversation_id)
+        prompt = self.build_question_prompt(question, recent, response_type, context_chunks, summary)
+        
+        if chat_history:
+            full_tokens = estimate_tokens(format_history(chat_history))
+            kept_tokens = estimate_tokens(format_history(recent)) + estimate_tokens(summary or "")
+            logger.info(
+                f"Chat history: {len(chat_history)} messages, ~{full_tokens} tokens -> "
+                f"{len(recent)} verbatim{' + summary' if summary else ''}, ~{kept_tokens} tokens"
+            )
+        logger.info(f"Prompt length: {len(prompt)} chars (~{estimate_tokens(prompt)} tokens), context chunks: {len(context_chunks)}")
+        return prompt
+    
+    async def answer_question(self, question: str, content_id: str = None, chat_history: list = None,
+                              response_type: str = "medium", conversation_id: str = None) -> str:
+        try:
+            if not chat_history:
+                cached = self.semantic_cache.get(question, response_type, content_id)
+                if cached is not None:
+                    logger.info("Answer served from semantic cache")
+                    return cached
+            
+            prompt = await self.prepare_question_prompt(question, content_id, chat_history, response_type, conversation_id)
             
             logger.info("="*60)
             logger.info(f"🤖 CALLING GEMINI API ({response_type} response)")
-            logger.info(f"Prompt length: {len(prompt)} chars")
             logger.info("="*60)
             
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, partial(self.model.generate_content, prompt))
-            
-            if not response or not response.text:
-                raise ValueError("Empty response from Gemini API")
-            
-            answer = response.text
+            answer = await self._generate(prompt, cache=not chat_history)
             logger.info("✅ GEMINI RESPONSE RECEIVED")
             logger.info(f"Response length: {len(answer)} chars")
             logger.info(f"Response preview: {answer[:300]}...")
             logger.info("="*60)
+            if not chat_history:
+                self.semantic_cache.set(question, response_type, content_id, answer)
             return answer
+        except LLMCapacityError:
+            raise
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}", exc_info=True)
             raise Exception(f"AI service error: {str(e)}")
     
-    async def generate_quiz(self, content_id: str, num_questions: int) -> list:
-        try:
-            prompt = f"""Generate {num_questions} multiple choice questions about computer science fundamentals.
+    async def answer_question_stream(self, question: str, content_id: str = None, chat_history: list = None,
+                                     response_type: str = "medium", conversation_id: str = None) -> AsyncIterator[str]:
+        if not chat_history:
+            cached = self.semantic_cache.get(question, response_type, content_id)
+            if cached is not None:
+                logger.info("Answer served from semantic cache")
+                yield cached
+                return
+        
+        prompt = await self.prepare_question_prompt(question, content_id, chat_history, response_type, conversation_id)
+        logger.info(f"🤖 STREAMING GEMINI ANSWER ({response_type} response)")
+        
+        started_at = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        async for chunk in self.gateway.stream(prompt):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started_at) * 1000
+                logger.info(f"First token after {first_token_ms:.0f}ms")
+            parts.append(chunk)
+            yield chunk
+        
+        answer = "".join(parts)
+        if not answer:
+            raise ValueError("Empty response from Gemini API")
+        logger.info(f"✅ GEMINI STREAM COMPLETE - Response length: {len(answer)} chars")
+        if not chat_history:
+            self.semantic_cache.set(question, response_type, content_id, answer)
+    
+    def parse_quiz(self, response_text: str, num_questions: int, record_stats: bool = True) -> list:
+        return parse_quiz_text(response_text, num_questions, quiz_parse_stats if record_stats else None)
+    
+    async def build_quiz_prompt(self, content_id: str, num_questions: int, avoid: list = None) -> str:
+        context_chunks = await sample_chunks(content_id, QUIZ_CONTEXT_CHUNKS)
+        if context_chunks:
+            topic = f"based on the following course material:\n\n{self.format_context(context_chunks)}"
+        else:
+            topic = "about computer science fundamentals."
+        if avoid:
+            existing = "\n".join(f"- {question}" for question in avoid)
+            topic += f"\n\nDo not repeat or rephrase any of these existing questions:\n{existing}"
+        
+        return f"""Generate {num_questions} multiple choice questions {topic}
 
 For each question, provide EXACTLY in this format:
 Q: [question text]
@@ -86,64 +240,51 @@ Correct: [A/B/C/D]
 Explanation: [brief explanation]
 
 Separate each question with ---"""
-            
-            logger.info("Generating quiz with Gemini...")
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, partial(self.model.generate_content, prompt))
-            
-            if not response or not response.text:
-                raise ValueError("Empty response")
-            
-            # Parse the response
-            questions = []
-            blocks = response.text.split('---')
-            
-            for i, block in enumerate(blocks[:num_questions]):
-                lines = [l.strip() for l in block.strip().split('\n') if l.strip()]
-                if len(lines) < 6:
-                    continue
-                    
-                q_text = lines[0].replace('Q:', '').strip()
-                options = []
-                correct_idx = 0
-                explanation = ""
-                
-                for line in lines[1:]:
-                    if line.startswith(('A)', 'B)', 'C)', 'D)')):
-                        options.append(line[3:].strip())
-                    elif line.startswith('Correct:'):
-                        correct_letter = line.split(':')[1].strip().upper()[0]
-                        correct_idx = ord(correct_letter) - ord('A')
-                    elif line.startswith('Explanation:'):
-                        explanation = line.split(':', 1)[1].strip()
-                
-                if len(options) == 4:
-                    questions.append({
-                        "id": f"q{i+1}",
-                        "question": q_text,
-                        "options": options,
-                        "correctAnswer": correct_idx,
-                        "explanation": explanation or "Correct answer selected."
-                    })
-            
-            if not questions:
-                raise ValueError("Failed to parse questions")
-                
-            return questions
-            
-        except Exception as e:
-            logger.error(f"Quiz generation error: {e}")
-            # Return demo questions as fallback
-            return [
-                {
-                    "id": f"q{i+1}",
-                    "question": "What is a variable in programming?",
-                    "options": ["A container for data", "A loop", "A function", "A language"],
-                    "correctAnswer": 0,
-                    "explanation": "A variable stores data values."
-                }
-                for i in range(num_questions)
-            ]
+    
+    async def generate_quiz_questions(self, content_id: str, num_questions: int, avoid: list = None) -> list:
+        prompt = await self.build_quiz_prompt(content_id, num_questions, avoid)
+        
+        logger.info("Generating quiz with Gemini...")
+        response_text = await self._generate(
+            prompt,
+            cache=not avoid,
+            validate=lambda text: bool(self.parse_quiz(text, num_questions, record_stats=False))
+        )
+        
+        questions = self.parse_quiz(response_text, num_questions)
+        if not questions:
+            raise QuizFormatError("Failed to parse questions")
+        return questions
+    
+    async def generate_quiz_stream(self, content_id: str, num_questions: int) -> AsyncIterator[dict]:
+        prompt = await self.build_quiz_prompt(content_id, num_questions)
+        key = self.cache.get_key(prompt)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            logger.info("Quiz served from cache")
+            for question in self.parse_quiz(cached, num_questions):
+                yield question
+            return
+        
+        logger.info("Streaming quiz generation...")
+        parser = IncrementalQuizParser(num_questions)
+        parts = []
+        emitted = 0
+        async for chunk in self.gateway.stream(prompt):
+            parts.append(chunk)
+            for question in parser.feed(chunk):
+                emitted += 1
+                yield question
+            if parser.done:
+                break
+        for question in parser.close():
+            emitted += 1
+            yield question
+        
+        if not emitted:
+            raise QuizFormatError("Failed to parse questions")
+        logger.info(f"Streamed {emitted}/{num_questions} quiz questions")
+        await self.cache.aset(key, "".join(parts))
     
     async def generate_feedback(self, answer: str, question: str) -> str:
         prompt = f"""Provide constructive feedback on this answer:
@@ -153,15 +294,78 @@ Student Answer: {answer}
 
 Give encouraging feedback with suggestions for improvement."""
         
-        response = self.model.generate_content(prompt)
-        return response.text
+        return await self._generate(prompt, cache=False)
     
     async def simplify_content(self, text: str) -> str:
-        prompt = f"""Simplify this text for better understanding:
+        return await self.transform_content("simplify", text)
+    
+    @staticmethod
+    def _parses(parse: Callable) -> Callable[[str], bool]:
+        def check(text: str) -> bool:
+            try:
+                parse(text)
+                return True
+            except MindMapFormatError:
+                return False
+        return check
+    
+    async def generate_mindmap(self, topic: str) -> dict:
+        """Branches for ``topic`` with one level of children; deeper levels
+        are generated on demand by ``expand_mindmap_node``.
+        
+        The prompt is built from the normalized topic so every phrasing of a
+        popular topic shares one cached generation.
+        """
+        normalized = normalize_topic(topic)
+        if not normalized:
+            raise MindMapFormatError("Topic is empty")
+        prompt = f"""Create a mind map structure for the topic: "{normalized}"
 
-{text}
+Return ONLY a JSON object with this exact structure (no markdown, no explanation):
+{{
+  "central": "{normalized}",
+  "branches": [
+    {{
+      "id": "1",
+      "label": "Main Concept 1",
+      "children": [
+        {{"id": "1.1", "label": "Sub-concept 1.1"}},
+        {{"id": "1.2", "label": "Sub-concept 1.2"}}
+      ]
+    }},
+    {{
+      "id": "2",
+      "label": "Main Concept 2",
+      "children": [
+        {{"id": "2.1", "label": "Sub-concept 2.1"}}
+      ]
+    }}
+  ]
+}}
 
-Make it clear and concise."""
+Create 4-6 main branches with 2-4 children each. Keep labels concise (2-5 words)."""
         
-        response = self.model.generate_content(prompt)
-        return response.text
+        text = await self._generate(prompt, validate=self._parses(parse_tree))
+        tree = parse_tree(text)
+        data = tree.model_dump()
+        data["central"] = topic.strip()
+        for i, branch in enumerate(data["branches"]):
+            branch["id"] = str(i + 1)
+            branch["children"] = [
+                {**child, "id": f"{i + 1}.{j + 1}", "children": []} for j, child in enumerate(branch["children"])
+            ]
+        return data
+    
+    async def expand_mindmap_node(self, topic: str, path: list, node_id: str) -> list:
+        path_text = " > ".join(path)
+        prompt = f"""List the child concepts for "{normalize_topic(path_text)}" in a mind map about "{normalize_topic(topic)}".
+
+Return ONLY a JSON object with this exact structure (no markdown, no explanation):
+{{"children": [{{"id": "1", "label": "Sub-concept 1"}}, {{"id": "2", "label": "Sub-concept 2"}}]}}
+
+Create 2-4 children. Keep labels concise (2-5 words) and do not repeat "{path[-1]}"."""
+        
+        text = await self._generate(prompt, validate=self._parses(parse_children))
+        children = parse_children(text).children
+        return [{"id": f"{node_id}.{i + 1}", "label": child.label, "children": []} for i, child in enumerate(children)]
+
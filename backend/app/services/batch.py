@@ -0,0 +1,91 @@
+from typing import AsyncIterator, List
+from ..constants import (
+    MIN_ENHANCE_TEXT_LENGTH, MAX_ENHANCE_TEXT_LENGTH, MAX_TEXT_LENGTH, AI_BATCH_CONCURRENCY
+)
+from ..logger import setup_logger
+from .llm_errors import LLMCapacityError
+import asyncio
+import json
+
+logger = setup_logger(__name__)
+
+def operation_key(operation: dict) -> str:
+    fields = {"enhance": ("text", "level"), "simplify": ("text",), "feedback": ("answer", "question")}
+    op = operation["op"]
+    return json.dumps([op] + [(operation.get(field) or "").strip() for field in fields[op]])
+
+class BatchRunner:
+    """Run a list of typed AI operations with bounded concurrency.
+
+    Identical operations in the same batch are executed once and their
+    result is reported for every position that asked for it. Failures are
+    reported per item so one bad operation does not fail the batch.
+    """
+
+    def __init__(self, ai_service, concurrency: int = AI_BATCH_CONCURRENCY):
+        self.ai_service = ai_service
+        self.concurrency = concurrency
+        self.batches = 0
+        self.operations = 0
+        self.deduplicated = 0
+
+    async def _execute(self, operation: dict) -> dict:
+        op = operation["op"]
+        if op in ("enhance", "simplify"):
+            text = (operation.get("text") or "").strip()
+            if len(text) < MIN_ENHANCE_TEXT_LENGTH or len(text) > MAX_ENHANCE_TEXT_LENGTH:
+                raise ValueError(f"Text must be between {MIN_ENHANCE_TEXT_LENGTH} and {MAX_ENHANCE_TEXT_LENGTH} characters")
+            if op == "enhance":
+                return {"enhancedText": await self.ai_service.enhance_content(text, operation.get("level") or "beginner")}
+            return {"simplifiedText": await self.ai_service.simplify_content(text)}
+
+        answer = (operation.get("answer") or "").strip()
+        question = (operation.get("question") or "").strip()
+        if not answer or not question:
+            raise ValueError("Feedback requires both answer and question")
+        if len(answer) > MAX_TEXT_LENGTH or len(question) > MAX_TEXT_LENGTH:
+            raise ValueError(f"Answer and question must not exceed {MAX_TEXT_LENGTH} characters")
+        return {"feedback": await self.ai_service.generate_feedback(answer, question)}
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, operation: dict) -> dict:
+        async with semaphore:
+            try:
+                return {"success": True, "data": await self._execute(operation)}
+            except LLMCapacityError as e:
+                return {"success": False, "status": e.status_code, "error": str(e), "retryAfter": e.retry_after}
+            except ValueError as e:
+                return {"success": False, "status": 400, "error": str(e)}
+            except Exception as e:
+                logger.error(f"Batch operation {operation['op']} failed: {e}")
+                return {"success": False, "status": 500, "error": f"Failed to {operation['op']} item"}
+
+    async def run(self, operations: List[dict]) -> AsyncIterator[dict]:
+        """Yield one result per operation, in completion order."""
+        groups = {}
+        for index, operation in enumerate(operations):
+            groups.setdefault(operation_key(operation), []).append(index)
+        self.batches += 1
+        self.operations += len(operations)
+        self.deduplicated += len(operations) - len(groups)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_group(key: str):
+            return key, await self._run_one(semaphore, operations[groups[key][0]])
+
+        tasks = [asyncio.ensure_future(run_group(key)) for key in groups]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, result = await next_done
+                for index in groups[key]:
+                    yield {"index": index, "id": operations[index].get("id"), "op": operations[index]["op"], **result}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "deduplicated": self.deduplicated,
+        }
@@ -0,0 +1,177 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..constants import UPLOAD_DIR
+from ..models import Content, ContentBlob, ContentChunk, ContentChunkTerm, QuizQuestion, QuizQuestionServed
+from ..logger import setup_logger
+from .search import content_search
+import os
+
+logger = setup_logger(__name__)
+
+class BlobStore:
+    """Content-addressed storage for uploaded files.
+
+    Files are stored once per SHA-256 as ``uploads/blob_<sha256><ext>`` and
+    every Content row uploading the same bytes points at that blob. The
+    first row to upload a blob owns the work derived from it: extraction
+    runs once for the owner and other rows copy its text, while chunk
+    indexes and question banks stay keyed by the owner id and are shared
+    through ``shared_content_id``. ``ref_count`` tracks referencing rows;
+    the file and artifacts go when the last one is deleted.
+    """
+
+    def __init__(self):
+        self.stored = 0
+        self.reused = 0
+        self.bytes_saved = 0
+        self.removed = 0
+        self.takeovers = 0
+
+    def attach(self, db: Session, content: Content, staged_path: str, size: int, sha256: str,
+               ext: str, retry: bool = True) -> bool:
+        """Move ``staged_path`` into the blob store, add and commit
+        ``content`` and return whether an existing blob was reused."""
+        blob = db.query(ContentBlob).filter(ContentBlob.sha256 == sha256).first()
+        try:
+            if blob is None:
+                filename = f"blob_{sha256}{ext}"
+                os.replace(staged_path, os.path.join(UPLOAD_DIR, filename))
+                blob = ContentBlob(sha256=sha256, file_url=f"/uploads/{filename}", size=size,
+                                   ref_count=1, owner_id=content.id)
+                db.add(blob)
+                reused = False
+            else:
+                db.query(ContentBlob).filter(ContentBlob.sha256 == sha256).update(
+                    {ContentBlob.ref_count: ContentBlob.ref_count + 1}, synchronize_session=False
+                )
+                reused = True
+            content.blob_sha256 = sha256
+            content.file_url = blob.file_url
+            if reused:
+                self._copy_extraction(db, content, blob)
+            db.add(content)
+            db.commit()
+        except IntegrityError:
+            # A concurrent upload of the same bytes created the blob first
+            db.rollback()
+            if retry:
+                return self.attach(db, content, staged_path, size, sha256, ext, retry=False)
+            raise
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+        if reused:
+            if content.extraction_status == "completed":
+                content_search.index(db, content)
+            self.reused += 1
+            self.bytes_saved += size
+        else:
+            self.stored += 1
+        return reused
+
+    def owner(self, db: Session, content: Content) -> Optional[Content]:
+        """The row that owns ``content``'s blob, if it is another row."""
+        if not content.blob_sha256:
+            return None
+        owner_id = db.query(ContentBlob.owner_id).filter(ContentBlob.sha256 == content.blob_sha256).scalar()
+        if not owner_id or owner_id == content.id:
+            return None
+        return db.query(Content).filter(Content.id == owner_id).first()
+
+    def _copy_extraction(self, db: Session, content: Content, blob: ContentBlob) -> bool:
+        owner = db.query(Content).filter(Content.id == blob.owner_id).first()
+        if owner is None or owner.extraction_status == "failed":
+            self.take_over(db, content, blob)
+            return False
+        return self.copy_extraction(content, owner)
+
+    def take_over(self, db: Session, content: Content, blob: ContentBlob = None):
+        """Make ``content`` the blob's owner so it runs its own extraction.
+
+        Used when the owner's extraction failed: a timeout or a killed
+        worker must not mark every later upload of the same bytes failed.
+        """
+        blob = blob or db.query(ContentBlob).filter(ContentBlob.sha256 == content.blob_sha256).first()
+        if blob.owner_id != content.id:
+            self._rekey_artifacts(db, blob.owner_id, content.id)
+            blob.owner_id = content.id
+            self.takeovers += 1
+
+    def copy_extraction(self, content: Content, owner: Content) -> bool:
+        """Copy ``owner``'s completed extraction; False while it is still running."""
+        if owner.extraction_status != "completed":
+            return False
+        # Copy the compressed bytes rather than round-tripping the text
+        content.text_row = owner.text_row.copy() if owner.text_row is not None else None
+        content.page_offsets = owner.page_offsets
+        content.extraction_status = owner.extraction_status
+        content.extraction_error = None
+        content.extracted_at = datetime.utcnow()
+        return True
+
+    def release(self, db: Session, content: Content):
+        """Delete ``content`` and drop its reference to the shared blob."""
+        blob = None
+        if content.blob_sha256:
+            blob = db.query(ContentBlob).filter(ContentBlob.sha256 == content.blob_sha256).first()
+
+        if blob is None:
+            self._delete_artifacts(db, content.id)
+            # Imported content such as YouTube transcripts has no local file
+            local = (content.file_url or "").startswith("/uploads/")
+            path = os.path.join(UPLOAD_DIR, os.path.basename(content.file_url)) if local else None
+        elif blob.ref_count <= 1:
+            self._delete_artifacts(db, blob.owner_id)
+            db.delete(blob)
+            path = os.path.join(UPLOAD_DIR, os.path.basename(blob.file_url))
+        else:
+            blob.ref_count -= 1
+            if blob.owner_id == content.id:
+                heir = db.query(Content.id).filter(
+                    Content.blob_sha256 == blob.sha256, Content.id != content.id
+                ).order_by(Content.created_at).first()
+                if heir:
+                    self._rekey_artifacts(db, content.id, heir.id)
+                    blob.owner_id = heir.id
+            path = None
+
+        content_search.remove(db, content.id, commit=False)
+        db.delete(content)
+        db.commit()
+        if path and os.path.isfile(path):
+            os.remove(path)
+            self.removed += 1
+
+    def _delete_artifacts(self, db: Session, content_id: str):
+        question_ids = db.query(QuizQuestion.id).filter(QuizQuestion.content_id == content_id)
+        db.query(QuizQuestionServed).filter(QuizQuestionServed.question_id.in_(question_ids.scalar_subquery())).delete(synchronize_session=False)
+        db.query(QuizQuestion).filter(QuizQuestion.content_id == content_id).delete(synchronize_session=False)
+        db.query(ContentChunkTerm).filter(ContentChunkTerm.content_id == content_id).delete(synchronize_session=False)
+        db.query(ContentChunk).filter(ContentChunk.content_id == content_id).delete(synchronize_session=False)
+
+    def _rekey_artifacts(self, db: Session, old_id: str, new_id: str):
+        for model in (ContentChunk, ContentChunkTerm, QuizQuestion):
+            db.query(model).filter(model.content_id == old_id).update({model.content_id: new_id}, synchronize_session=False)
+
+    def stats(self) -> dict:
+        return {
+            "stored": self.stored,
+            "reused": self.reused,
+            "bytesSaved": self.bytes_saved,
+            "removed": self.removed,
+            "takeovers": self.takeovers,
+        }
+
+blob_store = BlobStore()
+
+def shared_content_id(db: Session, content_id: Optional[str]) -> Optional[str]:
+    """The id chunk indexes and question banks are kept under for ``content_id``."""
+    if not content_id:
+        return content_id
+    owner_id = db.query(ContentBlob.owner_id).join(
+        Content, Content.blob_sha256 == ContentBlob.sha256
+    ).filter(Content.id == content_id).scalar()
+    return owner_id or content_id
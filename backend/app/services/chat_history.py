@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+from ..constants import MAX_CHAT_HISTORY, CHAT_HISTORY_TOKEN_BUDGET, CHAT_SUMMARY_CACHE_SIZE
+from ..logger import setup_logger
+import hashlib
+import threading
+
+logger = setup_logger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting English prompts
+    return (len(text) + 3) // 4
+
+def message_tokens(msg: dict) -> int:
+    return estimate_tokens(msg.get("content", "") or "") + 4
+
+def format_history(messages: list) -> str:
+    lines = []
+    for msg in messages:
+        role = "User" if msg.get("role") == "user" else "Assistant"
+        lines.append(f"{role}: {msg.get('content', '')}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+class ChatHistoryManager:
+    """Keep chat prompts within a token budget.
+
+    Recent turns are kept verbatim; once they exceed the budget the oldest
+    ones are folded into a rolling summary. Summaries are cached under a
+    digest of the exact messages they fold, so a summary is only extended
+    when new turns fall out of the verbatim window and is never served to
+    a conversation with a different history.
+    """
+
+    def __init__(self, summarize: Callable[[str], Awaitable[str]], token_budget: int = CHAT_HISTORY_TOKEN_BUDGET,
+                 max_recent: int = MAX_CHAT_HISTORY, cache_size: int = CHAT_SUMMARY_CACHE_SIZE):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_recent = max_recent
+        self.cache_size = cache_size
+        self.summaries = OrderedDict()
+        self.lock = threading.Lock()
+        self.summaries_generated = 0
+        self.summary_cache_hits = 0
+
+    def prefix_digests(self, messages: list) -> List[str]:
+        """``digests[i]`` identifies exactly ``messages[:i + 1]``."""
+        hasher = hashlib.sha256()
+        digests = []
+        for msg in messages:
+            hasher.update(f"{msg.get('role', '')}\0{msg.get('content', '')}\0".encode("utf-8"))
+            digests.append(hasher.copy().hexdigest())
+        return digests
+
+    def _get_cached(self, namespace: str, digests: List[str]) -> Tuple[int, Optional[str]]:
+        # A summary is only reused for the exact messages it folded, so two
+        # conversations that merely start alike never share one
+        with self.lock:
+            for covered in range(len(digests), 0, -1):
+                key = (namespace, digests[covered - 1])
+                summary = self.summaries.get(key)
+                if summary is not None:
+                    self.summaries.move_to_end(key)
+                    return covered, summary
+        return 0, None
+
+    def _set_cached(self, namespace: str, digest: str, summary: str, replaces: Optional[str] = None):
+        with self.lock:
+            if replaces:
+                self.summaries.pop((namespace, replaces), None)
+            self.summaries[(namespace, digest)] = summary
+            self.summaries.move_to_end((namespace, digest))
+            while len(self.summaries) > self.cache_size:
+                self.summaries.popitem(last=False)
+
+    def _split_point(self, messages: list, target_tokens: int) -> int:
+        """Index of the first message kept verbatim under ``target_tokens``."""
+        kept_tokens = 0
+        split = len(messages)
+        while split > 0 and len(messages) - split < self.max_recent:
+            tokens = message_tokens(messages[split - 1])
+            if kept_tokens + tokens > target_tokens and split < len(messages):
+                break
+            kept_tokens += tokens
+            split -= 1
+        return split
+
+    async def compact(self, chat_history: list, conversation_id: str = None) -> Tuple[Optional[str], List[dict]]:
+        """Return ``(summary, recent_messages)`` for the prompt."""
+        messages = [m for m in (chat_history or []) if m.get("content")]
+        if not messages:
+            return None, []
+
+        namespace = conversation_id or ""
+        digests = self.prefix_digests(messages)
+        covered, summary = self._get_cached(namespace, digests)
+
+        recent = messages[covered:]
+        recent_tokens = sum(message_tokens(m) for m in recent)
+        if recent_tokens <= self.token_budget and len(recent) <= self.max_recent:
+            if summary:
+                self.summary_cache_hits += 1
+            return summary, recent
+
+        # Fold down to half the budget so the next few turns fit without
+        # regenerating the summary.
+        split = covered + self._split_point(recent, self.token_budget // 2)
+        folded = messages[covered:split]
+        if not folded:
+            return summary, recent
+        prompt = f"""Summarize this tutoring conversation so it can replace the original messages as context.
+Keep the topics covered, the student's level, open questions and any definitions or code the student was given.
+Be concise (under 150 words).
+
+{f"Summary so far: {summary}" if summary else ""}
+{format_history(folded)}
+Summary:"""
+        try:
+            summary = (await self.summarize(prompt)).strip()
+        except Exception as e:
+            logger.warning(f"History summary failed, truncating instead: {e}")
+            return summary, messages[split:]
+
+        self.summaries_generated += 1
+        self._set_cached(namespace, digests[split - 1], summary, digests[covered - 1] if covered else None)
+        return summary, messages[split:]
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self.summaries),
+            "summariesGenerated": self.summaries_generated,
+            "summaryCacheHits": self.summary_cache_hits,
+        }
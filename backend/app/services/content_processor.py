@@ -1,18 +1,36 @@
+from typing import Union
+import asyncio
 from ..utils.pdf_extractor import extract_pdf_text
 from ..utils.doc_extractor import extract_doc_text
 from ..utils.ocr_processor import extract_image_text
-from ..utils.youtube_extractor import extract_youtube_transcript
+from ..utils.youtube_extractor import join_segments, parse_video_id
+
+def read_text_file(source: Union[str, bytes]) -> str:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source).decode('utf-8', errors='ignore')
+    with open(source, encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+def extract_file(filename: str, source: Union[str, bytes]) -> str:
+    """Extract text from a saved upload (path) or raw bytes.
+
+    CPU-bound and blocking; runs in the extraction process pool.
+    """
+    filename = filename.lower()
+    if filename.endswith('.pdf'):
+        return extract_pdf_text(source)
+    elif filename.endswith(('.doc', '.docx')):
+        return extract_doc_text(source)
+    elif filename.endswith(('.png', '.jpg', '.jpeg')):
+        return extract_image_text(source)
+    else:
+        return read_text_file(source)
 
 class ContentProcessor:
-    async def process_file(self, filename: str, content: bytes) -> str:
-        if filename.endswith('.pdf'):
-            return extract_pdf_text(content)
-        elif filename.endswith(('.doc', '.docx')):
-            return extract_doc_text(content)
-        elif filename.endswith(('.png', '.jpg', '.jpeg')):
-            return extract_image_text(content)
-        else:
-            return content.decode('utf-8', errors='ignore')
+    async def process_file(self, filename: str, source: Union[str, bytes]) -> str:
+        return await asyncio.to_thread(extract_file, filename, source)
     
     async def process_youtube(self, url: str) -> str:
-        return extract_youtube_transcript(url)
+        # Imported here so extraction worker processes do not load the database layer
+        from .transcripts import transcript_store
+        return join_segments(await transcript_store.get_segments(parse_video_id(url)))
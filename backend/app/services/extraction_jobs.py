@@ -0,0 +1,232 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from ..config import settings
+from ..constants import (
+    UPLOAD_DIR, EXTRACTION_TIMEOUT_SECONDS, EXTRACTION_MAX_ATTEMPTS, EXTRACTION_RETRY_DELAY, OCR_TIMEOUT_SECONDS
+)
+from ..database import SessionLocal
+from ..models import Content
+from ..logger import setup_logger
+from ..utils.ocr_processor import run_ocr
+from ..utils.pdf_extractor import extract_pdf_pages, join_pages
+from .blobs import blob_store
+from .content_processor import extract_file
+from .retrieval import chunk_index
+from .search import content_search
+import multiprocessing
+import os
+import queue
+import threading
+
+logger = setup_logger(__name__)
+
+PENDING, PROCESSING, COMPLETED, FAILED = "pending", "processing", "completed", "failed"
+
+def upload_path(content: Content) -> str:
+    return os.path.join(UPLOAD_DIR, os.path.basename(content.file_url or ""))
+
+class ExtractionQueue:
+    """Extract text from uploads in a process pool, off the request path.
+
+    Job state lives on the Content row (extraction_status, _error,
+    _attempts), so it survives restarts: ``resume`` re-enqueues anything
+    left pending or processing. Dispatcher threads each run one job at a
+    time, so at most ``workers`` extractions are in the pool and the
+    per-job timeout measures extraction time, not queueing.
+    """
+
+    def __init__(self, workers: int = None, timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+                 max_attempts: int = EXTRACTION_MAX_ATTEMPTS, retry_delay: float = EXTRACTION_RETRY_DELAY):
+        self.workers = max(workers or settings.EXTRACTION_WORKERS, 1)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.jobs = queue.Queue()
+        self.lock = threading.Lock()
+        self.pool = None
+        self.threads = []
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.shared = 0
+        self.ocr_images = 0
+        self.ocr_stage_ms = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                # spawn: forking a process that runs threads can copy held locks
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def _recycle_pool(self, pool: ProcessPoolExecutor):
+        # A running extraction cannot be cancelled, so a timed-out job's
+        # worker is killed with its pool; other in-flight jobs are retried.
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = None
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            self.threads = [
+                threading.Thread(target=self._dispatch, name=f"extraction-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self.threads:
+            thread.start()
+
+    def enqueue(self, content_id: str, delay: float = 0):
+        self.start()
+        if delay:
+            timer = threading.Timer(delay, self.jobs.put, args=(content_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.jobs.put(content_id)
+
+    def resume(self, db) -> int:
+        rows = db.query(Content.id).filter(Content.extraction_status.in_((PENDING, PROCESSING))).all()
+        for row in rows:
+            self.enqueue(row.id)
+        if rows:
+            logger.info(f"Resumed {len(rows)} extraction jobs")
+        return len(rows)
+
+    def _dispatch(self):
+        while True:
+            content_id = self.jobs.get()
+            if content_id is None:
+                return
+            try:
+                self._run(content_id)
+            except Exception as e:
+                logger.error(f"Extraction job {content_id} crashed: {e}", exc_info=True)
+
+    def _run(self, content_id: str):
+        db = SessionLocal()
+        try:
+            content = db.query(Content).filter(Content.id == content_id).first()
+            if content is None or content.extraction_status == COMPLETED:
+                return
+            owner = blob_store.owner(db, content)
+            if owner is not None and owner.extraction_status == FAILED:
+                # Retry the bytes ourselves rather than inherit the failure
+                blob_store.take_over(db, content)
+                owner = None
+            if owner is not None:
+                # Same bytes as another upload: wait for its extraction, then copy it
+                if blob_store.copy_extraction(content, owner):
+                    db.commit()
+                    content_search.index(db, content)
+                    self.shared += 1
+                else:
+                    self.enqueue(content_id, self.retry_delay)
+                return
+            content.extraction_status = PROCESSING
+            content.extraction_attempts = (content.extraction_attempts or 0) + 1
+            db.commit()
+            attempt, filename, path = content.extraction_attempts, content.filename, upload_path(content)
+
+            pool = self._get_pool()
+            started = datetime.utcnow()
+            try:
+                text, page_offsets = self._extract(pool, filename, path)
+            except FutureTimeoutError:
+                self.timeouts += 1
+                self._recycle_pool(pool)
+                error = f"Extraction timed out after {self.timeout:g}s"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            else:
+                content.extracted_text = text
+                content.page_offsets = page_offsets
+                content.extraction_status = COMPLETED
+                content.extraction_error = None
+                content.extracted_at = datetime.utcnow()
+                db.commit()
+                chunk_index.build(db, content_id, text)
+                content_search.index(db, content)
+                self.completed += 1
+                logger.info(f"Extracted {len(text)} chars from {content_id} in {(datetime.utcnow() - started).total_seconds():.2f}s")
+                return
+
+            content.extraction_error = error
+            if attempt < self.max_attempts:
+                content.extraction_status = PENDING
+                db.commit()
+                self.retried += 1
+                delay = self.retry_delay * (2 ** (attempt - 1))
+                logger.warning(f"Extraction of {content_id} failed (attempt {attempt}/{self.max_attempts}), retrying in {delay:g}s: {error}")
+                self.enqueue(content_id, delay)
+            else:
+                content.extraction_status = FAILED
+                db.commit()
+                self.failed += 1
+                logger.error(f"Extraction of {content_id} failed after {attempt} attempts: {error}")
+        finally:
+            db.close()
+
+    def _extract(self, pool: ProcessPoolExecutor, filename: str, path: str):
+        if filename.lower().endswith(".pdf"):
+            # Page ranges fan out across the pool; a leading strip would
+            # shift every page offset, so only the tail is trimmed
+            text, offsets = join_pages(extract_pdf_pages(path, pool, self.timeout))
+            return text.rstrip(), offsets
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+            # Preparation and banded recognition both run in the pool
+            text, timings = run_ocr(path, pool, min(OCR_TIMEOUT_SECONDS, self.timeout))
+            self._record_ocr(timings)
+            return text, None
+        return pool.submit(extract_file, filename, path).result(timeout=self.timeout), None
+
+    def _record_ocr(self, timings: dict):
+        logger.info("OCR stages: " + ", ".join(f"{k}={v}" for k, v in timings.items()))
+        with self.lock:
+            self.ocr_images += 1
+            for stage, ms in timings.items():
+                if stage.endswith("Ms"):
+                    self.ocr_stage_ms[stage] = self.ocr_stage_ms.get(stage, 0) + ms
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        with self.lock:
+            pool, self.pool = self.pool, None
+            self.threads = []
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.jobs.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "timeouts": self.timeouts,
+            "shared": self.shared,
+            "ocr": {
+                "images": self.ocr_images,
+                "avgStageMs": {
+                    stage: round(total / self.ocr_images, 1) for stage, total in self.ocr_stage_ms.items()
+                } if self.ocr_images else {},
+            },
+        }
+
+extraction_queue = ExtractionQueue()
+
+def extraction_status(content: Content) -> dict:
+    return {
+        "status": content.extraction_status or COMPLETED,
+        "error": content.extraction_error,
+        "attempts": content.extraction_attempts or 0,
+        "extractedAt": content.extracted_at.isoformat() if content.extracted_at else None,
+        "pageCount": len(content.page_offsets) if content.page_offsets else None,
+    }
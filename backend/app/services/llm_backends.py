@@ -0,0 +1,163 @@
+from google.api_core import exceptions as google_exceptions
+from typing import Iterator, Tuple
+from ..config import settings
+from ..constants import GEMINI_MODEL
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+class LLMBackend:
+    """Synchronous text-generation backend driven by LLMGateway.
+
+    Implementations are called from the gateway's worker threads, so they
+    may block.
+    """
+
+    name = "base"
+    model_name = ""
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = GEMINI_MODEL):
+        import google.generativeai as genai
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY must be set when LLM_BACKEND is 'gemini'")
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt)
+        return response.text if response else ""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+class StubBackend(LLMBackend):
+    """Deterministic offline backend for tests, load tests and benchmarks.
+
+    Output depends only on the prompt: quiz prompts get well-formed
+    questions, mind map and node expansion prompts get valid JSON,
+    everything else gets a plain answer. Latency is drawn from a configurable distribution and a
+    fraction of calls can be made to fail with a retryable provider error.
+    """
+
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, distribution: str = "fixed",
+                 error_rate: float = 0.0, seed: int = 0, chunk_words: int = 8):
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown stub latency distribution: {distribution}")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.chunk_words = chunk_words
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _sample_latency(self) -> Tuple[float, bool]:
+        with self.lock:
+            self.calls += 1
+            if self.distribution == "uniform":
+                ms = self.rng.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.distribution == "lognormal":
+                # latency_ms is the median, jitter_ms the spread of the long tail
+                sigma = (self.jitter_ms / self.latency_ms) if self.latency_ms else 0
+                ms = self.latency_ms * self.rng.lognormvariate(0, sigma)
+            else:
+                ms = self.latency_ms
+            fail = self.rng.random() < self.error_rate
+        return max(ms, 0) / 1000, fail
+
+    def _before_call(self) -> float:
+        delay, fail = self._sample_latency()
+        if fail:
+            time.sleep(delay / 2)
+            raise google_exceptions.ServiceUnavailable("Injected stub backend failure")
+        return delay
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._before_call())
+        return self.respond(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        delay = self._before_call()
+        words = self.respond(prompt).split(" ")
+        chunks = [" ".join(words[i:i + self.chunk_words]) for i in range(0, len(words), self.chunk_words)]
+        # First chunk pays a third of the latency, the rest is spread evenly
+        time.sleep(delay / 3)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(delay * 2 / 3 / len(chunks))
+            yield chunk + (" " if i < len(chunks) - 1 else "")
+
+    def respond(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+
+        quiz = re.search(r"Generate (\d+) multiple choice questions", prompt)
+        if quiz:
+            return "\n---\n".join(
+                f"Q: Stub question {i + 1} ({digest})?\n"
+                f"A) Option A{i + 1}\nB) Option B{i + 1}\nC) Option C{i + 1}\nD) Option D{i + 1}\n"
+                f"Correct: {'ABCD'[i % 4]}\n"
+                f"Explanation: Option {'ABCD'[i % 4]} is correct for stub question {i + 1}."
+                for i in range(int(quiz.group(1)))
+            )
+
+        mindmap = re.search(r'mind map structure for the topic: "(.*)"', prompt)
+        if mindmap:
+            topic = mindmap.group(1)
+            return json.dumps({
+                "central": topic,
+                "branches": [
+                    {
+                        "id": str(b),
+                        "label": f"{topic} concept {b}",
+                        "children": [{"id": f"{b}.{c}", "label": f"Detail {b}.{c}"} for c in range(1, 3)]
+                    }
+                    for b in range(1, 5)
+                ]
+            })
+
+        expansion = re.search(r'child concepts for "(.*?)"', prompt)
+        if expansion:
+            label = expansion.group(1).split(" > ")[-1]
+            return json.dumps({"children": [{"id": str(c), "label": f"{label} detail {c}"} for c in range(1, 4)]})
+
+        if prompt.startswith("Summarize this tutoring conversation"):
+            return f"The student and tutor discussed earlier questions ({digest})."
+
+        return (
+            f"This is a deterministic stub answer ({digest}). "
+            "It stands in for the model so the AI endpoints can be exercised offline "
+            "with predictable content, latency and failure rates."
+        )
+
+def create_backend(name: str = None) -> LLMBackend:
+    name = (name or settings.LLM_BACKEND).lower()
+    if name == "gemini":
+        return GeminiBackend(settings.GEMINI_API_KEY)
+    if name == "stub":
+        return StubBackend(
+            latency_ms=settings.LLM_STUB_LATENCY_MS,
+            jitter_ms=settings.LLM_STUB_LATENCY_JITTER_MS,
+            distribution=settings.LLM_STUB_LATENCY_DISTRIBUTION,
+            error_rate=settings.LLM_STUB_ERROR_RATE,
+            seed=settings.LLM_STUB_SEED
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {name}")
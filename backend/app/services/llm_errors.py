@@ -0,0 +1,15 @@
+class LLMCapacityError(Exception):
+    """Raised when an LLM call is refused rather than attempted.
+
+    Routers let these propagate so the app-level handler can answer with
+    ``status_code`` and a ``Retry-After`` header.
+    """
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+class CircuitOpenError(LLMCapacityError):
+    pass
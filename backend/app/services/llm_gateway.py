@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from ..config import settings
+from ..constants import API_TIMEOUT, API_RETRY_COUNT, API_RETRY_DELAY, API_RETRY_MAX_DELAY
+from ..logger import setup_logger
+from .llm_backends import LLMBackend, create_backend
+from .resilience import CircuitBreaker, backoff_delay, is_retryable
+from .scheduler import FairScheduler, llm_call_context
+from .usage import UsageTracker, usage_tracker
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import asyncio
+import threading
+import time
+
+logger = setup_logger(__name__)
+
+_STREAM_END = object()
+
+class LLMGateway:
+    """Single entry point for every LLM call made by the backend.
+
+    Backends are synchronous, so calls run on a dedicated, sized
+    thread pool instead of the loop's default executor. A per-process
+    FairScheduler caps how many calls are in flight; callers beyond the
+    cap wait in per-user queues ordered by endpoint priority and are
+    refused with a 503 once they have waited ``LLM_MAX_QUEUE_WAIT_SECONDS``.
+
+    Every call runs under a deadline of ``API_TIMEOUT`` seconds covering
+    queueing and all attempts. Retryable provider errors are retried with
+    jittered exponential backoff, and their outcomes feed a circuit breaker
+    that rejects calls outright while Gemini is failing.
+
+    Calls are attributed to the endpoint and user in ``llm_call_context``;
+    users over their quota are refused before queueing and successful
+    calls are recorded in the usage tracker.
+    """
+
+    def __init__(self, backend: LLMBackend = None, max_concurrency: int = None, max_workers: int = None,
+                 max_queue_wait: float = None, usage: UsageTracker = None):
+        self.backend = backend or create_backend()
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.max_workers = max(max_workers or settings.LLM_EXECUTOR_WORKERS, self.max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+        self.scheduler = FairScheduler(
+            self.max_concurrency,
+            max_queue_wait if max_queue_wait is not None else settings.LLM_MAX_QUEUE_WAIT_SECONDS
+        )
+        self.usage = usage or usage_tracker
+        self.in_flight = 0
+        self.total_calls = 0
+        self.failed_calls = 0
+        self.total_wait_seconds = 0.0
+        self.total_call_seconds = 0.0
+        self.timeout = API_TIMEOUT
+        self.breaker = CircuitBreaker()
+        self.retries = 0
+        self.timeouts = 0
+
+    def _avg_call_seconds(self) -> float:
+        completed = self.total_calls - self.in_flight
+        return self.total_call_seconds / completed if completed > 0 else 1.0
+
+    @asynccontextmanager
+    async def _slot(self):
+        queued_at = time.perf_counter()
+        async with self.scheduler.slot(avg_call_seconds=self._avg_call_seconds()):
+            started_at = time.perf_counter()
+            self.total_wait_seconds += started_at - queued_at
+            self.in_flight += 1
+            self.total_calls += 1
+            try:
+                yield
+            except Exception:
+                self.failed_calls += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                self.total_call_seconds += time.perf_counter() - started_at
+
+    async def _attempt(self, prompt: str) -> str:
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(self.executor, self.backend.generate, prompt)
+            if not text:
+                raise ValueError("Empty response from LLM backend")
+            return text
+
+    async def generate(self, prompt: str) -> str:
+        endpoint, user_id = llm_call_context.get()
+        self.usage.check(user_id)
+        is_probe = self.breaker.allow()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        attempt = 0
+        try:
+            while True:
+                try:
+                    # The worker thread cannot be interrupted; on timeout it is
+                    # abandoned and finishes in the background.
+                    text = await asyncio.wait_for(self._attempt(prompt), max(deadline - loop.time(), 0))
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timeouts += 1
+                    self.breaker.record(False)
+                    delay = backoff_delay(attempt, API_RETRY_DELAY, API_RETRY_MAX_DELAY)
+                    if attempt >= API_RETRY_COUNT or loop.time() + delay >= deadline:
+                        raise
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt}/{API_RETRY_COUNT} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    is_probe = self.breaker.allow() or is_probe
+                    continue
+                self.breaker.record(True)
+                self.usage.record(user_id, endpoint, prompt, text)
+                return text
+        finally:
+            if is_probe:
+                self.breaker.release_probe()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text chunks as the model produces them.
+
+        The blocking stream is drained on the gateway pool and handed back
+        to the loop through a queue, so the slot is held for the whole
+        generation and released as soon as the consumer stops reading.
+        """
+        endpoint, user_id = llm_call_context.get()
+        self.usage.check(user_id)
+        is_probe = self.breaker.allow()
+        parts = []
+        try:
+            async with self._slot():
+                loop = asyncio.get_running_loop()
+                queue: asyncio.Queue = asyncio.Queue()
+                stop = threading.Event()
+
+                def produce():
+                    try:
+                        for text in self.backend.stream(prompt):
+                            if stop.is_set():
+                                break
+                            if text:
+                                loop.call_soon_threadsafe(queue.put_nowait, text)
+                        loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+                    except Exception as e:
+                        loop.call_soon_threadsafe(queue.put_nowait, e)
+
+                producer = loop.run_in_executor(self.executor, produce)
+                try:
+                    while True:
+                        try:
+                            # Deadline applies to the gap between chunks
+                            item = await asyncio.wait_for(queue.get(), self.timeout)
+                        except asyncio.TimeoutError:
+                            self.timeouts += 1
+                            self.breaker.record(False)
+                            raise
+                        if item is _STREAM_END:
+                            self.breaker.record(True)
+                            break
+                        if isinstance(item, Exception):
+                            if is_retryable(item):
+                                self.breaker.record(False)
+                            raise item
+                        parts.append(item)
+                        yield item
+                finally:
+                    stop.set()
+                    if producer.done() and not producer.cancelled():
+                        producer.exception()
+        finally:
+            if is_probe:
+                self.breaker.release_probe()
+            if parts:
+                # Partial streams still consumed model capacity
+                self.usage.record(user_id, endpoint, prompt, "".join(parts))
+
+    def stats(self) -> dict:
+        completed = max(self.total_calls - self.in_flight, 0)
+        return {
+            "backend": self.backend.name,
+            "maxConcurrency": self.max_concurrency,
+            "executorWorkers": self.max_workers,
+            "inFlight": self.in_flight,
+            "queueDepth": self.scheduler.depth,
+            "maxQueueDepth": self.scheduler.max_depth,
+            "totalCalls": self.total_calls,
+            "failedCalls": self.failed_calls,
+            "avgQueueWaitMs": round(self.total_wait_seconds * 1000 / self.total_calls, 2) if self.total_calls else 0.0,
+            "avgCallMs": round(self.total_call_seconds * 1000 / completed, 2) if completed else 0.0,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "circuitBreaker": self.breaker.stats(),
+            "scheduler": self.scheduler.stats(),
+        }
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,66 @@
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional
+import json
+import re
+
+class MindMapNode(BaseModel):
+    id: str
+    label: str = Field(min_length=1, max_length=120)
+    children: List["MindMapNode"] = Field(default_factory=list)
+
+class MindMapTree(BaseModel):
+    central: str = Field(min_length=1)
+    branches: List[MindMapNode] = Field(min_length=1, max_length=12)
+
+class MindMapChildren(BaseModel):
+    children: List[MindMapNode] = Field(min_length=1, max_length=8)
+
+class MindMapFormatError(ValueError):
+    pass
+
+def normalize_topic(topic: str) -> str:
+    topic = re.sub(r"[^\w\s+#./-]", " ", topic.casefold())
+    return re.sub(r"\s+", " ", topic).strip()
+
+def extract_json_object(text: str) -> dict:
+    """The outermost JSON object in a model response, tolerating code fences
+    and prose around it."""
+    text = re.sub(r"```(?:json)?", "", text)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise MindMapFormatError("No JSON object in model response")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise MindMapFormatError(f"Invalid JSON in model response: {e.msg}")
+
+def parse_tree(text: str) -> MindMapTree:
+    try:
+        return MindMapTree.model_validate(extract_json_object(text))
+    except ValidationError as e:
+        raise MindMapFormatError(f"Mind map does not match schema: {e.error_count()} errors")
+
+def parse_children(text: str) -> MindMapChildren:
+    try:
+        return MindMapChildren.model_validate(extract_json_object(text))
+    except ValidationError as e:
+        raise MindMapFormatError(f"Node expansion does not match schema: {e.error_count()} errors")
+
+def find_node(nodes: list, node_id: str) -> Optional[dict]:
+    for node in nodes:
+        if node.get("id") == node_id:
+            return node
+        found = find_node(node.get("children") or [], node_id)
+        if found:
+            return found
+    return None
+
+def node_path(nodes: list, node_id: str) -> List[str]:
+    """Labels from the top-level branch down to ``node_id``."""
+    for node in nodes:
+        if node.get("id") == node_id:
+            return [node.get("label", "")]
+        path = node_path(node.get("children") or [], node_id)
+        if path:
+            return [node.get("label", "")] + path
+    return []
@@ -0,0 +1,194 @@
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List
+from ..config import settings
+from ..constants import QUIZ_BANK_REFILL_BATCH, QUIZ_BANK_MAX_SIZE, QUIZ_BANK_AVOID_EXAMPLES
+from ..database import SessionLocal
+from ..models import QuizQuestion, QuizQuestionServed
+from ..logger import setup_logger
+from .llm_errors import LLMCapacityError
+from .scheduler import set_llm_context
+from .usage import SYSTEM_USER
+import asyncio
+import hashlib
+import re
+
+logger = setup_logger(__name__)
+
+def question_hash(text: str) -> str:
+    normalized = re.sub(r"[^a-z0-9 ]", "", re.sub(r"\s+", " ", text.lower())).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def to_quiz_item(row: QuizQuestion) -> dict:
+    return {
+        "id": f"q{row.id}",
+        "question": row.question,
+        "options": row.options,
+        "correctAnswer": row.correct_answer,
+        "explanation": row.explanation
+    }
+
+class QuestionBank:
+    """Persistent, deduplicated store of generated quiz questions.
+
+    Quizzes are drawn from the bank first, preferring questions the user
+    has not seen and that have been served least overall. The LLM is only
+    called synchronously when the bank cannot fill a request; otherwise a
+    background refill keeps the bank above the low watermark.
+    """
+
+    def __init__(self, ai_service, low_watermark: int = None):
+        self.ai_service = ai_service
+        self.low_watermark = low_watermark if low_watermark is not None else settings.QUIZ_BANK_LOW_WATERMARK
+        self.refilling = set()
+        self.served_from_bank = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.refills = 0
+
+    def store(self, db: Session, competency_id: str, content_id: str, questions: List[dict], retry: bool = True) -> int:
+        hashes = {question_hash(q["question"]): q for q in questions}
+        existing = {
+            row.question_hash for row in db.query(QuizQuestion.question_hash).filter(
+                QuizQuestion.competency_id == competency_id,
+                QuizQuestion.content_id == content_id,
+                QuizQuestion.question_hash.in_(hashes)
+            )
+        }
+        added = 0
+        for digest, q in hashes.items():
+            if digest in existing:
+                continue
+            db.add(QuizQuestion(
+                competency_id=competency_id,
+                content_id=content_id,
+                question_hash=digest,
+                question=q["question"],
+                options=q["options"],
+                correct_answer=q["correctAnswer"],
+                explanation=q["explanation"]
+            ))
+            added += 1
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker stored the same question concurrently
+            db.rollback()
+            return self.store(db, competency_id, content_id, questions, retry=False) if retry else 0
+        self.duplicates += len(questions) - added
+        return added
+
+    def _unseen_query(self, db: Session, competency_id: str, content_id: str, user_id: str = None):
+        query = db.query(QuizQuestion).filter(
+            QuizQuestion.competency_id == competency_id,
+            QuizQuestion.content_id == content_id
+        )
+        if user_id:
+            seen = db.query(QuizQuestionServed.question_id).filter(QuizQuestionServed.user_id == user_id)
+            query = query.filter(QuizQuestion.id.notin_(seen))
+        return query
+
+    def draw(self, db: Session, competency_id: str, content_id: str, user_id: str, num_questions: int,
+             allow_repeats: bool = False) -> List[dict]:
+        rows = self._unseen_query(db, competency_id, content_id, user_id).order_by(
+            QuizQuestion.served_count, QuizQuestion.id
+        ).limit(num_questions).all()
+        if allow_repeats and len(rows) < num_questions:
+            picked = {row.id for row in rows}
+            rows += [
+                row for row in db.query(QuizQuestion).filter(
+                    QuizQuestion.competency_id == competency_id,
+                    QuizQuestion.content_id == content_id
+                ).order_by(QuizQuestion.served_count, QuizQuestion.id).limit(num_questions * 2)
+                if row.id not in picked
+            ][:num_questions - len(rows)]
+        if len(rows) < num_questions and not allow_repeats:
+            return []
+
+        items = [to_quiz_item(row) for row in rows]
+        for row in rows:
+            row.served_count = (row.served_count or 0) + 1
+            if user_id:
+                exists = db.query(QuizQuestionServed.id).filter(
+                    QuizQuestionServed.user_id == user_id,
+                    QuizQuestionServed.question_id == row.id
+                ).first()
+                if not exists:
+                    db.add(QuizQuestionServed(user_id=user_id, question_id=row.id))
+        db.commit()
+        return items
+
+    def count(self, db: Session, competency_id: str, content_id: str, user_id: str = None) -> int:
+        return self._unseen_query(db, competency_id, content_id, user_id).with_entities(func.count(QuizQuestion.id)).scalar()
+
+    def recent_questions(self, db: Session, competency_id: str, content_id: str) -> List[str]:
+        rows = db.query(QuizQuestion.question).filter(
+            QuizQuestion.competency_id == competency_id,
+            QuizQuestion.content_id == content_id
+        ).order_by(QuizQuestion.id.desc()).limit(QUIZ_BANK_AVOID_EXAMPLES).all()
+        return [row.question for row in rows]
+
+    async def _generate_into_bank(self, db: Session, competency_id: str, content_id: str, num_questions: int) -> int:
+        avoid = await asyncio.to_thread(self.recent_questions, db, competency_id, content_id)
+        questions = await self.ai_service.generate_quiz_questions(content_id, num_questions, avoid=avoid)
+        added = await asyncio.to_thread(self.store, db, competency_id, content_id, questions)
+        self.generated += added
+        logger.info(f"Question bank {competency_id}/{content_id}: +{added} questions ({len(questions) - added} duplicates)")
+        return added
+
+    async def get_quiz(self, db: Session, competency_id: str, content_id: str, user_id: str, num_questions: int) -> List[dict]:
+        questions = await asyncio.to_thread(self.draw, db, competency_id, content_id, user_id, num_questions)
+        if questions:
+            self.served_from_bank += 1
+        else:
+            failure = None
+            try:
+                await self._generate_into_bank(db, competency_id, content_id, max(num_questions, QUIZ_BANK_REFILL_BATCH))
+            except LLMCapacityError:
+                raise
+            except Exception as e:
+                logger.error(f"Question bank top-up failed: {e}")
+                failure = e
+            # Questions this user has seen beat no quiz; with an empty bank the failure stands
+            questions = await asyncio.to_thread(self.draw, db, competency_id, content_id, user_id, num_questions, True)
+            if not questions and failure is not None:
+                raise failure
+
+        remaining = await asyncio.to_thread(self.count, db, competency_id, content_id, user_id)
+        if remaining < self.low_watermark:
+            self.schedule_refill(competency_id, content_id)
+        return questions
+
+    def schedule_refill(self, competency_id: str, content_id: str):
+        key = (competency_id, content_id)
+        if key in self.refilling:
+            return
+        self.refilling.add(key)
+        task = asyncio.create_task(self._refill(competency_id, content_id))
+        task.add_done_callback(lambda _: self.refilling.discard(key))
+
+    async def _refill(self, competency_id: str, content_id: str):
+        # Runs in its own task, so this does not change the request's priority
+        set_llm_context("quiz_refill", SYSTEM_USER)
+        db = SessionLocal()
+        try:
+            total = await asyncio.to_thread(self.count, db, competency_id, content_id)
+            if total >= QUIZ_BANK_MAX_SIZE:
+                return
+            self.refills += 1
+            await self._generate_into_bank(db, competency_id, content_id, QUIZ_BANK_REFILL_BATCH)
+        except Exception as e:
+            logger.error(f"Background question bank refill failed for {competency_id}/{content_id}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "servedFromBank": self.served_from_bank,
+            "generated": self.generated,
+            "duplicatesSkipped": self.duplicates,
+            "backgroundRefills": self.refills,
+            "refillsInFlight": len(self.refilling),
+            "lowWatermark": self.low_watermark,
+        }
@@ -0,0 +1,162 @@
+from typing import List, Optional
+import re
+import threading
+
+QUESTION_RE = re.compile(r"^(?:q(?:uestion)?\s*\d*\s*[:.)]|\d+\s*[.)])\s*(.*)$", re.IGNORECASE)
+OPTION_RE = re.compile(r"^\(?([a-d])\s*[).:\]]\s*(.+)$", re.IGNORECASE)
+CORRECT_RE = re.compile(r"^(?:correct(?:\s+answer)?|answer)\s*[:\-]\s*\(?([a-d])\b", re.IGNORECASE)
+EXPLANATION_RE = re.compile(r"^explanation\s*[:\-]\s*(.*)$", re.IGNORECASE)
+SEPARATOR_RE = re.compile(r"^-{3,}$")
+
+FILLER_OPTION = "None of the above"
+DEFAULT_EXPLANATION = "Correct answer selected."
+
+class QuizFormatError(ValueError):
+    pass
+
+class QuizParseStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"parsed": 0, "repaired": 0, "rejected": 0}
+
+    def record(self, outcome: str):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        accepted = counts["parsed"] + counts["repaired"]
+        return {**counts, "successRate": round(accepted / total, 4) if total else 0.0}
+
+quiz_parse_stats = QuizParseStats()
+
+class IncrementalQuizParser:
+    """Parse ``Q:/A)-D)/Correct:/Explanation:`` quiz blocks as text streams in.
+
+    ``feed`` returns every question whose ``Explanation:`` line was closed by
+    the chunk, so callers can forward questions while the model is still
+    generating the rest. Blocks are validated strictly; small defects such
+    as a lowercase answer letter, markdown emphasis, a missing fourth option
+    or a missing explanation are repaired, anything else is rejected.
+    """
+
+    def __init__(self, max_questions: int, stats: Optional[QuizParseStats] = quiz_parse_stats):
+        self.max_questions = max_questions
+        self.stats = stats
+        self.buffer = ""
+        self.block = None
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.buffer += chunk
+        lines = self.buffer.split("\n")
+        self.buffer = lines.pop()
+        questions = []
+        for line in lines:
+            question = self._consume(line)
+            if question:
+                questions.append(question)
+        return questions
+
+    def close(self) -> List[dict]:
+        questions = []
+        if self.buffer:
+            question = self._consume(self.buffer)
+            self.buffer = ""
+            if question:
+                questions.append(question)
+        question = self._finish_block()
+        if question:
+            questions.append(question)
+        return questions
+
+    @property
+    def done(self) -> bool:
+        return self.emitted >= self.max_questions
+
+    def _new_block(self) -> dict:
+        return {"question": "", "options": {}, "correct": None, "explanation": None}
+
+    def _consume(self, raw_line: str) -> Optional[dict]:
+        if self.done:
+            return None
+        line = raw_line.strip().strip("*_#").strip()
+        line = re.sub(r"\*\*|__", "", line)
+        if not line:
+            return None
+
+        if SEPARATOR_RE.match(line):
+            return self._finish_block()
+
+        match = QUESTION_RE.match(line)
+        if match and not OPTION_RE.match(line):
+            finished = self._finish_block() if self.block and self.block["options"] else None
+            self.block = self._new_block()
+            self.block["question"] = match.group(1).strip()
+            return finished
+
+        if self.block is None:
+            self.block = self._new_block()
+        block = self.block
+
+        match = OPTION_RE.match(line)
+        if match and block["question"]:
+            block["options"][match.group(1).upper()] = match.group(2).strip()
+            return None
+
+        match = CORRECT_RE.match(line)
+        if match:
+            block["correct"] = match.group(1).upper()
+            return None
+
+        match = EXPLANATION_RE.match(line)
+        if match:
+            block["explanation"] = match.group(1).strip()
+            return self._finish_block()
+
+        if not block["options"]:
+            block["question"] = f"{block['question']} {line}".strip()
+        return None
+
+    def _finish_block(self) -> Optional[dict]:
+        block, self.block = self.block, None
+        if block is None or not block["options"]:
+            # Stray prose between blocks, not a question attempt
+            return None
+
+        repaired = False
+        letters = sorted(block["options"])
+        options = [block["options"][letter] for letter in letters]
+        if (not block["question"] or len(options) < 3 or block["correct"] not in block["options"]
+                or len(set(o.lower() for o in options)) != len(options)):
+            if self.stats:
+                self.stats.record("rejected")
+            return None
+
+        correct_index = letters.index(block["correct"])
+        if letters != list("ABCD"[:len(letters)]):
+            repaired = True
+        if len(options) == 3:
+            options.append(FILLER_OPTION)
+            repaired = True
+        explanation = block["explanation"]
+        if not explanation:
+            explanation = DEFAULT_EXPLANATION
+            repaired = True
+
+        if self.stats:
+            self.stats.record("repaired" if repaired else "parsed")
+        self.emitted += 1
+        return {
+            "id": f"q{self.emitted}",
+            "question": block["question"],
+            "options": options,
+            "correctAnswer": correct_index,
+            "explanation": explanation
+        }
+
+def parse_quiz_text(text: str, max_questions: int, stats: Optional[QuizParseStats] = quiz_parse_stats) -> List[dict]:
+    parser = IncrementalQuizParser(max_questions, stats)
+    return parser.feed(text) + parser.close()
@@ -0,0 +1,111 @@
+from collections import deque
+from google.api_core import exceptions as google_exceptions
+from ..constants import (
+    BREAKER_WINDOW_SECONDS, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_COOLDOWN_SECONDS
+)
+from ..logger import setup_logger
+from .llm_errors import CircuitOpenError
+import asyncio
+import random
+import threading
+import time
+
+logger = setup_logger(__name__)
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+)
+
+def is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, RETRYABLE_ERRORS)
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding time window.
+
+    closed -> open when at least ``min_calls`` outcomes in the window have an
+    error rate of ``error_rate`` or more. After ``cooldown`` seconds one probe
+    call is let through (half_open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, window: float = BREAKER_WINDOW_SECONDS, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.outcomes = deque()
+        self.transitions = {}
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, state: str):
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning(f"LLM circuit breaker {key}")
+        self.state = state
+        if state == "open":
+            self.opened_at = time.monotonic()
+        if state == "closed":
+            self.outcomes.clear()
+
+    def allow(self) -> bool:
+        """Raise CircuitOpenError if the call must be rejected.
+
+        Returns True when the caller was admitted as the half-open probe and
+        must call ``release_probe`` once it finishes.
+        """
+        with self.lock:
+            if self.state == "closed":
+                return False
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if self.state == "open" and remaining <= 0:
+                self._transition("half_open")
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.rejected += 1
+            raise CircuitOpenError("AI service is temporarily unavailable. Please try again shortly.", max(remaining, 1))
+
+    def record(self, success: bool):
+        with self.lock:
+            now = time.monotonic()
+            if self.state == "half_open":
+                self.probe_in_flight = False
+                self._transition("closed" if success else "open")
+                return
+            if self.state == "open":
+                return
+            self.outcomes.append((now, success))
+            while self.outcomes and self.outcomes[0][0] < now - self.window:
+                self.outcomes.popleft()
+            failures = sum(1 for _, ok in self.outcomes if not ok)
+            if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+                self._transition("open")
+
+    def release_probe(self):
+        """Free the half-open probe slot if its call ended without an outcome."""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "windowCalls": len(self.outcomes),
+            "windowFailures": sum(1 for _, ok in self.outcomes if not ok),
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+        }
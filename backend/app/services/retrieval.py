@@ -0,0 +1,152 @@
+from collections import Counter
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from typing import List
+from ..database import SessionLocal
+from ..models import ContentChunk, ContentChunkTerm
+from ..constants import RETRIEVAL_CHUNK_CHARS, RETRIEVAL_TOP_K, BM25_K1, BM25_B
+from ..logger import setup_logger
+import asyncio
+import math
+import re
+
+logger = setup_logger(__name__)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "for",
+    "from", "how", "i", "if", "in", "into", "is", "it", "its", "of", "on", "or", "so",
+    "that", "the", "their", "then", "there", "these", "this", "to", "was", "we", "what",
+    "when", "where", "which", "while", "who", "why", "will", "with", "you", "your",
+}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def chunk_text(text: str, max_chars: int = RETRIEVAL_CHUNK_CHARS, joiner: str = "\n") -> List[str]:
+    """Pack paragraphs into chunks of roughly ``max_chars``, splitting
+    oversized paragraphs on sentence boundaries."""
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks = []
+    current = []
+    current_len = 0
+    for piece in pieces:
+        if current and current_len + len(piece) + 1 > max_chars:
+            chunks.append(joiner.join(current))
+            current = []
+            current_len = 0
+        current.append(piece)
+        current_len += len(piece) + 1
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+class ChunkIndex:
+    """BM25 index over the extracted text of uploaded content.
+
+    Chunks and per-chunk term frequencies live in SQLite so a query only
+    reads the postings for its own terms plus the winning chunk texts.
+    """
+
+    def build(self, db: Session, content_id: str, text: str, max_chars: int = RETRIEVAL_CHUNK_CHARS) -> int:
+        db.query(ContentChunkTerm).filter(ContentChunkTerm.content_id == content_id).delete()
+        db.query(ContentChunk).filter(ContentChunk.content_id == content_id).delete()
+
+        chunk_rows = []
+        term_rows = []
+        for position, chunk in enumerate(chunk_text(text or "", max_chars)):
+            tokens = tokenize(chunk)
+            chunk_rows.append({"content_id": content_id, "position": position, "text": chunk, "token_count": len(tokens)})
+            for term, tf in Counter(tokens).items():
+                term_rows.append({"content_id": content_id, "term": term, "position": position, "tf": tf})
+
+        if chunk_rows:
+            db.execute(insert(ContentChunk), chunk_rows)
+        if term_rows:
+            db.execute(insert(ContentChunkTerm), term_rows)
+        db.commit()
+        logger.info(f"Indexed {len(chunk_rows)} chunks for {content_id}")
+        return len(chunk_rows)
+
+    def search(self, db: Session, content_id: str, query: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        total_chunks, avg_tokens = db.query(
+            func.count(ContentChunk.id), func.avg(ContentChunk.token_count)
+        ).filter(ContentChunk.content_id == content_id).one()
+        if not total_chunks:
+            return []
+        avg_tokens = avg_tokens or 1
+
+        postings = db.query(ContentChunkTerm.term, ContentChunkTerm.position, ContentChunkTerm.tf).filter(
+            ContentChunkTerm.content_id == content_id,
+            ContentChunkTerm.term.in_(terms)
+        ).all()
+        if not postings:
+            return []
+
+        doc_freq = Counter(term for term, _, _ in postings)
+        lengths = dict(db.query(ContentChunk.position, ContentChunk.token_count).filter(
+            ContentChunk.content_id == content_id,
+            ContentChunk.position.in_({position for _, position, _ in postings})
+        ).all())
+
+        scores = Counter()
+        for term, position, tf in postings:
+            idf = math.log(1 + (total_chunks - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * (lengths.get(position, 0) / avg_tokens))
+            scores[position] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        top_positions = [position for position, _ in scores.most_common(k)]
+        return self._load_chunks(db, content_id, top_positions)
+
+    def sample(self, db: Session, content_id: str, k: int) -> List[str]:
+        total_chunks = db.query(func.count(ContentChunk.id)).filter(ContentChunk.content_id == content_id).scalar()
+        if not total_chunks:
+            return []
+        step = max(total_chunks / k, 1)
+        positions = sorted({int(i * step) for i in range(min(k, total_chunks))})
+        return self._load_chunks(db, content_id, positions)
+
+    def _load_chunks(self, db: Session, content_id: str, positions: List[int]) -> List[str]:
+        if not positions:
+            return []
+        rows = db.query(ContentChunk.text).filter(
+            ContentChunk.content_id == content_id,
+            ContentChunk.position.in_(positions)
+        ).order_by(ContentChunk.position).all()
+        return [row.text for row in rows]
+
+chunk_index = ChunkIndex()
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+async def retrieve_chunks(content_id: str, query: str, k: int = RETRIEVAL_TOP_K) -> List[str]:
+    if not content_id:
+        return []
+    return await asyncio.to_thread(_with_session, chunk_index.search, content_id, query, k)
+
+async def sample_chunks(content_id: str, k: int) -> List[str]:
+    if not content_id:
+        return []
+    return await asyncio.to_thread(_with_session, chunk_index.sample, content_id, k)
@@ -0,0 +1,212 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from ..constants import LLM_PRIORITY_WEIGHTS, LLM_ENDPOINT_PRIORITIES, LLM_WAIT_BUCKETS_MS
+from .llm_errors import LLMCapacityError
+import asyncio
+import time
+
+# (endpoint, user) of the request an LLM call is made for. Set by routers;
+# tasks spawned while handling the request inherit it.
+llm_call_context: ContextVar = ContextVar("llm_call_context", default=("default", None))
+
+def set_llm_context(endpoint: str, user_id: Optional[str] = None):
+    llm_call_context.set((endpoint, user_id))
+
+def priority_for(endpoint: str) -> str:
+    return LLM_ENDPOINT_PRIORITIES.get(endpoint, "standard")
+
+class QueueTimeoutError(LLMCapacityError):
+    pass
+
+class WaitHistogram:
+    def __init__(self, bounds_ms=LLM_WAIT_BUCKETS_MS):
+        self.bounds_ms = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)
+        self.total = 0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        for i, bound in enumerate(self.bounds_ms):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (ms)."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds_ms[i] if i < len(self.bounds_ms) else float("inf")
+        return float("inf")
+
+    def stats(self) -> dict:
+        buckets = {f"le{bound}": count for bound, count in zip(self.bounds_ms, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {"count": self.total, "p50Ms": self.percentile(0.5), "p99Ms": self.percentile(0.99), "buckets": buckets}
+
+class _Waiter:
+    __slots__ = ("future", "priority", "user", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: str, user: str):
+        self.future = future
+        self.priority = priority
+        self.user = user
+        self.enqueued_at = time.perf_counter()
+
+class FairScheduler:
+    """Hand out a fixed number of LLM slots fairly.
+
+    Waiters are grouped into priority classes served by stride scheduling
+    in proportion to ``LLM_PRIORITY_WEIGHTS``, so interactive traffic gets
+    most slots during a burst without starving background work. Within a
+    class each user has a FIFO queue and users are served round-robin, so
+    one client issuing many calls only delays its own requests.
+    """
+
+    def __init__(self, capacity: int, max_wait: float, weights: dict = LLM_PRIORITY_WEIGHTS):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.weights = weights
+        self._loop = None
+        self._reset()
+        self.granted = {priority: 0 for priority in weights}
+        self.rejected = {priority: 0 for priority in weights}
+        self.histograms = {priority: WaitHistogram() for priority in weights}
+        self.max_depth = 0
+
+    def _reset(self):
+        self.in_use = 0
+        self.queues = {priority: OrderedDict() for priority in self.weights}
+        self.passes = {priority: 0.0 for priority in self.weights}
+        self.depth = 0
+
+    def _bind_loop(self):
+        # Futures belong to one loop; tests and reloads may start new ones
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._reset()
+        return loop
+
+    def _enqueue(self, waiter: _Waiter):
+        queues = self.queues[waiter.priority]
+        if not queues:
+            # An idle class rejoins at the current virtual time instead of
+            # spending credit it built up while empty
+            active = [self.passes[p] for p, q in self.queues.items() if q]
+            if active:
+                self.passes[waiter.priority] = max(self.passes[waiter.priority], min(active))
+        queues.setdefault(waiter.user, deque()).append(waiter)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def _remove(self, waiter: _Waiter):
+        queues = self.queues[waiter.priority]
+        user_queue = queues.get(waiter.user)
+        if user_queue and waiter in user_queue:
+            user_queue.remove(waiter)
+            self.depth -= 1
+            if not user_queue:
+                del queues[waiter.user]
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        active = [p for p, q in self.queues.items() if q]
+        if not active:
+            return None
+        priority = min(active, key=lambda p: (self.passes[p], -self.weights[p]))
+        self.passes[priority] += 1 / self.weights[priority]
+        queues = self.queues[priority]
+        user, user_queue = next(iter(queues.items()))
+        waiter = user_queue.popleft()
+        del queues[user]
+        if user_queue:
+            queues[user] = user_queue  # back of the round-robin
+        self.depth -= 1
+        return waiter
+
+    def _dispatch(self):
+        while self.in_use < self.capacity:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self.in_use += 1
+            waiter.future.set_result(None)
+
+    def _grant(self, priority: str, waited: float):
+        self.granted[priority] += 1
+        self.histograms[priority].observe(waited)
+
+    def release(self):
+        self.in_use -= 1
+        self._dispatch()
+
+    def retry_after(self, avg_call_seconds: float) -> float:
+        return max(avg_call_seconds, 0.5) * (self.depth / max(self.capacity, 1) + 1)
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str = None, user_id: str = None, avg_call_seconds: float = 1.0):
+        if endpoint is None:
+            endpoint, user_id = llm_call_context.get()
+        priority = priority_for(endpoint)
+        loop = self._bind_loop()
+
+        if self.in_use < self.capacity and not self.depth:
+            self.in_use += 1
+            self._grant(priority, 0.0)
+        else:
+            waiter = _Waiter(loop.create_future(), priority, user_id or "anonymous")
+            self._enqueue(waiter)
+            try:
+                done, _ = await asyncio.wait({waiter.future}, timeout=self.max_wait)
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self.release()
+                else:
+                    self._remove(waiter)
+                    waiter.future.cancel()
+                raise
+            if not done:
+                self._remove(waiter)
+                waiter.future.cancel()
+                self.rejected[priority] += 1
+                raise QueueTimeoutError(
+                    f"AI service is busy: no {priority} capacity within {self.max_wait:g}s",
+                    retry_after=self.retry_after(avg_call_seconds)
+                )
+            self._grant(priority, time.perf_counter() - waiter.enqueued_at)
+
+        try:
+            yield priority
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "inUse": self.in_use,
+            "queueDepth": self.depth,
+            "maxQueueDepth": self.max_depth,
+            "maxWaitSeconds": self.max_wait,
+            "classes": {
+                priority: {
+                    "weight": self.weights[priority],
+                    "queued": sum(len(q) for q in self.queues[priority].values()),
+                    "waitingUsers": len(self.queues[priority]),
+                    "granted": self.granted[priority],
+                    "rejected": self.rejected[priority],
+                    "waitMs": self.histograms[priority].stats(),
+                }
+                for priority in self.weights
+            },
+        }
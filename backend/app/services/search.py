@@ -0,0 +1,235 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from typing import List
+from ..constants import SEARCH_SNIPPET_TOKENS, SEARCH_MAX_TERMS
+from ..database import SessionLocal
+from ..models import Content
+from ..logger import setup_logger
+import hashlib
+import html
+import re
+
+logger = setup_logger(__name__)
+
+# Control characters cannot occur in extracted text after html escaping,
+# so snippets are marked with them and turned into <mark> afterwards
+MARK_START, MARK_END = "\x02", "\x03"
+
+# Contentless FTS5: only the index is stored, the text stays compressed in
+# content_texts. A side table maps FTS rowids to content and keeps a digest
+# of what was indexed, because removing a row from a contentless table
+# needs the exact values it was indexed with.
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS content_fts_docs (
+        id INTEGER PRIMARY KEY,
+        content_id VARCHAR UNIQUE,
+        user_id VARCHAR,
+        digest VARCHAR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_content_fts_docs_user ON content_fts_docs (user_id)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5("
+    "filename, body, content='', tokenize='porter unicode61')",
+]
+
+# Only the tsvector is stored; the text is passed in when the row is written
+POSTGRES_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS content_search (
+        content_id VARCHAR PRIMARY KEY,
+        user_id VARCHAR,
+        document TSVECTOR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_content_search_document ON content_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_content_search_user ON content_search (user_id)",
+]
+
+def highlight(snippet: str) -> str:
+    return html.escape(snippet or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+def search_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:SEARCH_MAX_TERMS]
+
+def index_digest(filename: str, body: str) -> str:
+    return hashlib.sha1(f"{filename}\0{body}".encode("utf-8")).hexdigest()
+
+def make_snippet(body: str, terms: List[str], tokens: int = SEARCH_SNIPPET_TOKENS) -> str:
+    """``tokens`` words around the densest cluster of matched terms, with
+    matches wrapped in MARK_START/MARK_END.
+
+    Terms match as word prefixes, which approximates the stemmed matching
+    of the index closely enough for highlighting.
+    """
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    window = tokens * 8
+    best, best_terms = 0, 0
+    matches = []
+    for match in pattern.finditer(body):
+        matches.append((match.start(), match.group().lower()))
+        # Distinct terms among the recent matches that fit in one window
+        while matches[0][0] < match.start() - window:
+            matches.pop(0)
+        found = len({term for term in terms for _, word in matches if word.startswith(term)})
+        if found > best_terms:
+            best, best_terms = matches[0][0], found
+            if found == len(terms):
+                break
+    lead = max(best - 40, 0)
+    words = list(re.finditer(r"\w+", body[lead:best + window * 2]))
+    first = next((i for i, word in enumerate(words) if lead + word.start() >= best), 0)
+    words = words[max(first - 3, 0):max(first - 3, 0) + tokens]
+    if not words:
+        return ""
+    start, end = lead + words[0].start(), lead + words[-1].end()
+    snippet = pattern.sub(lambda m: MARK_START + m.group() + MARK_END, body[start:end])
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(body) else "")
+
+class ContentSearch:
+    """Full-text index over extracted text, scoped per user.
+
+    SQLite uses a contentless FTS5 table ranked by bm25 with filename
+    matches weighted above body matches; Postgres uses a table with a
+    GIN-indexed tsvector ranked by ts_rank_cd. Neither stores the text
+    itself: snippets are cut from the compressed ContentText of the few
+    documents returned. Rows are written when extraction finishes and
+    removed with the content.
+    """
+
+    def __init__(self):
+        self.dialect = None
+        self.indexed = 0
+        self.queries = 0
+        self.orphaned = 0
+
+    def setup(self, engine: Engine):
+        self.dialect = engine.dialect.name
+        with engine.begin() as conn:
+            if self.dialect == "sqlite":
+                schema = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'content_fts'")).scalar()
+                if schema and "content=''" not in schema:
+                    # Earlier layout kept a full copy of every document
+                    conn.execute(text("DROP TABLE content_fts"))
+                    schema = None
+                created = schema is None
+                for statement in SQLITE_SCHEMA:
+                    conn.execute(text(statement))
+            elif self.dialect == "postgresql":
+                if conn.execute(text(
+                    "SELECT 1 FROM information_schema.columns WHERE table_name = 'content_search' AND column_name = 'body'"
+                )).first():
+                    conn.execute(text("DROP TABLE content_search"))
+                created = not conn.execute(text("SELECT to_regclass('content_search')")).scalar()
+                for statement in POSTGRES_SCHEMA:
+                    conn.execute(text(statement))
+            else:
+                logger.warning(f"Content search is not available on {self.dialect}")
+                self.dialect = None
+                return
+        if created:
+            self.backfill()
+
+    def backfill(self):
+        db = SessionLocal()
+        try:
+            count = 0
+            for content in db.query(Content).filter(Content.extraction_status == "completed").yield_per(100):
+                if content.text_row is not None:
+                    self.index(db, content, commit=False)
+                    count += 1
+            db.commit()
+            if count:
+                logger.info(f"Indexed {count} existing documents for search")
+        finally:
+            db.close()
+
+    def index(self, db: Session, content: Content, commit: bool = True):
+        if not self.dialect:
+            return
+        self.remove(db, content.id, commit=False)
+        filename, body = content.filename or "", content.extracted_text or ""
+        if self.dialect == "sqlite":
+            rowid = db.execute(
+                text("INSERT INTO content_fts_docs (content_id, user_id, digest) VALUES (:id, :user, :digest)"),
+                {"id": content.id, "user": content.user_id, "digest": index_digest(filename, body)}
+            ).lastrowid
+            db.execute(
+                text("INSERT INTO content_fts (rowid, filename, body) VALUES (:rowid, :filename, :body)"),
+                {"rowid": rowid, "filename": filename, "body": body}
+            )
+        else:
+            db.execute(text(
+                "INSERT INTO content_search (content_id, user_id, document) VALUES (:id, :user, "
+                "setweight(to_tsvector('english', :filename), 'A') || setweight(to_tsvector('english', :body), 'B'))"
+            ), {"id": content.id, "user": content.user_id, "filename": filename, "body": body})
+        if commit:
+            db.commit()
+        self.indexed += 1
+
+    def remove(self, db: Session, content_id: str, commit: bool = True):
+        if not self.dialect:
+            return
+        if self.dialect == "sqlite":
+            row = db.execute(
+                text("SELECT id, digest FROM content_fts_docs WHERE content_id = :id"), {"id": content_id}
+            ).first()
+            if row is not None:
+                content = db.get(Content, content_id)
+                filename = (content.filename or "") if content else ""
+                body = (content.extracted_text or "") if content else ""
+                if content is not None and index_digest(filename, body) == row.digest:
+                    db.execute(
+                        text("INSERT INTO content_fts (content_fts, rowid, filename, body) VALUES ('delete', :rowid, :filename, :body)"),
+                        {"rowid": row.id, "filename": filename, "body": body}
+                    )
+                else:
+                    # The indexed text is gone; its terms stay in the index but
+                    # no longer map to a document, so they never match
+                    self.orphaned += 1
+                db.execute(text("DELETE FROM content_fts_docs WHERE id = :rowid"), {"rowid": row.id})
+        else:
+            db.execute(text("DELETE FROM content_search WHERE content_id = :id"), {"id": content_id})
+        if commit:
+            db.commit()
+
+    def search(self, db: Session, user_id: str, query: str, limit: int) -> List[dict]:
+        if not self.dialect:
+            raise RuntimeError("Content search is not configured for this database")
+        terms = search_terms(query)
+        if not terms:
+            return []
+        self.queries += 1
+        if self.dialect == "sqlite":
+            # Quote every term so user input cannot use FTS5 operators; the
+            # last term matches as a prefix for search-as-you-type
+            match = " ".join(f'"{term}"' for term in terms) + "*"
+            rows = db.execute(text(
+                "SELECT docs.content_id, bm25(content_fts, 5.0, 1.0) AS score "
+                "FROM content_fts JOIN content_fts_docs docs ON docs.id = content_fts.rowid "
+                "WHERE content_fts MATCH :match AND docs.user_id = :user "
+                "ORDER BY score LIMIT :limit"
+            ), {"match": match, "user": user_id, "limit": limit}).all()
+            # bm25 is lower-is-better; report higher-is-better like Postgres
+            scores = {row.content_id: -row.score for row in rows}
+        else:
+            rows = db.execute(text(
+                "SELECT content_id, ts_rank_cd(document, query) AS score "
+                "FROM content_search, to_tsquery('english', :match) query "
+                "WHERE user_id = :user AND document @@ query "
+                "ORDER BY score DESC LIMIT :limit"
+            ), {"match": " & ".join(terms) + ":*", "user": user_id, "limit": limit}).all()
+            scores = {row.content_id: row.score for row in rows}
+
+        contents = {content.id: content for content in db.query(Content).filter(Content.id.in_(list(scores)))}
+        return [
+            {
+                "id": content_id,
+                "filename": contents[content_id].filename,
+                "snippet": highlight(make_snippet(contents[content_id].extracted_text or "", terms)),
+                "score": round(float(score), 4)
+            }
+            for content_id, score in scores.items() if content_id in contents
+        ]
+
+    def stats(self) -> dict:
+        return {"backend": self.dialect, "indexed": self.indexed, "queries": self.queries, "orphaned": self.orphaned}
+
+content_search = ContentSearch()
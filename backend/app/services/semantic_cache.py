@@ -0,0 +1,216 @@
+from collections import Counter
+from typing import List, Optional
+from ..config import settings
+from ..constants import (
+    SEMANTIC_CACHE_DIM, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_HIT_WEIGHT_SECONDS, AI_CACHE_TTL_SECONDS
+)
+from .retrieval import STOPWORDS
+import numpy as np
+import re
+import threading
+import time
+import zlib
+
+# Words that change how a question is phrased but not what it asks about
+QUESTION_FILLER = {
+    "explain", "define", "definition", "describe", "tell", "me", "about", "mean", "means", "meant",
+    "please", "understand", "help", "know", "give", "show", "could", "would", "should", "whats",
+    "difference", "between", "vs", "versus", "compare", "use", "using",
+}
+
+def question_tokens(text: str) -> List[str]:
+    # Keeps one-letter words and trailing +/# so "c", "r", "c++" and "c#" stay distinct
+    return [t for t in re.findall(r"[a-z0-9]+[+#]*", text.lower()) if t not in STOPWORDS and t not in QUESTION_FILLER]
+
+def is_key_token(token: str) -> bool:
+    """Short or symbolic tokens (language names, versions, acronyms) barely
+    move a cosine score but change what is being asked."""
+    return len(token) <= 3 or any(not c.isalpha() for c in token)
+
+def key_tokens(text: str) -> frozenset:
+    return frozenset(t for t in question_tokens(text) if is_key_token(t))
+
+def stem(word: str) -> str:
+    # Fold plurals so "linked lists" and "linked list" share word features
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def question_features(text: str) -> List[str]:
+    words = [stem(w) for w in question_tokens(text)]
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        for n in (3, 4, 5):
+            features += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+    return features
+
+def hash_vector(text: str, dim: int = SEMANTIC_CACHE_DIM) -> np.ndarray:
+    """Sublinear term-frequency vector of hashed word and character n-grams."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, count in Counter(question_features(text)).items():
+        vector[zlib.crc32(feature.encode("utf-8")) % dim] += 1 + np.log(count)
+    return vector
+
+class SemanticIndex:
+    """Dense matrix of hashed n-gram vectors for one response namespace.
+
+    Rows hold raw term frequencies; IDF weights are derived from the rows
+    themselves and the weighted, L2-normalized matrix is rebuilt lazily
+    on the first lookup after an insert or eviction.
+    """
+
+    def __init__(self, dim: int, max_entries: int):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.tf = np.zeros((min(max_entries, 32), dim), dtype=np.float32)
+        self.size = 0
+        self.questions = []
+        self.keys = []
+        self.answers = []
+        self.hits = []
+        self.last_used = []
+        self.expires_at = []
+        self.idf = None
+        self.weighted = None
+
+    def _refresh(self):
+        rows = self.tf[:self.size]
+        df = np.count_nonzero(rows, axis=0)
+        self.idf = (np.log((1 + self.size) / (1 + df)) + 1).astype(np.float32)
+        weighted = rows * self.idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.weighted = weighted / norms
+
+    def search(self, vector: np.ndarray, keys: frozenset = frozenset()):
+        if self.size == 0:
+            return None, 0.0
+        if self.weighted is None:
+            self._refresh()
+        query = vector * self.idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None, 0.0
+        scores = self.weighted @ (query / norm)
+        # Only questions with the same key tokens can match ("... in c" vs "... in c++")
+        scores[[row for row, row_keys in enumerate(self.keys) if row_keys != keys]] = -1.0
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def add(self, question: str, vector: np.ndarray, answer: str, expires_at: float) -> bool:
+        evicted = False
+        if self.size == self.max_entries:
+            self.remove(self._eviction_candidate())
+            evicted = True
+        if self.size == len(self.tf):
+            # Grow geometrically so sparse namespaces stay small
+            grown = np.zeros((min(self.max_entries, len(self.tf) * 2), self.dim), dtype=np.float32)
+            grown[:self.size] = self.tf[:self.size]
+            self.tf = grown
+        row = self.size
+        self.tf[row] = vector
+        self.questions.append(question)
+        self.keys.append(key_tokens(question))
+        self.answers.append(answer)
+        self.hits.append(0)
+        self.last_used.append(time.time())
+        self.expires_at.append(expires_at)
+        self.size += 1
+        self.weighted = None
+        return evicted
+
+    def _eviction_candidate(self) -> int:
+        # Each hit buys an entry the same protection as being used more recently
+        scores = [used + hits * SEMANTIC_CACHE_HIT_WEIGHT_SECONDS for used, hits in zip(self.last_used, self.hits)]
+        return scores.index(min(scores))
+
+    def purge_expired(self, now: float) -> int:
+        # Highest rows first, so moving the last row into a gap never moves an unchecked row
+        expired = [row for row in range(self.size - 1, -1, -1) if self.expires_at[row] <= now]
+        for row in expired:
+            self.remove(row)
+        return len(expired)
+
+    def remove(self, row: int):
+        last = self.size - 1
+        if row != last:
+            # Keep the matrix dense by moving the last row into the gap
+            self.tf[row] = self.tf[last]
+            for column in (self.questions, self.keys, self.answers, self.hits, self.last_used, self.expires_at):
+                column[row] = column[last]
+        for column in (self.questions, self.keys, self.answers, self.hits, self.last_used, self.expires_at):
+            column.pop()
+        self.tf[last] = 0
+        self.size = last
+        self.weighted = None
+
+class SemanticCache:
+    """Serve answers to paraphrased questions without calling the model.
+
+    Questions are vectorized locally and compared by cosine similarity
+    against earlier questions asked with the same response type and
+    content. Only stateless questions (no chat history) are cached.
+    """
+
+    def __init__(self, threshold: float = None, dim: int = SEMANTIC_CACHE_DIM,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl: int = AI_CACHE_TTL_SECONDS):
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.dim = dim
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _namespace(self, response_type: str, content_id: str = None) -> tuple:
+        return (response_type or "medium", content_id or "")
+
+    def get(self, question: str, response_type: str, content_id: str = None) -> Optional[str]:
+        vector = hash_vector(question, self.dim)
+        keys = key_tokens(question)
+        with self.lock:
+            index = self.indexes.get(self._namespace(response_type, content_id))
+            if index:
+                index.purge_expired(time.time())
+            row, score = index.search(vector, keys) if index else (None, 0.0)
+            if row is None or score < self.threshold:
+                self.misses += 1
+                return None
+            index.hits[row] += 1
+            index.last_used[row] = time.time()
+            self.hits += 1
+            return index.answers[row]
+
+    def set(self, question: str, response_type: str, content_id: str, answer: str):
+        vector = hash_vector(question, self.dim)
+        if not vector.any():
+            return
+        with self.lock:
+            namespace = self._namespace(response_type, content_id)
+            index = self.indexes.get(namespace)
+            if index is None:
+                index = self.indexes[namespace] = SemanticIndex(self.dim, self.max_entries)
+            if index.add(question, vector, answer, time.time() + self.ttl):
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": sum(index.size for index in self.indexes.values()),
+            "namespaces": len(self.indexes),
+            "evictions": self.evictions,
+            "threshold": self.threshold,
+        }
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,40 @@
+from typing import Awaitable, Callable, Dict
+import asyncio
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one in-flight task.
+
+    Waiters await the shared task through ``asyncio.shield`` so a caller
+    that disconnects only cancels its own wait, never the shared call.
+    Errors raised by the shared call are re-raised to every waiter.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self.inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # Mark the exception as retrieved in case every waiter went away.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "inFlight": len(self.inflight),
+        }
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from typing import Iterable, List, Optional, Tuple
+from ..config import settings
+from ..constants import TRANSCRIPT_CACHE_DAYS, TRANSCRIPT_NEGATIVE_CACHE_HOURS, TRANSCRIPT_PREFETCH_CONCURRENCY
+from ..database import SessionLocal
+from ..models import TranscriptCache
+from ..logger import setup_logger
+from ..utils.youtube_extractor import TranscriptUnavailableError, create_transport
+from .singleflight import SingleFlight
+import asyncio
+
+logger = setup_logger(__name__)
+
+class TranscriptStore:
+    """Transcripts keyed by YouTube video id, persisted in transcript_cache.
+
+    Segments keep their timestamps. Videos without a transcript are cached
+    as unavailable for a shorter time so they are not re-requested on
+    every upload; transient fetch errors are not cached. Concurrent
+    requests for the same video share one fetch.
+    """
+
+    def __init__(self, transport=None, ttl: timedelta = timedelta(days=TRANSCRIPT_CACHE_DAYS),
+                 negative_ttl: timedelta = timedelta(hours=TRANSCRIPT_NEGATIVE_CACHE_HOURS),
+                 prefetch_concurrency: int = TRANSCRIPT_PREFETCH_CONCURRENCY):
+        self.transport = transport or create_transport(settings.TRANSCRIPT_BACKEND)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.singleflight = SingleFlight()
+        self.prefetch_concurrency = prefetch_concurrency
+        self.prefetch_tasks = set()
+        self._prefetch_slots = None
+        self._loop = None
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.prefetched = 0
+
+    def _load(self, video_id: str) -> Optional[Tuple[bool, Optional[list], Optional[str]]]:
+        db = SessionLocal()
+        try:
+            row = db.query(TranscriptCache).filter(
+                TranscriptCache.video_id == video_id,
+                TranscriptCache.expires_at > datetime.utcnow()
+            ).first()
+            return (bool(row.available), row.segments, row.error) if row else None
+        finally:
+            db.close()
+
+    def _store(self, video_id: str, segments: Optional[list], error: Optional[str] = None):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.merge(TranscriptCache(
+                video_id=video_id,
+                available=0 if segments is None else 1,
+                segments=segments,
+                error=error,
+                fetched_at=now,
+                expires_at=now + (self.negative_ttl if segments is None else self.ttl)
+            ))
+            db.commit()
+        except IntegrityError:
+            # Another process stored the same video first
+            db.rollback()
+        finally:
+            db.close()
+
+    async def get_segments(self, video_id: str) -> List[dict]:
+        cached = await asyncio.to_thread(self._load, video_id)
+        if cached is not None:
+            available, segments, error = cached
+            if available:
+                self.hits += 1
+                return segments
+            self.negative_hits += 1
+            raise TranscriptUnavailableError(error or f"No transcript available for {video_id}")
+        self.misses += 1
+        return await self.singleflight.do(video_id, lambda: self._fetch(video_id))
+
+    async def _fetch(self, video_id: str) -> List[dict]:
+        try:
+            segments = await asyncio.to_thread(self.transport.fetch, video_id)
+        except TranscriptUnavailableError as e:
+            await asyncio.to_thread(self._store, video_id, None, str(e))
+            raise
+        except Exception:
+            self.fetch_errors += 1
+            raise
+        await asyncio.to_thread(self._store, video_id, segments)
+        logger.info(f"Cached transcript for {video_id} ({len(segments)} segments)")
+        return segments
+
+    def _prefetch_semaphore(self) -> asyncio.Semaphore:
+        # One limit across all prefetch calls; semaphores belong to one loop,
+        # and tests and reloads may start new ones
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._prefetch_slots = asyncio.Semaphore(self.prefetch_concurrency)
+        return self._prefetch_slots
+
+    def prefetch(self, video_ids: Iterable[str]) -> int:
+        """Warm the cache in the background; returns how many were scheduled."""
+        video_ids = list(dict.fromkeys(video_ids))
+        semaphore = self._prefetch_semaphore()
+
+        async def warm(video_id: str):
+            async with semaphore:
+                try:
+                    await self.get_segments(video_id)
+                    self.prefetched += 1
+                except Exception as e:
+                    logger.info(f"Transcript prefetch for {video_id} skipped: {e}")
+
+        for video_id in video_ids:
+            task = asyncio.create_task(warm(video_id))
+            self.prefetch_tasks.add(task)
+            task.add_done_callback(self.prefetch_tasks.discard)
+        return len(video_ids)
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.transport.name,
+            "hits": self.hits,
+            "negativeHits": self.negative_hits,
+            "misses": self.misses,
+            "fetchErrors": self.fetch_errors,
+            "prefetched": self.prefetched,
+            "prefetching": len(self.prefetch_tasks),
+            "singleflight": self.singleflight.stats(),
+        }
+
+transcript_store = TranscriptStore()
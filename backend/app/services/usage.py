@@ -0,0 +1,198 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..config import settings
+from ..database import SessionLocal
+from ..models import LLMUsage
+from ..logger import setup_logger
+from .chat_history import estimate_tokens
+from .llm_errors import LLMCapacityError
+import asyncio
+import threading
+
+logger = setup_logger(__name__)
+
+ANONYMOUS_USER = "anonymous"
+# Background work (quiz bank refills) is not charged to anyone
+SYSTEM_USER = "system"
+
+class QuotaExceededError(LLMCapacityError):
+    status_code = 429
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def seconds_until(moment: datetime) -> float:
+    return (moment - utc_now()).total_seconds()
+
+class UsageTracker:
+    """Per-user, per-endpoint LLM usage with in-memory counters.
+
+    ``record`` only touches dictionaries; deltas are written to the
+    llm_usage table in one transaction by ``flush``, which runs on a
+    timer. Running daily and monthly token totals per user are kept next
+    to the deltas so ``check`` is a couple of dict lookups. ``load``
+    seeds those totals from the table when the process starts.
+
+    Calls without a user share the ``anonymous`` bucket. The counters
+    live in this process, so with several workers each one enforces the
+    quota on its own.
+    """
+
+    def __init__(self, daily_tokens: int = None, monthly_tokens: int = None, daily_requests: int = None):
+        self.daily_tokens = daily_tokens if daily_tokens is not None else settings.LLM_DAILY_TOKEN_QUOTA
+        self.monthly_tokens = monthly_tokens if monthly_tokens is not None else settings.LLM_MONTHLY_TOKEN_QUOTA
+        self.daily_requests = daily_requests if daily_requests is not None else settings.LLM_DAILY_REQUEST_QUOTA
+        self.lock = threading.Lock()
+        # (user, endpoint, day) -> [requests, prompt_tokens, response_tokens] not yet flushed
+        self.pending = defaultdict(lambda: [0, 0, 0])
+        # (user, day) -> [requests, tokens]; (user, month) -> tokens
+        self.day_totals = defaultdict(lambda: [0, 0])
+        self.month_totals = defaultdict(int)
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.rejected = 0
+
+    def check(self, user_id: Optional[str]):
+        if user_id == SYSTEM_USER:
+            return
+        user_id = user_id or ANONYMOUS_USER
+        now = utc_now()
+        day, month = now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+        requests, tokens = self.day_totals.get((user_id, day), (0, 0))
+        if (self.daily_tokens and tokens >= self.daily_tokens) or (self.daily_requests and requests >= self.daily_requests):
+            self.rejected += 1
+            tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            raise QuotaExceededError("Daily AI usage limit reached", retry_after=seconds_until(tomorrow))
+        if self.monthly_tokens and self.month_totals.get((user_id, month), 0) >= self.monthly_tokens:
+            self.rejected += 1
+            next_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            raise QuotaExceededError("Monthly AI usage limit reached", retry_after=seconds_until(next_month))
+
+    def record(self, user_id: Optional[str], endpoint: str, prompt: str, response: str):
+        user_id = user_id or ANONYMOUS_USER
+        prompt_tokens = estimate_tokens(prompt)
+        response_tokens = estimate_tokens(response)
+        now = utc_now()
+        day, month = now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+        with self.lock:
+            delta = self.pending[(user_id, endpoint, day)]
+            delta[0] += 1
+            delta[1] += prompt_tokens
+            delta[2] += response_tokens
+            totals = self.day_totals[(user_id, day)]
+            totals[0] += 1
+            totals[1] += prompt_tokens + response_tokens
+            self.month_totals[(user_id, month)] += prompt_tokens + response_tokens
+
+    def load(self, db: Session):
+        now = utc_now()
+        day, month = now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+        rows = db.query(
+            LLMUsage.user_id, LLMUsage.day,
+            func.sum(LLMUsage.requests), func.sum(LLMUsage.prompt_tokens + LLMUsage.response_tokens)
+        ).filter(LLMUsage.day.like(f"{month}-%")).group_by(LLMUsage.user_id, LLMUsage.day).all()
+        with self.lock:
+            for user_id, row_day, requests, tokens in rows:
+                self.month_totals[(user_id, month)] += tokens or 0
+                if row_day == day:
+                    totals = self.day_totals[(user_id, day)]
+                    totals[0] += requests or 0
+                    totals[1] += tokens or 0
+
+    def flush(self, db: Session = None) -> int:
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(lambda: [0, 0, 0])
+            self._prune_totals()
+        if not pending:
+            return 0
+
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            existing = {
+                (row.user_id, row.endpoint, row.day): row
+                for row in db.query(LLMUsage).filter(
+                    LLMUsage.day.in_({key[2] for key in pending}),
+                    LLMUsage.user_id.in_({key[0] for key in pending})
+                )
+            }
+            for key, (requests, prompt_tokens, response_tokens) in pending.items():
+                row = existing.get(key)
+                if row is None:
+                    row = LLMUsage(user_id=key[0], endpoint=key[1], day=key[2],
+                                   requests=0, prompt_tokens=0, response_tokens=0)
+                    db.add(row)
+                row.requests += requests
+                row.prompt_tokens += prompt_tokens
+                row.response_tokens += response_tokens
+                row.updated_at = datetime.utcnow()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the deltas back so the next flush retries them
+            with self.lock:
+                for key, values in pending.items():
+                    delta = self.pending[key]
+                    for i, value in enumerate(values):
+                        delta[i] += value
+            raise
+        finally:
+            if own_session:
+                db.close()
+        self.flushes += 1
+        self.flushed_rows += len(pending)
+        return len(pending)
+
+    def _prune_totals(self):
+        now = utc_now()
+        day, month = now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+        for key in [k for k in self.day_totals if k[1] != day]:
+            del self.day_totals[key]
+        for key in [k for k in self.month_totals if k[1] != month]:
+            del self.month_totals[key]
+
+    async def run_flusher(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"LLM usage flush failed: {e}")
+
+    def report(self, db: Session, days: int = 30, user_id: str = None) -> list:
+        since = (utc_now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        query = db.query(
+            LLMUsage.user_id, LLMUsage.endpoint,
+            func.sum(LLMUsage.requests), func.sum(LLMUsage.prompt_tokens), func.sum(LLMUsage.response_tokens)
+        ).filter(LLMUsage.day >= since)
+        if user_id:
+            query = query.filter(LLMUsage.user_id == user_id)
+        rows = query.group_by(LLMUsage.user_id, LLMUsage.endpoint).all()
+
+        users = {}
+        for row_user, endpoint, requests, prompt_tokens, response_tokens in rows:
+            entry = users.setdefault(row_user, {"userId": row_user, "requests": 0, "tokens": 0, "endpoints": {}})
+            entry["requests"] += requests or 0
+            entry["tokens"] += (prompt_tokens or 0) + (response_tokens or 0)
+            entry["endpoints"][endpoint] = {
+                "requests": requests or 0,
+                "promptTokens": prompt_tokens or 0,
+                "responseTokens": response_tokens or 0,
+            }
+        return sorted(users.values(), key=lambda u: u["tokens"], reverse=True)
+
+    def stats(self) -> dict:
+        return {
+            "pendingRows": len(self.pending),
+            "flushes": self.flushes,
+            "flushedRows": self.flushed_rows,
+            "quotaRejections": self.rejected,
+            "dailyTokenQuota": self.daily_tokens,
+            "monthlyTokenQuota": self.monthly_tokens,
+            "dailyRequestQuota": self.daily_requests,
+        }
+
+usage_tracker = UsageTracker()
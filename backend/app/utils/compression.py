@@ -0,0 +1,41 @@
+from ..constants import TEXT_COMPRESSION_LEVEL
+import codecs
+import zlib
+
+# Decompressed bytes produced per step when reading a range
+DECOMPRESS_STEP = 256 * 1024
+
+def compress_text(raw: bytes, level: int = TEXT_COMPRESSION_LEVEL) -> bytes:
+    return zlib.compress(raw, level)
+
+def _check_codec(codec: str):
+    if codec != "zlib":
+        raise ValueError(f"Unsupported text codec: {codec}")
+
+def decompress_text(data: bytes, codec: str = "zlib") -> str:
+    _check_codec(codec)
+    return zlib.decompress(data).decode("utf-8")
+
+def decompress_range(data: bytes, start: int, end: int, codec: str = "zlib") -> str:
+    """Characters ``start``..``end`` of compressed text.
+
+    Decompression stops once ``end`` is reached and runs in bounded steps,
+    so reading the first page of a large document never inflates the rest.
+    """
+    _check_codec(codec)
+    decompressor = zlib.decompressobj()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    seen = 0
+    pending = data
+    while seen < end:
+        out = decompressor.decompress(pending, DECOMPRESS_STEP)
+        pending = decompressor.unconsumed_tail
+        done = decompressor.eof or (not out and not pending)
+        piece = decoder.decode(out, final=done)
+        if seen + len(piece) > start:
+            parts.append(piece[max(start - seen, 0):end - seen])
+        seen += len(piece)
+        if done:
+            break
+    return "".join(parts)
@@ -1,15 +1,13 @@
 from docx import Document
 from io import BytesIO
+from typing import Union
 
-def extract_doc_text(content: bytes) -> str:
+def extract_doc_text(source: Union[str, bytes]) -> str:
     try:
-        doc_file = BytesIO(content)
+        # Accept a file path so uploads are not read into memory first
+        doc_file = BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
         doc = Document(doc_file)
         
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        
-        return text.strip()
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
     except Exception as e:
-        return f"Error extracting DOC: {str(e)}"
+        raise ValueError(f"Error extracting DOC: {str(e)}")
@@ -1,11 +1,151 @@
-from PIL import Image
+from PIL import Image, ImageOps
+from concurrent.futures import Executor
 from io import BytesIO
+from typing import List, Tuple, Union
+from ..constants import OCR_MAX_DIMENSION, OCR_TARGET_DPI, OCR_BAND_HEIGHT, OCR_TIMEOUT_SECONDS
+import numpy as np
+import os
 import pytesseract
+import time
+
+# A band is shipped to a worker as (mode, size, raw pixels)
+Band = Tuple[str, Tuple[int, int], bytes]
+
+def decode_image(source: Union[str, bytes], max_dimension: int = OCR_MAX_DIMENSION) -> Tuple[Image.Image, Tuple[int, int]]:
+    """The decoded image and its full size before any reduced-scale decoding."""
+    image = Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source)
+    full_size = image.size
+    # JPEG can decode straight to a reduced scale, skipping most of the work
+    # for 12+ megapixel phone photos
+    image.draft("RGB", (max_dimension, max_dimension))
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image, full_size
+
+def normalize_image(image: Image.Image) -> Image.Image:
+    if image.mode in ("RGBA", "LA", "P"):
+        # Transparent areas would turn black; put them on white paper
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+    return ImageOps.autocontrast(image.convert("L"))
+
+def downscale_image(image: Image.Image, max_dimension: int = OCR_MAX_DIMENSION) -> Image.Image:
+    if max(image.size) <= max_dimension:
+        return image
+    scale = max_dimension / max(image.size)
+    size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+def effective_dpi(info: dict, scale: float) -> int:
+    """DPI of the image Tesseract sees, so glyph sizes are judged correctly."""
+    dpi = info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > 1:
+        return max(int(round(dpi[0] * scale)), 70)
+    return OCR_TARGET_DPI
+
+def split_bands(image: Image.Image, band_height: int = OCR_BAND_HEIGHT) -> List[Image.Image]:
+    """Horizontal bands of roughly ``band_height``, cut at blank rows so
+    no line of text is split between two bands."""
+    if image.height <= band_height * 1.5:
+        return [image]
+    ink = (np.asarray(image) < 128).sum(axis=1)
+    blank = ink <= max(image.width // 200, 1)
+    cuts = [0]
+    while image.height - cuts[-1] > band_height * 1.5:
+        target = cuts[-1] + band_height
+        lo, hi = target - band_height // 2, min(target + band_height // 2, image.height - 1)
+        candidates = np.flatnonzero(blank[lo:hi]) + lo
+        if not len(candidates):
+            cuts.append(target)
+            continue
+        # Cut in the middle of the nearest blank gap so both bands keep a margin
+        top = bottom = int(candidates[np.abs(candidates - target).argmin()])
+        while top > cuts[-1] + 1 and blank[top - 1]:
+            top -= 1
+        while bottom < image.height - 1 and blank[bottom + 1]:
+            bottom += 1
+        cuts.append((top + bottom + 1) // 2)
+    cuts.append(image.height)
+    return [image.crop((0, top, image.width, bottom)) for top, bottom in zip(cuts, cuts[1:])]
+
+def prepare_image(source: Union[str, bytes], max_dimension: int = OCR_MAX_DIMENSION,
+                  band_height: int = OCR_BAND_HEIGHT) -> Tuple[List[Band], int, dict]:
+    """Decode, normalize, downscale and split an image for OCR.
+
+    Returns the bands, the DPI to tell Tesseract and per-stage timings.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = round((now - started) * 1000, 1)
+        started = now
 
-def extract_image_text(content: bytes) -> str:
     try:
-        image = Image.open(BytesIO(content))
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        image, original_size = decode_image(source, max_dimension)
+        lap("decodeMs")
+        gray = normalize_image(image)
+        lap("normalizeMs")
+        gray = downscale_image(gray, max_dimension)
+        dpi = effective_dpi(image.info, max(gray.size) / max(original_size))
+        lap("downscaleMs")
+        bands = [(band.mode, band.size, band.tobytes()) for band in split_bands(gray, band_height)]
+        lap("splitMs")
     except Exception as e:
-        return f"Error extracting text from image: {str(e)}. Note: Tesseract OCR must be installed."
+        raise ValueError(f"Error extracting text from image: {str(e)}")
+    timings.update({"width": original_size[0], "height": original_size[1],
+                    "ocrWidth": gray.width, "ocrHeight": gray.height, "bands": len(bands)})
+    return bands, dpi, timings
+
+def ocr_band(band: Band, dpi: int, timeout: float = 0) -> str:
+    """Recognize one band; runs in a worker process."""
+    # Bands already run in parallel; Tesseract's own threads would oversubscribe
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    mode, size, data = band
+    try:
+        text = pytesseract.image_to_string(Image.frombytes(mode, size, data), config=f"--dpi {dpi}", timeout=timeout)
+    except RuntimeError as e:
+        # pytesseract kills Tesseract and raises RuntimeError on timeout
+        raise ValueError(f"Error extracting text from image: {str(e)}")
+    except Exception as e:
+        raise ValueError(f"Error extracting text from image: {str(e)}. Note: Tesseract OCR must be installed.")
+    return text.strip()
+
+def run_ocr(source: Union[str, bytes], executor: Executor = None,
+            timeout: float = OCR_TIMEOUT_SECONDS) -> Tuple[str, dict]:
+    """OCR an image and return ``(text, per-stage timings)``.
+
+    With an ``executor``, preparation runs in a worker and the bands are
+    recognized in parallel; ``timeout`` bounds the whole image.
+    """
+    deadline = time.monotonic() + timeout
+
+    def remaining() -> float:
+        return max(deadline - time.monotonic(), 0.001)
+
+    if executor is None:
+        bands, dpi, timings = prepare_image(source)
+        started = time.perf_counter()
+        texts = [ocr_band(band, dpi, remaining()) for band in bands]
+    else:
+        bands, dpi, timings = executor.submit(prepare_image, source).result(timeout=remaining())
+        started = time.perf_counter()
+        futures = [executor.submit(ocr_band, band, dpi, remaining()) for band in bands]
+        try:
+            texts = [future.result(timeout=remaining()) for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+    timings["ocrMs"] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    # Bands are top to bottom, so joining them keeps reading order
+    text = "\n\n".join(t for t in texts if t)
+    timings["mergeMs"] = round((time.perf_counter() - started) * 1000, 1)
+    return text, timings
+
+def extract_image_text(source: Union[str, bytes]) -> str:
+    return run_ocr(source)[0]
@@ -0,0 +1,21 @@
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import json
+
+# Content-Encoding is set explicitly so GZipMiddleware passes chunks through
+# instead of buffering them inside the compressor.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Content-Encoding": "identity",
+    "X-Accel-Buffering": "no",
+}
+
+def sse_event(data, event: Optional[str] = None) -> str:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
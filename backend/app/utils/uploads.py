@@ -0,0 +1,42 @@
+from fastapi import UploadFile
+from typing import Tuple
+from ..constants import UPLOAD_CHUNK_SIZE
+import asyncio
+import hashlib
+import os
+import uuid
+
+class UploadTooLargeError(ValueError):
+    pass
+
+async def save_upload(file: UploadFile, dest_path: str, max_size: int,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """Stream ``file`` to ``dest_path`` and return ``(size, sha256)``.
+
+    Only one chunk is held in memory at a time. The size limit is checked
+    per chunk so oversized uploads stop early, data goes to a temporary
+    file next to the destination and is renamed into place only once it
+    is complete, and file I/O runs off the event loop.
+    """
+    tmp_path = f"{dest_path}.part-{uuid.uuid4().hex[:8]}"
+    hasher = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+            hasher.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.replace, tmp_path, dest_path)
+    except BaseException:
+        out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, hasher.hexdigest()
@@ -1,16 +1,74 @@
-from youtube_transcript_api import YouTubeTranscriptApi
+from typing import Dict, List, Optional
+from youtube_transcript_api import (
+    YouTubeTranscriptApi, NoTranscriptAvailable, NoTranscriptFound, TranscriptsDisabled, VideoUnavailable
+)
+import hashlib
 import re
 
+class InvalidYouTubeURLError(ValueError):
+    pass
+
+class TranscriptUnavailableError(ValueError):
+    """The video has no transcript; safe to cache."""
+
+class TranscriptFetchError(RuntimeError):
+    """Fetching failed for a reason that may go away (network, rate limits)."""
+
+def parse_video_id(url: str) -> str:
+    match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url or "")
+    if not match:
+        raise InvalidYouTubeURLError("Invalid YouTube URL")
+    return match.group(1)
+
+def join_segments(segments: List[dict]) -> str:
+    return " ".join(segment["text"] for segment in segments if segment.get("text"))
+
+class YouTubeTransport:
+    name = "youtube"
+
+    def fetch(self, video_id: str) -> List[dict]:
+        try:
+            entries = YouTubeTranscriptApi.get_transcript(video_id)
+        except (NoTranscriptAvailable, NoTranscriptFound, TranscriptsDisabled, VideoUnavailable) as e:
+            raise TranscriptUnavailableError(f"No transcript available for {video_id}: {type(e).__name__}")
+        except Exception as e:
+            raise TranscriptFetchError(f"Error fetching YouTube transcript: {str(e)}")
+        return [
+            {"start": round(entry["start"], 3), "duration": round(entry.get("duration", 0), 3), "text": entry["text"]}
+            for entry in entries
+        ]
+
+class LocalTransport:
+    """Offline stand-in for YouTube.
+
+    Serves ``transcripts`` when given (other ids have no transcript);
+    otherwise makes up a deterministic transcript for any id.
+    """
+    name = "local"
+
+    def __init__(self, transcripts: Optional[Dict[str, List[dict]]] = None):
+        self.transcripts = transcripts
+        self.fetches = 0
+
+    def fetch(self, video_id: str) -> List[dict]:
+        self.fetches += 1
+        if self.transcripts is not None:
+            if video_id not in self.transcripts:
+                raise TranscriptUnavailableError(f"No transcript available for {video_id}")
+            return self.transcripts[video_id]
+        digest = hashlib.sha256(video_id.encode()).hexdigest()[:8]
+        return [
+            {"start": i * 5.0, "duration": 5.0, "text": f"Segment {i + 1} of lecture {video_id} ({digest})."}
+            for i in range(12)
+        ]
+
+def create_transport(name: str):
+    name = name.lower()
+    if name == "youtube":
+        return YouTubeTransport()
+    if name == "local":
+        return LocalTransport()
+    raise ValueError(f"Unknown TRANSCRIPT_BACKEND: {name}")
+
 def extract_youtube_transcript(url: str) -> str:
-    try:
-        video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
-        if not video_id_match:
-            return "Invalid YouTube URL"
-        
-        video_id = video_id_match.group(1)
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
-        
-        text = " ".join([entry['text'] for entry in transcript])
-        return text
-    except Exception as e:
-        return f"Error extracting YouTube transcript: {str(e)}"
+    return join_segments(YouTubeTransport().fetch(parse_video_id(url)))
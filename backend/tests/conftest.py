@@ -0,0 +1,7 @@
+import os
+
+# Run the suite offline against the deterministic stub backend
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("AI_CACHE_PATH", "")
+os.environ.setdefault("TRANSCRIPT_BACKEND", "local")
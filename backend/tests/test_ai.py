@@ -1,6 +1,14 @@
+import json
 import pytest
+import uuid
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers.ai import ai_service
+from app.services.ai_service import AIService
+from app.services.llm_backends import StubBackend
+from app.services.llm_errors import LLMCapacityError
+from app.services.llm_gateway import LLMGateway
+from app.services.quiz_parser import QuizFormatError
 
 client = TestClient(app)
 
@@ -10,7 +18,7 @@ def test_enhance_content():
         "level": "beginner"
     })
     assert response.status_code == 200
-    assert "enhancedText" in response.json()
+    assert "enhancedText" in response.json()["data"]
 
 def test_enhance_content_too_short():
     response = client.post("/api/ai/enhance", json={
@@ -25,7 +33,7 @@ def test_ask_question():
         "userId": "test_user"
     })
     assert response.status_code == 200
-    assert "answer" in response.json()
+    assert "answer" in response.json()["data"]
 
 def test_generate_quiz():
     response = client.post("/api/ai/quiz", json={
@@ -34,4 +42,115 @@ def test_generate_quiz():
         "numQuestions": 5
     })
     assert response.status_code == 200
-    assert "questions" in response.json()
+    assert "questions" in response.json()["data"]
+
+def sse_frames(body: str) -> list:
+    """(event, data) per frame; every frame must end with a blank line."""
+    assert body.endswith("\n\n")
+    frames = []
+    for frame in body[:-2].split("\n\n"):
+        event = "message"
+        for line in frame.split("\n"):
+            field, _, value = line.partition(": ")
+            if field == "event":
+                event = value
+            else:
+                assert field == "data"
+                data = json.loads(value)
+        frames.append((event, data))
+    return frames
+
+def test_question_stream_sends_deltas_then_done():
+    response = client.post("/api/ai/question/stream", json={
+        "question": f"What does the {uuid.uuid4().hex} variable hold?",
+        "responseType": "basic"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = sse_frames(response.text)
+    deltas = [data["delta"] for event, data in frames[:-1] if event == "message"]
+    assert len(deltas) == len(frames) - 1 >= 1
+    assert frames[-1] == ("done", {"answerLength": len("".join(deltas))})
+
+@pytest.mark.parametrize("error, expected", [
+    (RuntimeError("backend down"), {"error": "Failed to answer question. Please try again."}),
+    (LLMCapacityError("LLM queue is full", retry_after=3), {"error": "LLM queue is full", "retryAfter": 3}),
+])
+def test_question_stream_failure_ends_with_error_event(monkeypatch, error, expected):
+    async def answer(*args, **kwargs):
+        yield "Partial "
+        raise error
+    monkeypatch.setattr(ai_service, "answer_question_stream", answer)
+    response = client.post("/api/ai/question/stream", json={"question": "What is a variable?"})
+    assert response.status_code == 200
+    assert sse_frames(response.text) == [("message", {"delta": "Partial "}), ("error", expected)]
+
+@pytest.mark.parametrize("error, status", [
+    (QuizFormatError("Failed to parse questions"), 502),
+    (RuntimeError("backend down"), 500),
+])
+def test_quiz_generation_failure_is_an_error_not_demo_questions(monkeypatch, error, status):
+    async def fail(*args, **kwargs):
+        raise error
+    monkeypatch.setattr(ai_service, "generate_quiz_questions", fail)
+    response = client.post("/api/ai/quiz", json={
+        "contentId": "test_content",
+        "competencyId": f"failing_{uuid.uuid4().hex[:8]}",
+        "numQuestions": 3
+    })
+    assert response.status_code == status
+    assert "data" not in response.json()
+
+def test_enhance_long_text_in_sections():
+    paragraphs = [f"Paragraph {i} explains a separate idea about loops and variables." * 20 for i in range(6)]
+    sections = ai_service.split_for_transform("\n\n".join(paragraphs), max_chars=3000)
+    assert len(sections) > 1
+    assert "\n\n".join(sections) == "\n\n".join(paragraphs)
+
+    response = client.post("/api/ai/enhance/stream", json={
+        "text": "\n\n".join(paragraphs[:3]),
+        "level": "beginner"
+    })
+    assert response.status_code == 200
+    assert "event: section" in response.text
+    assert response.text.count("event: section") == 2
+    assert "event: done" in response.text
+
+@pytest.mark.asyncio
+async def test_long_document_transform_bounds_sections_in_flight():
+    backend = StubBackend(latency_ms=40)
+    service = AIService()
+    # A short queue limit: submitting all 30 sections at once would leave
+    # the later ones waiting past it
+    service.gateway = LLMGateway(backend, max_concurrency=2, max_queue_wait=0.3)
+    text = "\n\n".join(f"Section {i} {uuid.uuid4().hex} covers arrays and indexing. " * 40 for i in range(30))
+    sections = [s async for s in service.transform_sections("simplify", text, concurrency=2)]
+    assert len(sections) == len(service.split_for_transform(text)) >= 30
+    assert backend.calls == len(sections)
+    assert service.gateway.scheduler.stats()["classes"]["standard"]["rejected"] == 0
+
+def test_batch_dedupes_and_reports_per_item_errors():
+    item = {"op": "simplify", "text": "Recursion is when a function calls itself."}
+    response = client.post("/api/v1/ai/batch", json={"operations": [
+        {**item, "id": "a"},
+        {**item, "id": "b"},
+        {"op": "feedback", "answer": "A loop", "question": "What is iteration?"},
+        {"op": "enhance", "text": "Short"}
+    ]})
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["data"] == results[1]["data"]
+    assert results[1]["id"] == "b"
+    assert "feedback" in results[2]["data"]
+    assert results[3]["success"] is False and results[3]["status"] == 400
+    assert response.json()["data"]["failed"] == 1
+
+def test_batch_stream_ndjson():
+    response = client.post("/api/v1/ai/batch", json={"stream": True, "operations": [
+        {"op": "simplify", "text": "A variable stores a value in memory."},
+        {"op": "simplify", "text": "A loop repeats a block of code."}
+    ]})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(line["index"] for line in lines) == [0, 1]
@@ -0,0 +1,46 @@
+import time
+from app.cache import ResponseCache, MemoryTier
+
+def test_key_normalizes_prompt():
+    cache = ResponseCache()
+    assert cache.get_key("explain recursion  \r\nfor a beginner\n") == cache.get_key("explain recursion\nfor a beginner")
+    # User text keeps its case and indentation
+    assert cache.get_key("Simplify: the AST of SQL") != cache.get_key("simplify: the ast of sql")
+    assert cache.get_key("if x:\n    y()\nz()") != cache.get_key("if x:\n    y()\n    z()")
+    assert cache.get_key("explain recursion") != ResponseCache(model="other-model").get_key("explain recursion")
+
+def test_memory_tier_is_lru():
+    tier = MemoryTier(max_entries=2, max_bytes=1024)
+    expires = time.time() + 60
+    tier.set("a", "1", expires)
+    tier.set("b", "2", expires)
+    tier.get("a")
+    tier.set("c", "3", expires)
+    assert tier.get("a") == "1"
+    assert tier.get("b") is None
+    assert tier.evictions == 1
+
+def test_memory_tier_respects_ttl_and_bytes():
+    tier = MemoryTier(max_entries=10, max_bytes=8)
+    tier.set("old", "x", time.time() - 1)
+    assert tier.get("old") is None
+    tier.set("a", "1234", time.time() + 60)
+    tier.set("b", "5678", time.time() + 60)
+    tier.set("c", "9", time.time() + 60)
+    assert tier.size_bytes <= 8
+    assert tier.get("a") is None
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "ai_cache.db")
+    cache = ResponseCache(disk_path=path)
+    key = cache.get_key("explain recursion for a beginner")
+    cache.set(key, "Recursion is...")
+
+    restarted = ResponseCache(disk_path=path)
+    assert restarted.get(key) == "Recursion is..."
+    assert restarted.get(key) == "Recursion is..."
+    stats = restarted.stats()
+    assert stats["diskHits"] == 1
+    assert stats["memoryHits"] == 1
+    assert restarted.get("missing") is None
+    assert restarted.stats()["misses"] == 1
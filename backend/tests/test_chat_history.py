@@ -0,0 +1,59 @@
+import pytest
+from app.services.chat_history import ChatHistoryManager
+
+class Summarizer:
+    def __init__(self):
+        self.prompts = []
+
+    async def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+def turns(opening: str, topic: str, count: int) -> list:
+    messages = [{"role": "user", "content": opening}]
+    for i in range(1, count):
+        role = "assistant" if i % 2 else "user"
+        messages.append({"role": role, "content": f"{topic} turn {i} " + "detail " * 40})
+    return messages
+
+def manager(summarizer) -> ChatHistoryManager:
+    return ChatHistoryManager(summarize=summarizer, token_budget=300, max_recent=6)
+
+@pytest.mark.asyncio
+async def test_short_history_is_kept_verbatim():
+    summarizer = Summarizer()
+    history = turns("hi", "loops", 3)
+    summary, recent = await manager(summarizer).compact(history)
+    assert summary is None and recent == history
+    assert summarizer.prompts == []
+
+@pytest.mark.asyncio
+async def test_long_history_is_folded_and_summary_reused():
+    summarizer = Summarizer()
+    history = manager(summarizer)
+    messages = turns("what is recursion?", "recursion", 12)
+    summary, recent = await history.compact(messages)
+    assert summary == "summary 1"
+    assert recent == messages[len(messages) - len(recent):]
+    assert sum(len(m["content"]) for m in recent) // 4 <= 300
+
+    # One more short turn still fits: the cached summary is reused as is
+    summary, _ = await history.compact(messages + [{"role": "user", "content": "thanks"}])
+    assert summary == "summary 1"
+    assert len(summarizer.prompts) == 1
+    assert history.stats()["summaryCacheHits"] == 1
+
+@pytest.mark.asyncio
+async def test_conversations_with_the_same_opening_do_not_share_summaries():
+    summarizer = Summarizer()
+    history = manager(summarizer)
+    alice = turns("what is recursion?", "alice-secret", 12)
+    bob = turns("what is recursion?", "bob", 12)
+
+    alice_summary, _ = await history.compact(alice)
+    bob_summary, bob_recent = await history.compact(bob)
+    assert bob_summary != alice_summary
+    assert "alice-secret" not in summarizer.prompts[-1]
+    # Bob's own earlier turns are all either summarized or kept
+    folded = len(bob) - len(bob_recent)
+    assert all(f"bob turn {i} " in summarizer.prompts[-1] for i in range(1, folded))
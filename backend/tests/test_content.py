@@ -0,0 +1,337 @@
+import hashlib
+import io
+import os
+import pytest
+import time
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from app.main import app
+from concurrent.futures import ThreadPoolExecutor
+from PyPDF2 import PdfWriter
+from app.utils.pdf_extractor import extract_pdf_pages, join_pages
+from app.utils.uploads import UploadTooLargeError, save_upload
+
+client = TestClient(app)
+
+def wait_for_extraction(content_id: str) -> dict:
+    deadline = time.time() + 60
+    while True:
+        status = client.get(f"/api/v1/content/{content_id}/status").json()["data"]
+        if status["status"] in ("completed", "failed") or time.time() > deadline:
+            return status
+        time.sleep(0.1)
+
+def test_upload_streams_to_disk_and_extracts_in_background():
+    data = b"Linked lists store elements in nodes.\n" * 5000
+    response = client.post(
+        "/api/v1/content/upload",
+        files={"file": ("notes.txt", data, "text/plain")},
+        params={"user_id": "upload_user"}
+    )
+    assert response.status_code == 200
+    body = response.json()["data"]
+    assert body["size"] == len(data)
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert body["extractionStatus"] == "pending"
+
+    status = wait_for_extraction(body["id"])
+    assert status["status"] == "completed"
+    assert status["preview"].startswith("Linked lists")
+    assert status["attempts"] == 1
+
+    path = body["fileUrl"].lstrip("/")
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert client.delete(f"/api/v1/content/{body['id']}").status_code == 200
+    assert not os.path.exists(path)
+
+def test_duplicate_upload_shares_blob_and_extraction():
+    data = f"Binary search halves the interval each step. {time.time()}\n".encode() * 200
+    first = client.post("/api/v1/content/upload", files={"file": ("a.txt", data, "text/plain")}).json()["data"]
+    assert first["deduplicated"] is False
+    assert wait_for_extraction(first["id"])["status"] == "completed"
+
+    second = client.post("/api/v1/content/upload", files={"file": ("b.txt", data, "text/plain")}).json()["data"]
+    assert second["deduplicated"] is True
+    assert second["fileUrl"] == first["fileUrl"]
+    assert second["extractionStatus"] == "completed"
+    assert client.get(f"/api/v1/content/{second['id']}").json()["data"]["extractedText"].startswith("Binary search")
+
+    from app.database import SessionLocal
+    from app.models import ContentChunk
+    from app.services.blobs import shared_content_id
+    db = SessionLocal()
+    assert shared_content_id(db, second["id"]) == first["id"]
+
+    path = first["fileUrl"].lstrip("/")
+    assert client.delete(f"/api/v1/content/{first['id']}").status_code == 200
+    assert os.path.exists(path)
+    # The remaining upload inherits the chunk index
+    assert shared_content_id(db, second["id"]) == second["id"]
+    assert db.query(ContentChunk).filter(ContentChunk.content_id == second["id"]).count() > 0
+    db.close()
+    assert client.get(f"/api/v1/content/{second['id']}").status_code == 200
+    assert client.delete(f"/api/v1/content/{second['id']}").status_code == 200
+    assert not os.path.exists(path)
+
+def test_upload_after_failed_extraction_is_extracted_again():
+    from app.database import SessionLocal
+    from app.models import Content, ContentBlob
+    data = f"Hash tables trade memory for lookup speed. {time.time()}\n".encode() * 100
+    first = client.post("/api/v1/content/upload", files={"file": ("h.txt", data, "text/plain")}).json()["data"]
+    wait_for_extraction(first["id"])
+    db = SessionLocal()
+    # As if the owner's job had timed out
+    db.query(Content).filter(Content.id == first["id"]).update({"extraction_status": "failed", "extraction_error": "timed out"})
+    db.commit()
+
+    second = client.post("/api/v1/content/upload", files={"file": ("h.txt", data, "text/plain")}).json()["data"]
+    assert second["deduplicated"] is True
+    assert second["extractionStatus"] == "pending"
+    assert wait_for_extraction(second["id"])["status"] == "completed"
+    assert db.query(ContentBlob.owner_id).filter(ContentBlob.sha256 == second["sha256"]).scalar() == second["id"]
+    db.close()
+    client.delete(f"/api/v1/content/{first['id']}")
+    client.delete(f"/api/v1/content/{second['id']}")
+
+def test_empty_upload_rejected():
+    response = client.post("/api/v1/content/upload", files={"file": ("empty.txt", b"", "text/plain")})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_oversized_upload_aborts_and_cleans_up(tmp_path):
+    upload = UploadFile(file=io.BytesIO(b"x" * 5000), filename="big.txt")
+    dest = tmp_path / "big.txt"
+    with pytest.raises(UploadTooLargeError):
+        await save_upload(upload, str(dest), max_size=4096, chunk_size=1024)
+    assert os.listdir(tmp_path) == []
+
+def test_failed_extraction_is_retried_then_marked_failed():
+    from app.services.extraction_jobs import ExtractionQueue
+    from app.database import SessionLocal
+    from app.models import Content
+
+    content_id = f"content_broken_{int(time.time() * 1000)}"
+    path = os.path.join("uploads", f"{content_id}.pdf")
+    with open(path, "wb") as f:
+        f.write(b"not really a pdf")
+    db = SessionLocal()
+    db.add(Content(id=content_id, filename="broken.pdf", file_url=f"/uploads/{content_id}.pdf", extraction_status="pending"))
+    db.commit()
+
+    jobs = ExtractionQueue(workers=1, max_attempts=2, retry_delay=0.01)
+    try:
+        jobs.enqueue(content_id)
+        deadline = time.time() + 60
+        while jobs.failed == 0 and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        jobs.shutdown()
+        os.remove(path)
+    db.expire_all()
+    content = db.query(Content).filter(Content.id == content_id).first()
+    db.close()
+    assert content.extraction_status == "failed"
+    assert content.extraction_attempts == 2
+    assert "PDF" in content.extraction_error
+
+def test_join_pages_records_page_offsets():
+    pages = ["First page", "", "Third"]
+    text, offsets = join_pages(pages)
+    assert text == "First page\n\nThird"
+    assert [text[o:o + len(p)] for o, p in zip(offsets, pages)] == pages
+
+def test_pdf_pages_extracted_in_ranges_keep_order(tmp_path):
+    writer = PdfWriter()
+    for _ in range(7):
+        writer.add_blank_page(width=200, height=200)
+    path = tmp_path / "blank.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    with ThreadPoolExecutor(3) as executor:
+        pages = extract_pdf_pages(str(path), executor, timeout=30, pages_per_task=2)
+    assert pages == [""] * 7
+
+def test_small_pdf_is_still_extracted_in_the_executor(tmp_path, monkeypatch):
+    import threading
+    from app.utils import pdf_extractor
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    path = tmp_path / "small.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+
+    callers = []
+    for name in ("count_pdf_pages", "extract_page_range"):
+        original = getattr(pdf_extractor, name)
+        def traced(*args, _original=original):
+            callers.append(threading.current_thread().name)
+            return _original(*args)
+        monkeypatch.setattr(pdf_extractor, name, traced)
+
+    with ThreadPoolExecutor(2, thread_name_prefix="pool") as executor:
+        assert extract_pdf_pages(str(path), executor, timeout=30) == [""] * 3
+    assert len(callers) == 2
+    assert all(name.startswith("pool") for name in callers)
+
+def test_extracted_text_is_compressed_and_not_loaded_by_list():
+    from sqlalchemy import event
+    from app.database import SessionLocal, engine
+    from app.models import Content
+
+    content_id = f"content_text_{int(time.time() * 1000)}"
+    text = "Stacks are last-in, first-out. " * 2000
+    db = SessionLocal()
+    db.add(Content(id=content_id, user_id="text_user", filename="stack.txt", extracted_text=text))
+    db.commit()
+    db.close()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        listed = client.get("/api/v1/content/list", params={"user_id": "text_user"}).json()["data"]["contents"]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert content_id in [c["id"] for c in listed]
+    assert not any("content_texts" in s for s in statements)
+
+    status = client.get(f"/api/v1/content/{content_id}/status").json()["data"]
+    assert status["textSize"] == len(text)
+    assert status["storedSize"] < status["textSize"] // 10
+    assert client.get(f"/api/v1/content/{content_id}").json()["data"]["extractedText"] == text
+    client.delete(f"/api/v1/content/{content_id}")
+
+def test_decompress_range_reads_only_the_requested_characters():
+    from app.utils import compression
+    text = "".join(f"ünïcode line {i} — ✓\n" for i in range(50000))
+    data = compression.compress_text(text.encode("utf-8"))
+    for start, end in [(0, 10), (12345, 12400), (len(text) - 5, len(text) + 100)]:
+        assert compression.decompress_range(data, start, end) == text[start:end]
+
+def test_text_endpoint_pages_by_offset_and_page_number_with_etag():
+    from app.database import SessionLocal
+    from app.models import Content
+
+    pages = ["Page one text.", "Second page here.", "Third and last."]
+    text, offsets = join_pages(pages)
+    content_id = f"content_paged_{int(time.time() * 1000)}"
+    db = SessionLocal()
+    db.add(Content(id=content_id, filename="paged.pdf", extracted_text=text, page_offsets=offsets))
+    db.commit()
+    db.close()
+
+    url = f"/api/v1/content/{content_id}/text"
+    first = client.get(url, params={"offset": 0, "limit": 10})
+    body = first.json()["data"]
+    assert body["text"] == text[:10]
+    assert body["nextOffset"] == 10
+    assert body["totalLength"] == len(text)
+
+    second = client.get(url, params={"page": 2}).json()["data"]
+    assert second["text"] == "Second page here."
+    assert second["pageCount"] == 3
+    assert client.get(url, params={"page": 4}).status_code == 404
+
+    etag = first.headers["etag"]
+    cached = client.get(url, params={"offset": 0, "limit": 10}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert client.get(url, params={"offset": 10, "limit": 10}, headers={"If-None-Match": etag}).status_code == 200
+
+    # The same characters fetched as a page are a different response
+    page_etag = client.get(url, params={"page": 1}).headers["etag"]
+    same_range = client.get(url, params={"offset": 0, "limit": offsets[1] - 1}).headers["etag"]
+    assert page_etag != same_range
+    assert "extractedText" not in client.get(f"/api/v1/content/{content_id}", params={"includeText": False}).json()["data"]
+    client.delete(f"/api/v1/content/{content_id}")
+
+def test_text_not_modified_does_not_load_compressed_bytes():
+    from sqlalchemy import event
+    from app.database import SessionLocal, engine
+    from app.models import Content
+
+    content_id = f"content_etag_{int(time.time() * 1000)}"
+    db = SessionLocal()
+    db.add(Content(id=content_id, filename="etag.txt", extracted_text="cached text " * 1000))
+    db.commit()
+    db.close()
+    url = f"/api/v1/content/{content_id}/text"
+    etag = client.get(url, params={"offset": 0, "limit": 100}).headers["etag"]
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        cached = client.get(url, params={"offset": 0, "limit": 100}, headers={"If-None-Match": etag})
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert cached.status_code == 304
+    assert statements and not any("content_texts.data" in s for s in statements)
+    client.delete(f"/api/v1/content/{content_id}")
+
+def test_search_ranks_highlights_and_scopes_by_user():
+    user = f"search_user_{int(time.time() * 1000)}"
+    ids = []
+    for name, data in [
+        ("graphs.txt", b"Dijkstra finds shortest paths in weighted graphs. Graphs have vertices and edges.\n" * 20),
+        ("sorting.txt", b"Merge sort and quicksort are divide and conquer algorithms. <b>Sorting</b> matters.\n" * 20),
+    ]:
+        body = client.post("/api/v1/content/upload", files={"file": (name, data, "text/plain")},
+                           params={"user_id": user}).json()["data"]
+        assert wait_for_extraction(body["id"])["status"] == "completed"
+        ids.append(body["id"])
+
+    results = client.get("/api/v1/content/search", params={"q": "shortest path", "user_id": user}).json()["data"]["results"]
+    assert [r["id"] for r in results] == [ids[0]]
+    assert "<mark>shortest</mark>" in results[0]["snippet"]
+
+    # Prefix matching on the last term, with document markup escaped
+    results = client.get("/api/v1/content/search", params={"q": "merge sort", "user_id": user}).json()["data"]["results"]
+    assert results[0]["id"] == ids[1]
+    assert "&lt;b&gt;<mark>Sorting</mark>" in results[0]["snippet"]
+
+    assert client.get("/api/v1/content/search", params={"q": "dijkstra", "user_id": "someone_else"}).json()["data"]["results"] == []
+    assert client.get("/api/v1/content/search", params={"q": "\"AND NOT(", "user_id": user}).status_code == 200
+
+    # The index keeps no second copy of the text
+    from sqlalchemy import text
+    from app.database import engine
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT body FROM content_fts WHERE content_fts MATCH 'dijkstra'")).scalars().all() == [None]
+
+    for content_id in ids:
+        client.delete(f"/api/v1/content/{content_id}")
+    assert client.get("/api/v1/content/search", params={"q": "dijkstra", "user_id": user}).json()["data"]["results"] == []
+    # Deleting removes the terms from the index itself, not just the mapping
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM content_fts WHERE content_fts MATCH 'dijkstra'")).all() == []
+
+def test_legacy_extracted_text_is_moved_to_content_texts(tmp_path):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from app.database import Base
+    from app.migrations import run_migrations
+    from app.models import Content
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE contents (id VARCHAR PRIMARY KEY, user_id VARCHAR, filename VARCHAR, "
+            "content_type VARCHAR, file_url VARCHAR, extracted_text TEXT, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO contents (id, user_id, filename, extracted_text) VALUES "
+                          "('old1', 'u1', 'a.txt', 'legacy text é'), ('old2', 'u1', 'b.txt', NULL)"))
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    run_migrations(engine)
+
+    with Session(bind=engine) as db:
+        first, second = db.get(Content, "old1"), db.get(Content, "old2")
+        assert first.extracted_text == "legacy text é"
+        assert first.text_row.char_count == len("legacy text é")
+        assert first.extraction_status == "completed"
+        assert second.extracted_text is None
+        assert db.execute(text("SELECT count(*) FROM contents WHERE extracted_text IS NOT NULL")).scalar() == 0
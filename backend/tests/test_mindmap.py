@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.mindmap_schema import MindMapFormatError, normalize_topic, parse_tree
+
+client = TestClient(app)
+
+def test_normalize_topic():
+    assert normalize_topic("  Data   Structures! ") == normalize_topic("data structures")
+
+def test_parse_tree_rejects_invalid_output():
+    tree = parse_tree('```json\n{"central": "Graphs", "branches": [{"id": "1", "label": "BFS"}]}\n```')
+    assert tree.branches[0].children == []
+    with pytest.raises(MindMapFormatError):
+        parse_tree("Sorry, I cannot help with that.")
+    with pytest.raises(MindMapFormatError):
+        parse_tree('{"central": "Graphs", "branches": "BFS"}')
+
+def test_generate_is_cached_and_expands_one_node():
+    first = client.post("/api/v1/mindmap/generate", json={"topic": "Data Structures", "userId": "mm_user_1"}).json()["data"]
+    second = client.post("/api/v1/mindmap/generate", json={"topic": "data  structures", "userId": "mm_user_2"}).json()["data"]
+    assert first["id"] != second["id"]
+    assert [b["label"] for b in first["data"]["branches"]] == [b["label"] for b in second["data"]["branches"]]
+    assert second["data"]["central"] == "data  structures"
+
+    # Branches arrive with their sub-concepts; only deeper levels are expanded later
+    branch = first["data"]["branches"][1]
+    assert branch["children"] and all(child["children"] == [] for child in branch["children"])
+
+    leaf_id = branch["children"][0]["id"]
+    response = client.post(f"/api/v1/mindmap/{first['id']}/expand", json={"nodeId": leaf_id})
+    assert response.status_code == 200
+    children = response.json()["data"]["node"]["children"]
+    assert children and all(child["id"].startswith(f"{leaf_id}.") for child in children)
+
+    stored = client.get(f"/api/v1/mindmap/{first['id']}").json()["data"]["data"]
+    assert stored["branches"][1]["children"][0]["children"] == children
+    # Nodes that already have children are returned as they are
+    again = client.post(f"/api/v1/mindmap/{first['id']}/expand", json={"nodeId": branch["id"]}).json()["data"]["node"]
+    assert again["children"][0]["children"] == children
+    missing = client.post(f"/api/v1/mindmap/{first['id']}/expand", json={"nodeId": "9.9"})
+    assert missing.status_code == 404
@@ -0,0 +1,40 @@
+import io
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from app.utils import ocr_processor
+from app.utils.ocr_processor import prepare_image, run_ocr
+
+def lined_page(width: int, height: int, line_height: int = 60, gap: int = 90) -> bytes:
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    for top in range(gap, height - line_height, line_height + gap):
+        pixels[top:top + line_height, width // 10:width - width // 10] = 0
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", dpi=(600, 600))
+    return buffer.getvalue()
+
+def test_prepare_downscales_and_cuts_bands_between_lines():
+    bands, dpi, timings = prepare_image(lined_page(3000, 9000), max_dimension=2400, band_height=500)
+    assert timings["width"] == 3000 and timings["ocrHeight"] == 2400
+    assert dpi < 600
+    assert sum(size[1] for _, size, _ in bands) == 2400
+    assert len(bands) > 2
+    for mode, size, data in bands:
+        assert mode == "L"
+        rows = np.frombuffer(data, dtype=np.uint8).reshape(size[1], size[0])
+        # Cuts fall in the gaps between lines, never through one
+        assert (rows[0] > 128).all() and (rows[-1] > 128).all()
+    assert {"decodeMs", "normalizeMs", "downscaleMs", "splitMs"} <= timings.keys()
+
+def test_transparent_background_becomes_white():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (200, 100), (0, 0, 0, 0)).save(buffer, format="PNG")
+    bands, _, _ = prepare_image(buffer.getvalue())
+    assert set(bands[0][2]) == {255}
+
+def test_bands_are_recognized_in_parallel_and_merged_in_order(monkeypatch):
+    monkeypatch.setattr(ocr_processor, "ocr_band", lambda band, dpi, timeout: f"band at height {band[1][1]}")
+    with ThreadPoolExecutor(4) as executor:
+        text, timings = run_ocr(lined_page(1000, 4000), executor, timeout=30)
+    assert text.count("band at height") == timings["bands"] > 1
+    assert "ocrMs" in timings and "mergeMs" in timings
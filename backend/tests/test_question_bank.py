@@ -0,0 +1,50 @@
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers.ai import ai_service
+from app.services.question_bank import question_hash
+from app.services.scheduler import QueueTimeoutError
+
+client = TestClient(app)
+
+def request_quiz(user_id, content_id="bank_content"):
+    response = client.post("/api/ai/quiz", json={
+        "contentId": content_id,
+        "competencyId": "bank_competency",
+        "numQuestions": 3,
+        "userId": user_id
+    })
+    assert response.status_code == 200
+    return [q["question"] for q in response.json()["data"]["questions"]]
+
+def test_question_hash_ignores_case_and_punctuation():
+    assert question_hash("What is  Python?") == question_hash("what is python")
+    assert question_hash("What is Python?") != question_hash("What is Java?")
+
+def test_user_does_not_see_repeats_until_bank_exhausted():
+    first = request_quiz("bank_user_1")
+    second = request_quiz("bank_user_1")
+    assert len(first) == 3 and len(second) == 3
+    assert not set(first) & set(second)
+
+def test_other_users_are_served_from_bank():
+    request_quiz("bank_user_2", content_id="bank_shared")
+    before = client.get("/api/ai/metrics").json()["data"]["questionBank"]
+    request_quiz("bank_user_3", content_id="bank_shared")
+    after = client.get("/api/ai/metrics").json()["data"]["questionBank"]
+    assert after["servedFromBank"] == before["servedFromBank"] + 1
+
+def test_capacity_error_during_top_up_is_not_retried(monkeypatch):
+    calls = []
+    async def refuse(*args, **kwargs):
+        calls.append(args)
+        raise QueueTimeoutError("LLM queue is full", retry_after=2)
+    monkeypatch.setattr(ai_service, "generate_quiz_questions", refuse)
+    response = client.post("/api/ai/quiz", json={
+        "contentId": "bank_content",
+        "competencyId": f"bank_refused_{uuid.uuid4().hex[:8]}",
+        "numQuestions": 3
+    })
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "2"
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+from app.services.quiz_parser import IncrementalQuizParser, QuizParseStats, parse_quiz_text
+
+QUIZ = """Q: What does a stack return on pop?
+A) The oldest element
+B) The newest element
+C) A random element
+D) Nothing
+Correct: B
+Explanation: Stacks are last-in, first-out.
+---
+Q: Which structure uses FIFO order?
+A) Queue
+B) Stack
+C) Tree
+D) Graph
+Correct: A
+Explanation: Queues serve elements in arrival order.
+"""
+
+def test_questions_are_emitted_as_explanations_close():
+    parser = IncrementalQuizParser(5, stats=None)
+    emitted = []
+    for i in range(0, len(QUIZ), 7):
+        emitted.append(parser.feed(QUIZ[i:i + 7]))
+    emitted.append(parser.close())
+    flat = [q for batch in emitted for q in batch]
+    assert [q["correctAnswer"] for q in flat] == [1, 0]
+    # Each question arrives in its own chunk, before the stream finishes
+    assert sum(1 for batch in emitted[:-1] if batch) == 2
+
+def test_malformed_blocks_are_repaired_or_rejected():
+    stats = QuizParseStats()
+    text = """**Q: What is O(1)?**
+a) Constant time
+b) Linear time
+c) Quadratic time
+correct: a
+---
+Q: Broken question
+A) Only one option
+Correct: A
+Explanation: Not enough options.
+"""
+    questions = parse_quiz_text(text, 5, stats)
+    assert len(questions) == 1
+    assert questions[0]["question"] == "What is O(1)?"
+    assert questions[0]["options"][-1] == "None of the above"
+    assert questions[0]["correctAnswer"] == 0
+    counts = stats.stats()
+    assert counts["repaired"] == 1
+    assert counts["rejected"] == 1
+    assert counts["successRate"] == 0.5
+
+def test_parser_stops_at_requested_count():
+    assert len(parse_quiz_text(QUIZ, 1, stats=None)) == 1
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+import time
+from google.api_core import exceptions as google_exceptions
+from app.constants import API_RETRY_COUNT
+from app.services import llm_gateway
+from app.services.llm_backends import StubBackend
+from app.services.llm_errors import CircuitOpenError
+from app.services.llm_gateway import LLMGateway
+from app.services.resilience import CircuitBreaker, backoff_delay
+from app.services.usage import UsageTracker
+
+class RejectingBackend(StubBackend):
+    """Fails every call with an error that retrying cannot fix."""
+
+    def _before_call(self) -> float:
+        super()._before_call()
+        raise google_exceptions.InvalidArgument("Prompt rejected")
+
+class BrokenStreamBackend(StubBackend):
+    """Streams one chunk, then loses the connection."""
+
+    def stream(self, prompt: str):
+        yield "hello "
+        raise google_exceptions.ServiceUnavailable("Stream interrupted")
+
+def make_gateway(backend) -> LLMGateway:
+    return LLMGateway(backend, max_concurrency=2, usage=UsageTracker(0, 0, 0))
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "backoff_delay", lambda attempt, base, cap: 0.01)
+
+def test_breaker_opens_on_error_rate():
+    breaker = CircuitBreaker(window=60, min_calls=4, error_rate=0.5, cooldown=60)
+    breaker.record(True)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.allow()
+    assert exc.value.retry_after >= 1
+    assert breaker.stats()["transitions"] == {"closed->open": 1}
+
+def test_half_open_probe_closes_breaker():
+    breaker = CircuitBreaker(window=60, min_calls=1, error_rate=0.5, cooldown=0)
+    breaker.record(False)
+    assert breaker.allow() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow() is False
+    assert breaker.stats()["transitions"] == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+
+def test_backoff_is_bounded():
+    assert all(0 <= backoff_delay(attempt, 1, 8) <= 8 for attempt in range(10))
+
+@pytest.mark.asyncio
+async def test_gateway_retries_are_bounded(fast_backoff):
+    backend = StubBackend(error_rate=1.0)
+    gateway = make_gateway(backend)
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        await gateway.generate("What is a loop?")
+    assert backend.calls == API_RETRY_COUNT + 1
+    assert gateway.retries == API_RETRY_COUNT
+
+@pytest.mark.asyncio
+async def test_gateway_deadline_covers_all_attempts(fast_backoff):
+    backend = StubBackend(latency_ms=500)
+    gateway = make_gateway(backend)
+    gateway.timeout = 0.2
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        await gateway.generate("What is a loop?")
+    assert time.perf_counter() - started < 0.4
+    assert backend.calls == 1
+    assert gateway.timeouts == 1
+
+@pytest.mark.asyncio
+async def test_gateway_does_not_retry_non_retryable_errors(fast_backoff):
+    backend = RejectingBackend()
+    gateway = make_gateway(backend)
+    with pytest.raises(google_exceptions.InvalidArgument):
+        await gateway.generate("What is a loop?")
+    assert backend.calls == 1
+    assert gateway.retries == 0
+
+@pytest.mark.asyncio
+async def test_gateway_stream_failure_keeps_provider_error_and_records_usage():
+    usage = UsageTracker(0, 0, 0)
+    gateway = LLMGateway(BrokenStreamBackend(), max_concurrency=2, usage=usage)
+    received = []
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        async for chunk in gateway.stream("What is a loop?"):
+            received.append(chunk)
+    assert received == ["hello "]
+    assert sum(delta[2] for delta in usage.pending.values()) > 0
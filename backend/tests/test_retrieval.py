@@ -0,0 +1,32 @@
+from app.database import Base, SessionLocal, engine
+from app.services.retrieval import ChunkIndex, chunk_text, tokenize
+
+Base.metadata.create_all(bind=engine)
+
+DOCUMENT = "\n\n".join([
+    "A linked list stores elements in nodes. Each node points to the next node in the list.",
+    "Binary search halves the search interval on every step, so it runs in logarithmic time.",
+    "Recursion is when a function calls itself. Every recursive function needs a base case.",
+    "Hash tables map keys to buckets using a hash function for constant time lookups.",
+])
+
+def test_chunk_text_respects_size():
+    chunks = chunk_text(DOCUMENT * 20, max_chars=300)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == (DOCUMENT * 20).replace("\n", "")
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Base case?") == ["base", "case"]
+
+def test_search_returns_relevant_chunks():
+    index = ChunkIndex()
+    db = SessionLocal()
+    try:
+        index.build(db, "test_retrieval_doc", DOCUMENT, max_chars=100)
+        results = index.search(db, "test_retrieval_doc", "how does recursion use a base case", k=1)
+        assert len(results) == 1
+        assert "Recursion" in results[0]
+        assert index.search(db, "test_retrieval_doc", "quantum chromodynamics") == []
+        assert len(index.sample(db, "test_retrieval_doc", 2)) == 2
+    finally:
+        db.close()
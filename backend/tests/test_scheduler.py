@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from app.services.scheduler import FairScheduler, QueueTimeoutError
+
+async def run_in_order(scheduler, requests):
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot("question", "holder"):
+            await release.wait()
+
+    async def call(endpoint, user, label):
+        async with scheduler.slot(endpoint, user):
+            order.append(label)
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for endpoint, user, label in requests:
+        tasks.append(asyncio.ensure_future(call(endpoint, user, label)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+@pytest.mark.asyncio
+async def test_interactive_calls_jump_background_queue():
+    scheduler = FairScheduler(capacity=1, max_wait=5)
+    order = await run_in_order(scheduler, [
+        ("mindmap", "a", "mindmap1"),
+        ("mindmap", "a", "mindmap2"),
+        ("question", "b", "question"),
+    ])
+    assert order[0] == "question"
+
+@pytest.mark.asyncio
+async def test_users_are_served_round_robin():
+    scheduler = FairScheduler(capacity=1, max_wait=5)
+    order = await run_in_order(scheduler, [
+        ("enhance", "loop", "loop1"),
+        ("enhance", "loop", "loop2"),
+        ("enhance", "loop", "loop3"),
+        ("enhance", "other", "other1"),
+    ])
+    assert order == ["loop1", "other1", "loop2", "loop3"]
+
+@pytest.mark.asyncio
+async def test_queue_wait_limit_raises_capacity_error():
+    scheduler = FairScheduler(capacity=1, max_wait=0.05)
+    async with scheduler.slot("batch", "a"):
+        with pytest.raises(QueueTimeoutError) as exc:
+            async with scheduler.slot("batch", "b"):
+                pass
+    assert exc.value.status_code == 503
+    assert exc.value.retry_after >= 1
+    stats = scheduler.stats()
+    assert stats["classes"]["background"]["rejected"] == 1
+    assert stats["queueDepth"] == 0 and stats["inUse"] == 0
@@ -0,0 +1,48 @@
+from app.services.semantic_cache import SemanticCache
+
+def test_paraphrased_question_hits():
+    cache = SemanticCache(threshold=0.8)
+    cache.set("What is a linked list?", "medium", None, "answer")
+    assert cache.get("explain linked lists", "medium") == "answer"
+    assert cache.get("how does a hash table work", "medium") is None
+
+def test_namespaces_are_separate():
+    cache = SemanticCache(threshold=0.8)
+    cache.set("What is recursion?", "basic", "content_1", "short answer")
+    assert cache.get("What is recursion?", "advanced", "content_1") is None
+    assert cache.get("What is recursion?", "basic", "content_2") is None
+    assert cache.get("What is recursion?", "basic", "content_1") == "short answer"
+
+def test_eviction_keeps_frequently_hit_entries():
+    cache = SemanticCache(threshold=0.8, max_entries=2)
+    cache.set("What is a stack?", "medium", None, "stack")
+    cache.set("What is a queue?", "medium", None, "queue")
+    assert cache.get("explain stacks", "medium") == "stack"
+    cache.set("What is a heap?", "medium", None, "heap")
+    assert cache.get("What is a stack?", "medium") == "stack"
+    assert cache.get("What is a queue?", "medium") is None
+    assert cache.stats()["evictions"] == 1
+
+def test_near_miss_questions_do_not_match():
+    pairs = [
+        ("What is a pointer in C?", "What is a pointer in C++?"),
+        ("What is a pointer in C?", "What is a pointer in C#?"),
+        ("How do I sort a list in C?", "How do I sort a list in R?"),
+        ("How to declare a list in Python", "How to declare a list in C++"),
+        ("How does print work in Python 2?", "How does print work in Python 3?"),
+    ]
+    for stored, asked in pairs:
+        cache = SemanticCache(threshold=0.8)
+        cache.set(stored, "medium", None, "stored answer")
+        assert cache.get(asked, "medium") is None, (stored, asked)
+        assert cache.get(stored, "medium") == "stored answer"
+
+def test_expired_entries_are_never_served():
+    cache = SemanticCache(threshold=0.5, ttl=0)
+    cache.set("What is a linked list?", "medium", None, "first")
+    cache.set("What are linked lists?", "medium", None, "second")
+    cache.ttl = 3600
+    cache.set("How does a hash table work?", "medium", None, "fresh")
+    assert cache.get("explain linked lists", "medium") is None
+    assert cache.indexes[("medium", "")].questions == ["How does a hash table work?"]
+    assert cache.get("how do hash tables work", "medium") == "fresh"
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from app.services.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "quiz"
+
+    results = await asyncio.gather(*[flight.do("key", work) for _ in range(40)])
+    assert results == ["quiz"] * 40
+    assert calls == 1
+    assert flight.stats()["coalesced"] == 39
+    assert flight.stats()["inFlight"] == 0
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("rate limited")
+
+    results = await asyncio.gather(*[flight.do("key", work) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    first = asyncio.create_task(flight.do("key", work))
+    second = asyncio.create_task(flight.do("key", work))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "answer"
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+import threading
+import time
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.transcripts import TranscriptStore
+from app.utils.youtube_extractor import LocalTransport, TranscriptUnavailableError, join_segments, parse_video_id
+
+client = TestClient(app)
+
+def video_id() -> str:
+    return uuid.uuid4().hex[:11]
+
+def test_parse_video_id_and_join_segments():
+    assert parse_video_id("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=3") == "dQw4w9WgXcQ"
+    assert parse_video_id("https://youtu.be/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    with pytest.raises(ValueError):
+        parse_video_id("https://example.com/video")
+    assert join_segments([{"text": "a"}, {"text": ""}, {"text": "b"}]) == "a b"
+
+@pytest.mark.asyncio
+async def test_transcripts_are_fetched_once_and_missing_ones_negatively_cached():
+    present, missing = video_id(), video_id()
+    transport = LocalTransport({present: [{"start": 0.0, "duration": 2.5, "text": "Hello class"}]})
+    store = TranscriptStore(transport)
+
+    results = await asyncio.gather(*(store.get_segments(present) for _ in range(5)))
+    assert all(r == [{"start": 0.0, "duration": 2.5, "text": "Hello class"}] for r in results)
+    assert await TranscriptStore(transport).get_segments(present) == results[0]
+    assert transport.fetches == 1
+
+    for _ in range(3):
+        with pytest.raises(TranscriptUnavailableError):
+            await store.get_segments(missing)
+    assert transport.fetches == 2
+    assert store.stats()["negativeHits"] == 2
+
+def test_youtube_import_creates_searchable_content():
+    vid = video_id()
+    response = client.post("/api/v1/content/youtube", json={"url": f"https://youtu.be/{vid}", "userId": "yt_user"})
+    assert response.status_code == 200
+    body = response.json()["data"]
+    assert body["videoId"] == vid and body["segments"] == 12
+
+    transcript = client.get("/api/v1/content/youtube/transcript", params={"url": f"https://youtu.be/{vid}"}).json()["data"]
+    assert transcript["segments"][1]["start"] == 5.0
+    results = client.get("/api/v1/content/search", params={"q": vid, "user_id": "yt_user"}).json()["data"]["results"]
+    assert [r["id"] for r in results] == [body["id"]]
+    assert client.post("/api/v1/content/youtube", json={"url": "not a video"}).status_code == 400
+    assert client.delete(f"/api/v1/content/{body['id']}").status_code == 200
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_the_cache():
+    vids = [video_id() for _ in range(3)]
+    transport = LocalTransport()
+    store = TranscriptStore(transport)
+    assert store.prefetch(vids + vids[:1]) == 3
+    await asyncio.gather(*store.prefetch_tasks)
+    for v in vids:
+        await store.get_segments(v)
+    assert transport.fetches == 3
+    assert store.hits == 3
+
+def test_prefetch_endpoint_reports_invalid_urls():
+    response = client.post("/api/v1/content/youtube/prefetch",
+                           json={"urls": [f"https://youtu.be/{video_id()}", "nope"]})
+    assert response.json()["data"] == {"scheduled": 1, "invalid": ["nope"]}
+
+@pytest.mark.asyncio
+async def test_prefetch_concurrency_is_shared_across_calls():
+    class SlowTransport(LocalTransport):
+        def __init__(self):
+            super().__init__()
+            self.lock = threading.Lock()
+            self.active = 0
+            self.peak = 0
+
+        def fetch(self, video_id):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(0.05)
+            with self.lock:
+                self.active -= 1
+            return super().fetch(video_id)
+
+    transport = SlowTransport()
+    store = TranscriptStore(transport, prefetch_concurrency=2)
+    for _ in range(3):
+        store.prefetch([video_id() for _ in range(2)])
+    await asyncio.gather(*store.prefetch_tasks)
+    assert transport.fetches == 6
+    assert transport.peak == 2
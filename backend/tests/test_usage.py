@@ -0,0 +1,84 @@
+import pytest
+import uuid
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.services.usage import UsageTracker, QuotaExceededError
+
+client = TestClient(app)
+
+def test_daily_token_quota():
+    tracker = UsageTracker(daily_tokens=100, monthly_tokens=0, daily_requests=0)
+    tracker.check("quota_user")
+    tracker.record("quota_user", "question", "x" * 300, "y" * 200)
+    with pytest.raises(QuotaExceededError) as exc:
+        tracker.check("quota_user")
+    assert exc.value.status_code == 429
+    assert exc.value.retry_after >= 1
+    tracker.check("other_user")
+
+def test_flush_accumulates_rows_and_reports():
+    user = f"flush_{uuid.uuid4().hex[:8]}"
+    tracker = UsageTracker()
+    tracker.record(user, "enhance", "a" * 40, "b" * 80)
+    tracker.record(user, "enhance", "a" * 40, "b" * 80)
+    assert tracker.flush() == 1
+    tracker.record(user, "question", "a" * 4, "b" * 4)
+    tracker.flush()
+    assert tracker.stats()["pendingRows"] == 0
+
+    db = SessionLocal()
+    try:
+        report = tracker.report(db, days=1, user_id=user)[0]
+    finally:
+        db.close()
+    assert report["requests"] == 3
+    assert report["endpoints"]["enhance"] == {"requests": 2, "promptTokens": 20, "responseTokens": 40}
+
+    fresh = UsageTracker(daily_tokens=60, monthly_tokens=0, daily_requests=0)
+    db = SessionLocal()
+    try:
+        fresh.load(db)
+    finally:
+        db.close()
+    with pytest.raises(QuotaExceededError):
+        fresh.check(user)
+
+def test_usage_report_requires_admin():
+    student = create_access_token({"sub": "s1", "role": "student"})
+    admin = create_access_token({"sub": "a1", "role": "admin"})
+    response = client.get("/api/v1/ai/usage", headers={"Authorization": f"Bearer {student}"})
+    assert response.status_code == 403
+    response = client.get("/api/v1/ai/usage", headers={"Authorization": f"Bearer {admin}"})
+    assert response.status_code == 200
+    assert "users" in response.json()["data"]
+
+def test_anonymous_calls_share_one_quota():
+    tracker = UsageTracker(daily_tokens=0, monthly_tokens=0, daily_requests=1)
+    tracker.check(None)
+    tracker.record(None, "question", "x", "y")
+    with pytest.raises(QuotaExceededError):
+        tracker.check(None)
+    with pytest.raises(QuotaExceededError):
+        tracker.check("anonymous")
+    tracker.check("system")
+
+def test_quota_follows_token_not_body_user(monkeypatch):
+    from app.services.usage import usage_tracker
+    user = f"token_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(usage_tracker, "daily_requests", 1)
+    usage_tracker.record(user, "feedback", "x", "y")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user, 'role': 'student'})}"}
+    params = {"answer": "A loop", "question": "What is iteration?", "userId": "someone_else"}
+    response = client.post("/api/v1/ai/feedback", params=params, headers=headers)
+    assert response.status_code == 429
+
+    # A stale or invalid token is charged to the anonymous bucket instead of failing
+    monkeypatch.setattr(usage_tracker, "daily_requests", 0)
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    before = usage_tracker.pending[("anonymous", "feedback", day)][0]
+    response = client.post("/api/v1/ai/feedback", params=params, headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 200
+    assert usage_tracker.pending[("anonymous", "feedback", day)][0] == before + 1